@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import functools
+import threading
+import time
+from typing import Any, Callable
+
+# Apple rejects provider tokens older than one hour and answers
+# TooManyProviderTokenUpdates when they are refreshed more than once every 20 minutes.
+MIN_TOKEN_LIFETIME_SECONDS = 20 * 60
+MAX_TOKEN_LIFETIME_SECONDS = 60 * 60
+
+
+@functools.lru_cache(maxsize=16)
+def load_signing_key(pem: str) -> Any:
+    """Parse a .p8 key once per process; every client using the same key shares the object."""
+    from cryptography.hazmat.primitives import serialization
+
+    return serialization.load_pem_private_key(pem.encode("utf-8"), password=None)
+
+
+@dataclass(frozen=True, slots=True)
+class _CachedToken:
+    token: str
+    issued_at: float
+
+
+class ProviderTokenCache:
+    """
+    Signed provider (JWT) tokens keyed by (team_id, key_id).
+
+    A token is reused for `lifetime_seconds`; once it is within
+    `refresh_margin_seconds` of that lifetime the next caller re-signs it.
+    Signing happens under a lock, so concurrent senders (tasks or threads)
+    share a single refresh instead of each producing a new token.
+    """
+
+    def __init__(
+        self,
+        *,
+        lifetime_seconds: float = 40 * 60,
+        refresh_margin_seconds: float = 5 * 60,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if not MIN_TOKEN_LIFETIME_SECONDS <= lifetime_seconds <= MAX_TOKEN_LIFETIME_SECONDS:
+            raise ValueError("lifetime_seconds must be between 1200 and 3600 (20-60 minutes).")
+        if not 0 <= refresh_margin_seconds < lifetime_seconds:
+            raise ValueError("refresh_margin_seconds must be >= 0 and smaller than lifetime_seconds.")
+
+        self._lifetime_seconds = lifetime_seconds
+        self._refresh_margin_seconds = refresh_margin_seconds
+        self._clock = clock
+        self._tokens: dict[tuple[str, str], _CachedToken] = {}
+        self._lock = threading.Lock()
+        self.refresh_count = 0
+
+    def _is_fresh(self, cached: _CachedToken | None, now: float) -> bool:
+        if cached is None:
+            return False
+        return now - cached.issued_at < self._lifetime_seconds - self._refresh_margin_seconds
+
+    def get(self, team_id: str, key_id: str, sign: Callable[[], str]) -> str:
+        key = (team_id, key_id)
+        cached = self._tokens.get(key)
+        if self._is_fresh(cached, self._clock()):
+            assert cached is not None
+            return cached.token
+
+        with self._lock:
+            cached = self._tokens.get(key)
+            now = self._clock()
+            if self._is_fresh(cached, now):
+                assert cached is not None
+                return cached.token
+
+            token = sign()
+            self._tokens[key] = _CachedToken(token=token, issued_at=now)
+            self.refresh_count += 1
+            return token
+
+    def invalidate(self, team_id: str, key_id: str, token: str | None = None) -> None:
+        """
+        Drop the cached token. If `token` is given, only drop it when it is still the
+        cached one, so several requests failing with the same stale token cause a
+        single refresh.
+        """
+        with self._lock:
+            cached = self._tokens.get((team_id, key_id))
+            if cached is None:
+                return
+            if token is None or cached.token == token:
+                del self._tokens[(team_id, key_id)]
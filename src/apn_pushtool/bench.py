@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import asdict, dataclass
+import multiprocessing
+import multiprocessing.connection
+import ssl
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, Literal, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from apn_pushtool.client import ApnsClient
+from apn_pushtool.config import ApnsCredentials
+from apn_pushtool.mockserver import MockApnsConfig, MockApnsServer
+from apn_pushtool.results import PushResult
+
+try:  # Not available on Windows.
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore[assignment]
+
+Scenario = Literal["single", "fanout", "long"]
+SCENARIOS: tuple[Scenario, ...] = ("single", "fanout", "long")
+
+_SERVER_START_TIMEOUT_SECONDS = 30.0
+
+# About 2.5 pushes worth of mixed-script text for the `long` scenario.
+_LONG_TEXT = ("Benchmark text for send_long_message. 推送通知压力测试。 " * 160).strip()
+
+
+@dataclass(frozen=True, slots=True)
+class BenchmarkReport:
+    scenario: str
+    pushes: int
+    succeeded: int
+    seconds: float
+    pushes_per_second: float
+    latency_p50_seconds: Optional[float]
+    latency_p99_seconds: Optional[float]
+    # Client-process CPU time per push; includes the mock server unless it runs isolated.
+    cpu_seconds_per_push: Optional[float]
+    peak_rss_bytes: Optional[int]
+    connections: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def benchmark_credentials() -> ApnsCredentials:
+    """Throwaway credentials; the mock server only checks that a provider token is present."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode("utf-8")
+    return ApnsCredentials(
+        team_id="BENCHTEAM",
+        key_id="BENCHKEY",
+        bundle_id="com.example.bench",
+        p8_private_key_pem=pem,
+        environment="sandbox",
+    )
+
+
+def _quantile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _device_token(i: int) -> str:
+    return f"{i:064x}"
+
+
+async def _run_scenario(
+    client: ApnsClient, scenario: Scenario, *, count: int, concurrency: int
+) -> AsyncIterator[PushResult]:
+    payload = client.create_basic_payload(title="bench", body="Benchmark push")
+    if scenario == "single":
+        for i in range(count):
+            yield await client.send_push(device_token=_device_token(i), payload=payload)
+    elif scenario == "fanout":
+        tokens = (_device_token(i) for i in range(count))
+        async for _, result in client.send_many(tokens, payload=payload, max_in_flight=concurrency):
+            yield result
+    elif scenario == "long":
+        for i in range(count):
+            for result in await client.send_long_message(
+                device_token=_device_token(i), title="bench", long_text=_LONG_TEXT, pipeline=True
+            ):
+                yield result
+    else:
+        raise ValueError(f"Unknown scenario {scenario!r}; expected one of {', '.join(SCENARIOS)}.")
+
+
+async def _measure(
+    scenario: Scenario, *, url: str, verify: ssl.SSLContext, count: int, concurrency: int
+) -> tuple[list[float], int, float, float]:
+    latencies: list[float] = []
+    succeeded = 0
+    async with ApnsClient(benchmark_credentials(), server_url=url, verify=verify) as client:
+        # Warm up: TLS handshake, JWT signing and the HTTP/2 preface are not what we measure.
+        await client.send_push(device_token=_device_token(0), payload={"aps": {"alert": "warmup"}})
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        async for result in _run_scenario(client, scenario, count=count, concurrency=concurrency):
+            latencies.append(result.elapsed)
+            succeeded += result.success
+        seconds = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+    latencies.sort()
+    return latencies, succeeded, seconds, cpu
+
+
+def _serve(config: MockApnsConfig, conn: multiprocessing.connection.Connection) -> None:
+    async def serve() -> None:
+        async with MockApnsServer(config) as server:
+            conn.send((server.url, server.cert_pem))
+            stop = asyncio.get_running_loop().run_in_executor(None, conn.recv)
+            await stop
+            conn.send(server.connections)
+
+    asyncio.run(serve())
+
+
+async def run_benchmark(
+    scenario: Scenario,
+    *,
+    count: int = 1000,
+    concurrency: int = 100,
+    config: MockApnsConfig | None = None,
+    isolate_server: bool = True,
+) -> BenchmarkReport:
+    """
+    Push `count` notifications (for `long`: `count` long messages) through a real
+    HTTP/2 + TLS round trip to a MockApnsServer and report throughput, latency,
+    CPU and memory.
+
+    With `isolate_server=True` the server runs in its own process, so CPU and
+    memory figures belong to the client alone.
+    """
+    config = config if config is not None else MockApnsConfig()
+    if not isolate_server:
+        async with MockApnsServer(config) as server:
+            latencies, succeeded, seconds, cpu = await _measure(
+                scenario, url=server.url, verify=server.client_ssl_context(), count=count, concurrency=concurrency
+            )
+            connections = server.connections
+    else:
+        context = multiprocessing.get_context("spawn")
+        ours, theirs = context.Pipe()
+        process = context.Process(target=_serve, args=(config, theirs), daemon=True)
+        process.start()
+        try:
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, ours.poll, _SERVER_START_TIMEOUT_SECONDS):
+                raise RuntimeError("Mock APNs server process did not start.")
+            url, cert_pem = ours.recv()
+            verify = ssl.create_default_context(cadata=cert_pem.decode("ascii"))
+            latencies, succeeded, seconds, cpu = await _measure(
+                scenario, url=url, verify=verify, count=count, concurrency=concurrency
+            )
+            ours.send("stop")
+            connections = await loop.run_in_executor(None, ours.recv)
+        finally:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+
+    pushes = len(latencies)
+    return BenchmarkReport(
+        scenario=scenario,
+        pushes=pushes,
+        succeeded=succeeded,
+        seconds=seconds,
+        pushes_per_second=pushes / seconds if seconds > 0 else 0.0,
+        latency_p50_seconds=_quantile(latencies, 0.5),
+        latency_p99_seconds=_quantile(latencies, 0.99),
+        cpu_seconds_per_push=cpu / pushes if pushes else None,
+        peak_rss_bytes=_peak_rss_bytes(),
+        connections=connections,
+    )
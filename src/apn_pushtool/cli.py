@@ -1,24 +1,40 @@
 from __future__ import annotations
 
 import argparse
-import asyncio
+import contextlib
+import csv
 import json
 import os
 from pathlib import Path
 import sys
+import time
 from datetime import datetime
 import importlib.machinery
 import importlib.util
-from typing import Any
-
-from apn_pushtool.client import ApnsClient
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Iterator, TextIO, TypeVar
+
+# Keep module-level imports light: `--help`, `doctor` and hand-offs to a running
+# daemon must not pay for asyncio, httpx, h2, jwt or cryptography. Commands import
+# what they need when they run (see tests/unit/test_import_time.py).
+from apn_pushtool.daemon_client import DaemonClient, DaemonError, default_state_path
+from apn_pushtool.message import PushMessage
+from apn_pushtool.payload import basic_payload, encode_payload
 from apn_pushtool.config import (
     ConfigError,
+    CredentialsProvider,
     is_valid_device_token,
     load_apns_credentials,
     normalize_device_token,
 )
 
+if TYPE_CHECKING:
+    from apn_pushtool.registry import TokenRegistry
+    from apn_pushtool.resolver import AddressCache
+    from apn_pushtool.results import PushResult
+    from apn_pushtool.tokens import TokenSet
+
+_T = TypeVar("_T")
+
 
 def _default_dotenv_path() -> str:
     # 1) Explicit env var always wins (so user can keep secrets anywhere)
@@ -46,6 +62,30 @@ def _bool_env_hint() -> str:
     return "Use APNS_ENV=sandbox|production (or APNS_USE_SANDBOX=true|false)."
 
 
+def _add_registry_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--token-registry",
+        default=os.getenv("APNS_TOKEN_REGISTRY", ""),
+        help="SQLite file of dead device tokens to skip and record (default: APNS_TOKEN_REGISTRY; '' disables).",
+    )
+
+
+def _add_address_cache_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--address-cache",
+        default=os.getenv("APNS_ADDRESS_CACHE", ""),
+        help="JSON file caching the APNs host address between runs, to skip DNS (default: APNS_ADDRESS_CACHE; '' disables).",
+    )
+
+
+def _add_daemon_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Send directly even if 'apn-pushtool serve' is running with the same --dotenv.",
+    )
+
+
 def _parse_args(argv: list[str]) -> argparse.Namespace:
     p = argparse.ArgumentParser(prog="apn-pushtool", description="APNs push CLI tool")
     p.add_argument(
@@ -90,17 +130,187 @@ def _parse_args(argv: list[str]) -> argparse.Namespace:
     send.add_argument("--priority", type=int, default=10, choices=[5, 10])
     send.add_argument("--collapse-id", default="")
     send.add_argument("--json", action="store_true", help="Print result as JSON only.")
+    send.add_argument(
+        "--at",
+        default="",
+        help="Have the running daemon send it at this time: ISO 8601 (local time unless it has an offset) or Unix seconds.",
+    )
+    send.add_argument(
+        "--expiration",
+        default="",
+        help="apns-expiration: until when APNs keeps retrying an offline device (same formats as --at).",
+    )
+    send.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Only queue the push on the running daemon; do not wait for the APNs response.",
+    )
+    _add_registry_arg(send)
+    _add_address_cache_arg(send)
+    _add_daemon_arg(send)
 
     send_long = sub.add_parser("send-long", help="Split long text and send multiple pushes (reverse order).")
     send_long.add_argument("--title", required=True)
     g = send_long.add_mutually_exclusive_group(required=True)
     g.add_argument("--text", default="")
     g.add_argument("--text-file", default="", help="Read UTF-8 text from file.")
-    send_long.add_argument("--max-chars", type=int, default=50)
+    send_long.add_argument(
+        "--max-chars",
+        type=int,
+        default=None,
+        help="Optional cap on characters per part (default: fill each push up to the APNs payload limit).",
+    )
     send_long.add_argument("--delay-seconds", type=float, default=2.5)
+    send_long.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Send all parts back to back on one connection (no delay), grouped by thread-id.",
+    )
     send_long.add_argument("--start-badge", type=int, default=1)
     send_long.add_argument("--device-token", default="", help="Defaults to APNS_DEVICE_TOKEN if omitted.")
     send_long.add_argument("--json", action="store_true", help="Print result as JSON only.")
+    _add_registry_arg(send_long)
+    _add_address_cache_arg(send_long)
+    _add_daemon_arg(send_long)
+
+    send_batch = sub.add_parser(
+        "send-batch",
+        help="Send pushes to many devices from a JSONL/CSV file (or stdin), streaming JSONL results.",
+    )
+    send_batch.add_argument("--input", default="-", help="JSONL or CSV file; '-' reads stdin (default).")
+    send_batch.add_argument(
+        "--format",
+        default="auto",
+        choices=["auto", "jsonl", "csv"],
+        help="Input format (default: auto, i.e. csv for *.csv files, else jsonl).",
+    )
+    send_batch.add_argument(
+        "--audience",
+        default="",
+        help="Send --title/--body to every token in this file instead of reading --input: "
+        "a token set from check-tokens --packed, or a token list (one per line).",
+    )
+    send_batch.add_argument("--title", default="", help="Default title for rows without one.")
+    send_batch.add_argument("--body", default="", help="Default body for rows without one.")
+    send_batch.add_argument("--topic", default="", help="Defaults to APNS_BUNDLE_ID if omitted.")
+    send_batch.add_argument("--push-type", default="alert", help="APNs push type (default: alert).")
+    send_batch.add_argument("--priority", type=int, default=10, choices=[5, 10])
+    send_batch.add_argument("--concurrency", type=int, default=100, help="Max pushes in flight (default: 100).")
+    send_batch.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Send from N processes, each with its own connections; --concurrency applies per process (default: 1).",
+    )
+    send_batch.add_argument(
+        "--stripes",
+        type=int,
+        default=1,
+        help="Connections per process, spread over the addresses APNs resolves to (default: 1).",
+    )
+    send_batch.add_argument(
+        "--outbox",
+        default="",
+        help="Journal directory; re-running with the same input and outbox resumes where a run stopped.",
+    )
+    _add_registry_arg(send_batch)
+    _add_address_cache_arg(send_batch)
+
+    export_dead = sub.add_parser(
+        "export-dead-tokens",
+        help="Export device tokens APNs reported as Unregistered/BadDeviceToken (for pruning your backend).",
+    )
+    _add_registry_arg(export_dead)
+    export_dead.add_argument("--format", default="jsonl", choices=["jsonl", "csv"])
+
+    check_tokens = sub.add_parser(
+        "check-tokens",
+        help="Validate and deduplicate a token export (one token per line), reporting invalid rows.",
+    )
+    check_tokens.add_argument("--input", default="-", help="Token file; '-' reads stdin (default).")
+    check_tokens.add_argument("--output", default="", help="Write the valid, deduplicated tokens here (hex, one per line).")
+    check_tokens.add_argument(
+        "--packed",
+        default="",
+        help="Also write them as a compact token set (32 bytes per token) for send-batch --audience.",
+    )
+
+    serve = sub.add_parser(
+        "serve",
+        help="Run a daemon that keeps an APNs connection warm; send/send-long hand off to it automatically.",
+    )
+    serve.add_argument("--host", default="127.0.0.1", help="Listen address (default: 127.0.0.1).")
+    serve.add_argument("--port", type=int, default=0, help="Listen port (default: any free port).")
+    serve.add_argument(
+        "--state-file",
+        default=str(default_state_path()),
+        help="Where to write host/port/secret for clients (default: APNS_DAEMON_STATE or ~/.apn-pushtool/daemon.json).",
+    )
+    serve.add_argument("--queue-size", type=int, default=10_000, help="Max queued pushes (default: 10000).")
+    serve.add_argument("--concurrency", type=int, default=100, help="Max pushes in flight (default: 100).")
+    serve.add_argument("--stop", action="store_true", help="Stop the running daemon after it drains its queue.")
+    serve.add_argument(
+        "--coalesce-ms",
+        type=float,
+        default=None,
+        help="Hold each push this long and drop it if a newer one for the same device and collapse id arrives.",
+    )
+    serve.add_argument(
+        "--lanes",
+        action="store_true",
+        help="Queue pushes per priority/push type/topic so calls and priority-10 alerts overtake priority-5 traffic.",
+    )
+    serve.add_argument(
+        "--release-spread-seconds",
+        type=float,
+        default=0.0,
+        help="Spread pushes scheduled for the same time (send --at) randomly over this many seconds.",
+    )
+    serve.add_argument(
+        "--release-rate",
+        type=float,
+        default=None,
+        help="Release due scheduled pushes at most this many per second (default: no limit).",
+    )
+    serve.add_argument(
+        "--stripes",
+        type=int,
+        default=1,
+        help="Connections to keep, spread over the addresses APNs resolves to (default: 1).",
+    )
+    serve.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Expose Prometheus metrics at http://HOST:PORT/metrics (default: off).",
+    )
+    _add_registry_arg(serve)
+
+    bench = sub.add_parser(
+        "bench",
+        help="Benchmark the client against a local mock APNs server (no credentials needed).",
+    )
+    bench.add_argument("--scenario", default="all", choices=["all", "single", "fanout", "long"])
+    bench.add_argument(
+        "--count",
+        type=int,
+        default=1000,
+        help="Pushes per scenario; for 'long', number of long messages (default: 1000).",
+    )
+    bench.add_argument("--concurrency", type=int, default=100, help="Max pushes in flight for fanout (default: 100).")
+    bench.add_argument("--latency-ms", type=float, default=0.0, help="Mock server response delay (default: 0).")
+    bench.add_argument(
+        "--error-mix",
+        default="",
+        help="Injected errors as REASON=PROBABILITY pairs, e.g. 'TooManyRequests=0.01,Unregistered=0.02'.",
+    )
+    bench.add_argument("--goaway-after", type=int, default=None, help="Server sends GOAWAY after N responses.")
+    bench.add_argument("--max-concurrent-streams", type=int, default=1000)
+    bench.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Run the mock server in this process (CPU/memory figures then include it).",
+    )
 
     return p.parse_args(argv)
 
@@ -203,10 +413,113 @@ def cmd_doctor(args: argparse.Namespace) -> int:
     return 0
 
 
-async def _send_one(args: argparse.Namespace) -> dict[str, Any]:
+def _run_async(main: Coroutine[Any, Any, _T]) -> _T:
+    import asyncio
+
+    return asyncio.run(main)
+
+
+def _token_registry(args: argparse.Namespace) -> contextlib.AbstractContextManager[TokenRegistry | None]:
+    path = args.token_registry.strip()
+    if not path:
+        return contextlib.nullcontext()
+    from apn_pushtool.registry import TokenRegistry
+
+    return TokenRegistry(path)
+
+
+def _address_cache(args: argparse.Namespace) -> AddressCache | None:
+    path = args.address_cache.strip()
+    if not path:
+        return None
+    from apn_pushtool.resolver import AddressCache
+
+    return AddressCache(path)
+
+
+def cmd_export_dead_tokens(args: argparse.Namespace, out: TextIO) -> int:
+    path = args.token_registry.strip()
+    if not path:
+        raise ConfigError("Missing --token-registry (or APNS_TOKEN_REGISTRY).")
+    if not Path(path).expanduser().exists():
+        raise ConfigError(f"Token registry not found: {path}")
+
+    from apn_pushtool.registry import TokenRegistry
+
+    fields = ["environment", "topic", "device_token", "reason", "apns_timestamp", "recorded_at"]
+    with TokenRegistry(path) as registry:
+        if args.format == "csv":
+            writer = csv.writer(out)
+            writer.writerow(fields)
+            for status in registry.export():
+                writer.writerow([getattr(status, f) if getattr(status, f) is not None else "" for f in fields])
+        else:
+            for status in registry.export():
+                out.write(json.dumps({f: getattr(status, f) for f in fields}) + "\n")
+    return 0
+
+
+def cmd_check_tokens(args: argparse.Namespace, out: TextIO) -> int:
+    from apn_pushtool.tokens import TokenSet, validate_token_file, validate_tokens, write_tokens
+
+    if args.input == "-":
+        result = validate_tokens(sys.stdin.buffer.read())
+    else:
+        if not Path(args.input).expanduser().exists():
+            raise ConfigError(f"Token file not found: {args.input}")
+        result = validate_token_file(args.input)
+
+    for line, row in result.invalid:
+        print(f"line {line}: invalid device token {row!r}", file=sys.stderr)
+    if args.output:
+        write_tokens(args.output, result)
+    if args.packed:
+        TokenSet.from_packed(result.packed).save(args.packed)
+    out.write(json.dumps({"valid": len(result), "duplicates": result.duplicates, "invalid": len(result.invalid)}) + "\n")
+    return 1 if result.invalid else 0
+
+
+def _dotenv_key(dotenv_path: str | None) -> str | None:
+    # Identifies the credentials a daemon serves, so the CLI only hands off to a matching one.
+    return str(Path(dotenv_path).expanduser().resolve()) if dotenv_path else None
+
+
+def _daemon_client(args: argparse.Namespace, dotenv_path: str | None) -> DaemonClient | None:
+    if args.no_daemon:
+        return None
+    daemon = DaemonClient.connect(dotenv=_dotenv_key(dotenv_path), match_dotenv=True)
+    if daemon is not None:
+        # The daemon sends with its own settings (serve --token-registry); say so rather than drop these silently.
+        ignored = [
+            flag
+            for flag, value in (("--token-registry", args.token_registry), ("--address-cache", args.address_cache))
+            if value.strip()
+        ]
+        if ignored:
+            print(
+                f"Note: sending through the running daemon, which does not use {' or '.join(ignored)} "
+                "from this command; pass --no-daemon to send directly with them.",
+                file=sys.stderr,
+            )
+    return daemon
+
+
+def _parse_time(value: str, option: str) -> float:
+    """Unix seconds, or an ISO 8601 date/time (local time unless it carries an offset)."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ConfigError(f"{option}: expected Unix seconds or an ISO 8601 time, got {value!r}.") from None
+
+
+def _send_one(args: argparse.Namespace) -> PushResult | None:
+    """Send one push; returns None when it was only queued or scheduled on the daemon (--no-wait, --at)."""
     dotenv_path = _dotenv_path(args.dotenv)
-    creds = load_apns_credentials(dotenv_path=dotenv_path)
-    client = ApnsClient(creds)
 
     device_token = args.device_token.strip()
     if not device_token:
@@ -217,31 +530,52 @@ async def _send_one(args: argparse.Namespace) -> dict[str, Any]:
     if not is_valid_device_token(device_token):
         raise ConfigError("Invalid device token format. Expect 64 hex characters.")
 
-    topic = args.topic.strip() or creds.bundle_id
-    collapse_id = args.collapse_id.strip() or None
-
-    payload = client.create_basic_payload(
-        title=args.title,
-        body=args.body,
-        badge=args.badge,
-        sound=args.sound,
-        custom_data={"source": "apn-pushtool", "ts": int(asyncio.get_event_loop().time())},
-    )
-
-    return await client.send_push(
+    message = PushMessage(
         device_token=device_token,
-        payload=payload,
-        topic=topic,
+        payload=basic_payload(
+            title=args.title,
+            body=args.body,
+            badge=args.badge,
+            sound=args.sound,
+            custom_data={"source": "apn-pushtool", "ts": int(time.monotonic())},
+        ),
+        topic=args.topic.strip() or None,
         push_type=args.push_type,
         priority=args.priority,
-        collapse_id=collapse_id,
+        collapse_id=args.collapse_id.strip() or None,
+        expiration=int(_parse_time(args.expiration, "--expiration")) if args.expiration.strip() else None,
     )
+    send_at = _parse_time(args.at, "--at") if args.at.strip() else None
 
+    daemon = _daemon_client(args, dotenv_path)
+    if daemon is not None:
+        with daemon:
+            if send_at is not None:
+                daemon.schedule([message], send_at)
+                return None
+            if args.no_wait:
+                daemon.enqueue([message])
+                return None
+            return daemon.send([message])[0]
+    if send_at is not None:
+        raise ConfigError("--at needs a running daemon (start one with 'apn-pushtool serve').")
+    if args.no_wait:
+        raise ConfigError("--no-wait needs a running daemon (start one with 'apn-pushtool serve').")
+
+    return _run_async(_send_message(args, dotenv_path, message))
+
+
+async def _send_message(args: argparse.Namespace, dotenv_path: str | None, message: PushMessage) -> PushResult:
+    from apn_pushtool.client import ApnsClient
 
-async def _send_long(args: argparse.Namespace) -> list[dict[str, Any]]:
-    dotenv_path = _dotenv_path(args.dotenv)
     creds = load_apns_credentials(dotenv_path=dotenv_path)
-    client = ApnsClient(creds)
+    with _token_registry(args) as registry:
+        async with ApnsClient(creds, registry=registry, address_cache=_address_cache(args)) as client:
+            return await client.send_message(message)
+
+
+def _send_long(args: argparse.Namespace) -> list[PushResult]:
+    dotenv_path = _dotenv_path(args.dotenv)
 
     device_token = args.device_token.strip()
     if not device_token:
@@ -257,14 +591,338 @@ async def _send_long(args: argparse.Namespace) -> list[dict[str, Any]]:
     else:
         long_text = args.text
 
-    return await client.send_long_message(
+    options: dict[str, Any] = {
+        "device_token": device_token,
+        "title": args.title,
+        "long_text": long_text,
+        "max_chars": args.max_chars,
+        "delay_seconds": args.delay_seconds,
+        "start_badge": args.start_badge,
+        "pipeline": args.pipeline,
+    }
+    daemon = _daemon_client(args, dotenv_path)
+    if daemon is not None:
+        with daemon:
+            return daemon.send_long(**options)
+
+    return _run_async(_send_long_message(args, dotenv_path, options))
+
+
+async def _send_long_message(
+    args: argparse.Namespace, dotenv_path: str | None, options: dict[str, Any]
+) -> list[PushResult]:
+    from apn_pushtool.client import ApnsClient
+
+    creds = load_apns_credentials(dotenv_path=dotenv_path)
+    with _token_registry(args) as registry:
+        async with ApnsClient(creds, registry=registry, address_cache=_address_cache(args)) as client:
+            return await client.send_long_message(**options)
+
+
+def _batch_format(args: argparse.Namespace) -> str:
+    if args.format != "auto":
+        return args.format
+    return "csv" if args.input.lower().endswith(".csv") else "jsonl"
+
+
+def _iter_batch_rows(stream: TextIO, fmt: str) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    """
+    Yield `(line_number, row)` pairs, where `row` is a dict or an error message for a
+    row that could not be parsed. Reads the stream incrementally.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {k: v for k, v in row.items() if k and v not in (None, "")}
+        return
+
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, "Each JSONL row must be an object."
+            continue
+        yield line_no, row
+
+
+def _batch_message(row: dict[str, Any], args: argparse.Namespace, *, topic: str) -> PushMessage:
+    device_token = normalize_device_token(str(row.get("device_token") or row.get("token") or ""))
+    if not is_valid_device_token(device_token):
+        raise ConfigError("Invalid device token format. Expect 64 hex characters.")
+
+    title = str(row.get("title") or args.title)
+    body = str(row.get("body") or args.body)
+    if not title or not body:
+        raise ConfigError("Missing title/body (set per row or via --title/--body).")
+
+    badge = row.get("badge")
+    custom_data = row.get("custom_data") or {}
+    if isinstance(custom_data, str):
+        custom_data = json.loads(custom_data)
+    if not isinstance(custom_data, dict):
+        raise ConfigError("custom_data must be a JSON object.")
+
+    aps: dict[str, Any] = {"alert": {"title": title, "body": body}, "sound": row.get("sound") or "default"}
+    if badge not in (None, ""):
+        aps["badge"] = int(badge)
+
+    return PushMessage(
         device_token=device_token,
-        title=args.title,
-        long_text=long_text,
-        max_chars=args.max_chars,
-        delay_seconds=args.delay_seconds,
-        start_badge=args.start_badge,
+        payload={"aps": aps, **custom_data},
+        topic=topic,
+        push_type=args.push_type,
+        priority=args.priority,
+    )
+
+
+def _load_audience(path: str, emit: Callable[[dict[str, Any]], None]) -> tuple[TokenSet, bool]:
+    """
+    Open a packed token set, or validate a token list; invalid rows are emitted as
+    failures and the valid tokens are still sent. Returns the set and whether all rows were valid.
+    """
+    from apn_pushtool.tokens import TokenSet, is_token_set_file, validate_token_file
+
+    if not Path(path).expanduser().exists():
+        raise ConfigError(f"Audience file not found: {path}")
+    if is_token_set_file(path):
+        try:
+            return TokenSet.open(path), True
+        except ValueError as e:
+            raise ConfigError(str(e)) from e
+    validation = validate_token_file(path)
+    for line_no, row in validation.invalid:
+        emit({"line": line_no, "success": False, "error": f"Invalid device token {row!r}"})
+    return TokenSet.from_packed(validation.packed), not validation.invalid
+
+
+async def _send_batch(args: argparse.Namespace, out: TextIO) -> bool:
+    if args.concurrency < 1:
+        raise ConfigError("--concurrency must be >= 1.")
+    if args.workers < 1:
+        raise ConfigError("--workers must be >= 1.")
+    if args.stripes < 1:
+        raise ConfigError("--stripes must be >= 1.")
+    if args.workers > 1 and args.outbox:
+        raise ConfigError("--outbox cannot be combined with --workers.")
+    if args.audience and (not args.title or not args.body):
+        # A token set has no rows to carry them, so every message uses --title/--body.
+        raise ConfigError("Missing title/body (set via --title/--body when using --audience).")
+
+    from apn_pushtool.client import ApnsClient
+    from apn_pushtool.outbox import Outbox, run_campaign
+    from apn_pushtool.results import ResultCollector
+
+    dotenv_path = _dotenv_path(args.dotenv)
+    creds = load_apns_credentials(dotenv_path=dotenv_path)
+    topic = args.topic.strip() or creds.bundle_id
+    fmt = _batch_format(args)
+
+    def emit(record: dict[str, Any]) -> None:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    all_ok = True
+
+    def messages(stream: TextIO) -> Iterator[tuple[int, PushMessage]]:
+        nonlocal all_ok
+        for line_no, row in _iter_batch_rows(stream, fmt):
+            try:
+                if isinstance(row, str):
+                    raise ConfigError(row)
+                message = _batch_message(row, args, topic=topic)
+            except (ConfigError, ValueError) as e:
+                all_ok = False
+                emit({"line": line_no, "success": False, "error": str(e)})
+                continue
+            yield line_no, message
+
+    def audience_messages(audience: TokenSet) -> Iterator[tuple[str, PushMessage]]:
+        # One encoded payload shared by every message; tokens become `str` only here.
+        content = encode_payload(basic_payload(title=args.title, body=args.body))
+        for token in audience:
+            yield token, PushMessage(
+                device_token=token,
+                payload=content,
+                topic=topic,
+                push_type=args.push_type,
+                priority=args.priority,
+            )
+
+    if args.audience:
+        stream: TextIO = sys.stdin
+    elif args.input == "-":
+        stream = sys.stdin
+    else:
+        try:
+            stream = open(args.input, encoding="utf-8", newline="")
+        except OSError as e:
+            raise ConfigError(f"Cannot read --input: {e}") from e
+
+    collector = ResultCollector(keep_failures=0)
+    outbox = Outbox(args.outbox) if args.outbox else None
+    skipped = 0
+    try:
+        with _token_registry(args) as registry:
+            batch: Iterator[tuple[Any, PushMessage]]
+            if args.audience:
+                audience, valid = _load_audience(args.audience, emit)
+                all_ok = all_ok and valid
+                if registry is not None:
+                    # Drop known-dead tokens up front rather than one by one while sending.
+                    before = len(audience)
+                    audience = audience.difference(registry.blocked_keys(environment=creds.environment, topic=topic))
+                    skipped = before - len(audience)
+                batch = audience_messages(audience)
+            else:
+                batch = messages(stream)
+            async with contextlib.AsyncExitStack() as stack:
+                if args.workers > 1:
+                    from apn_pushtool.shard import ShardedSender
+
+                    sender = ShardedSender(
+                        creds,
+                        workers=args.workers,
+                        max_in_flight=args.concurrency,
+                        registry=registry,
+                        address_cache=_address_cache(args),
+                        stripes=args.stripes,
+                    )
+                    results = (await stack.enter_async_context(sender)).send(batch)
+                else:
+                    client = await stack.enter_async_context(
+                        ApnsClient(creds, registry=registry, address_cache=_address_cache(args), stripes=args.stripes)
+                    )
+                    if outbox is None:
+                        results = client.send_batch(batch, max_in_flight=args.concurrency)
+                    else:
+                        results = run_campaign(client.send_message, outbox, batch, max_in_flight=args.concurrency)
+                async for key, result in results:
+                    all_ok = all_ok and result.success
+                    collector.add(result)
+                    if args.audience:
+                        # to_dict() shortens the token, and an audience has no line numbers.
+                        emit({**result.to_dict(), "device_token": key})
+                    else:
+                        emit({"line": key, **result.to_dict()})
+    finally:
+        if outbox is not None:
+            outbox.close()
+        if stream is not sys.stdin:
+            stream.close()
+
+    summary = collector.summary()
+    if skipped:
+        summary["skipped_dead_tokens"] = skipped
+    if outbox is not None:
+        summary["outbox"] = {"done": outbox.done, "pending": outbox.pending_count}
+    print(json.dumps({"summary": summary}), file=sys.stderr)
+    return all_ok
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    from apn_pushtool.client import ApnsClient
+    from apn_pushtool.daemon import PushDaemon
+    from apn_pushtool.metrics import ClientMetrics, serve_metrics
+
+    if args.stripes < 1:
+        raise ConfigError("--stripes must be >= 1.")
+    if args.release_rate is not None and args.release_rate <= 0:
+        raise ConfigError("--release-rate must be > 0.")
+    dotenv_path = _dotenv_path(args.dotenv)
+    # The daemon picks up edits to the .env/.p8 files without a restart.
+    credentials = CredentialsProvider(dotenv_path)
+    metrics = ClientMetrics() if args.metrics_port is not None else None
+    with _token_registry(args) as registry:
+        async with ApnsClient(credentials, registry=registry, metrics=metrics, stripes=args.stripes) as client:
+            daemon = PushDaemon(
+                client,
+                host=args.host,
+                port=args.port,
+                state_path=args.state_file,
+                queue_size=args.queue_size,
+                max_in_flight=args.concurrency,
+                dotenv=_dotenv_key(dotenv_path),
+                coalesce_seconds=args.coalesce_ms / 1000 if args.coalesce_ms is not None else None,
+                lanes=args.lanes,
+                release_spread_seconds=args.release_spread_seconds,
+                release_rate=args.release_rate,
+            )
+            async with daemon:
+                print(f"✅ Serving on {daemon.host}:{daemon.port} (state: {daemon.state_path})", file=sys.stderr)
+                if metrics is None:
+                    await daemon.serve_forever()
+                    return
+                exporter = await serve_metrics(metrics, host=args.host, port=args.metrics_port)
+                port = exporter.sockets[0].getsockname()[1]
+                print(f"✅ Metrics at http://{args.host}:{port}/metrics", file=sys.stderr)
+                try:
+                    await daemon.serve_forever()
+                finally:
+                    exporter.close()
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    if args.stop:
+        daemon = DaemonClient.connect(args.state_file)
+        if daemon is None:
+            print("No running daemon.", file=sys.stderr)
+            return 1
+        with daemon:
+            daemon.shutdown()
+        return 0
+
+    try:
+        _run_async(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _parse_error_mix(value: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        reason, sep, probability = item.partition("=")
+        try:
+            mix[reason.strip()] = float(probability)
+        except ValueError:
+            sep = ""
+        if not sep or not reason.strip():
+            raise ConfigError(f"Invalid --error-mix entry {item!r}; expected REASON=PROBABILITY.")
+    if sum(mix.values()) > 1:
+        raise ConfigError("--error-mix probabilities must add up to at most 1.")
+    return mix
+
+
+def cmd_bench(args: argparse.Namespace, out: TextIO) -> int:
+    # Imported here so the mock server and its h2 dependency load only for benchmarks.
+    from apn_pushtool.bench import SCENARIOS, run_benchmark
+    from apn_pushtool.mockserver import MockApnsConfig
+
+    config = MockApnsConfig(
+        latency_seconds=args.latency_ms / 1000,
+        error_mix=_parse_error_mix(args.error_mix),
+        goaway_after=args.goaway_after,
+        max_concurrent_streams=args.max_concurrent_streams,
     )
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    for scenario in scenarios:
+        report = _run_async(
+            run_benchmark(
+                scenario,
+                count=args.count,
+                concurrency=args.concurrency,
+                config=config,
+                isolate_server=not args.in_process,
+            )
+        )
+        print(json.dumps(report.to_dict()), file=out, flush=True)
+    return 0
 
 
 def main(argv: list[str] | None = None) -> None:
@@ -278,23 +936,46 @@ def main(argv: list[str] | None = None) -> None:
             raise SystemExit(cmd_doctor(args))
 
         if args.cmd == "send":
-            result = asyncio.run(_send_one(args))
+            result = _send_one(args)
+            if result is None:
+                print(json.dumps({"scheduled": True} if args.at.strip() else {"queued": True}))
+                raise SystemExit(0)
             if args.json:
-                print(json.dumps(result, ensure_ascii=False))
+                print(json.dumps(result.to_dict(), ensure_ascii=False))
             else:
-                print(json.dumps(result, indent=2, ensure_ascii=False))
-            raise SystemExit(0 if result.get("success") else 1)
+                print(json.dumps(result.to_dict(), indent=2, ensure_ascii=False))
+            raise SystemExit(0 if result.success else 1)
 
         if args.cmd == "send-long":
-            results = asyncio.run(_send_long(args))
+            results = _send_long(args)
+            records = [r.to_dict() for r in results]
             if args.json:
-                print(json.dumps(results, ensure_ascii=False))
+                print(json.dumps(records, ensure_ascii=False))
             else:
-                print(json.dumps(results, indent=2, ensure_ascii=False))
-            ok = all(r.get("success") for r in results)
+                print(json.dumps(records, indent=2, ensure_ascii=False))
+            ok = all(r.success for r in results)
+            raise SystemExit(0 if ok else 1)
+
+        if args.cmd == "export-dead-tokens":
+            raise SystemExit(cmd_export_dead_tokens(args, sys.stdout))
+
+        if args.cmd == "check-tokens":
+            raise SystemExit(cmd_check_tokens(args, sys.stdout))
+
+        if args.cmd == "serve":
+            raise SystemExit(cmd_serve(args))
+
+        if args.cmd == "bench":
+            raise SystemExit(cmd_bench(args, sys.stdout))
+
+        if args.cmd == "send-batch":
+            ok = _run_async(_send_batch(args, sys.stdout))
             raise SystemExit(0 if ok else 1)
 
         raise SystemExit(2)
     except ConfigError as e:
         print(f"❌ Config error: {e}", file=sys.stderr)
         raise SystemExit(2) from e
+    except DaemonError as e:
+        print(f"❌ Daemon error: {e}", file=sys.stderr)
+        raise SystemExit(1) from e
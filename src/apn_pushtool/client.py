@@ -1,161 +1,730 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timezone
+import logging
+import ssl
 import time
-from typing import Any, Dict, Optional
+import uuid
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    TypeVar,
+)
 
-from cryptography.hazmat.primitives import serialization
 import httpx
-import jwt
 
-from apn_pushtool.config import ApnsCredentials, ApnsEnvironment
+from apn_pushtool.auth import ProviderTokenCache, load_signing_key
+from apn_pushtool.config import ApnsCredentials, ApnsEnvironment, CredentialsProvider
+from apn_pushtool.message import PushMessage
+from apn_pushtool.metrics import ClientMetrics
+from apn_pushtool.payload import (
+    PayloadTooLargeError,
+    basic_payload,
+    encode_payload,
+    max_payload_size,
+    split_text,
+)
+from apn_pushtool.registry import TokenRegistry
+from apn_pushtool.resolver import AddressCache
+from apn_pushtool.results import PushResult, Reason
+from apn_pushtool.striping import STRIPE_FAILURES, StripeSet
+
+_K = TypeVar("_K")
+_V = TypeVar("_V")
+
+logger = logging.getLogger(__name__)
+
+# httpx `trace` request extension (see metrics.ClientMetrics.tracer).
+_Trace = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# How often a request that never reached APNs (refused by a GOAWAY, or failed
+# before it was written) is attempted.
+_UNDELIVERED_ATTEMPTS = 3
 
 
 class ApnsClient:
     def __init__(
         self,
-        creds: ApnsCredentials,
+        creds: ApnsCredentials | CredentialsProvider,
         *,
         timeout_seconds: float = 30.0,
         transport: httpx.AsyncBaseTransport | None = None,
+        token_cache: ProviderTokenCache | None = None,
+        max_connections: int = 4,
+        keepalive_expiry_seconds: float = 600.0,
+        registry: TokenRegistry | None = None,
+        server_url: str | None = None,
+        verify: ssl.SSLContext | bool = True,
+        metrics: ClientMetrics | None = None,
+        address_cache: AddressCache | None = None,
+        stripes: int = 1,
     ) -> None:
-        self._creds = creds
+        # With a provider, credentials are re-read (cheaply) on use and swapped in
+        # when the .env/.p8 files change; requests already sent keep theirs.
+        self._provider = creds if isinstance(creds, CredentialsProvider) else None
+        self._creds = creds.credentials() if isinstance(creds, CredentialsProvider) else creds
         self._timeout_seconds = timeout_seconds
         self._transport = transport
+        self._token_cache = token_cache if token_cache is not None else ProviderTokenCache()
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry_seconds,
+        )
+        self._http: httpx.AsyncClient | None = None
+        self.registry = registry
+        self._server_url = server_url.rstrip("/") if server_url else None
+        self._verify = verify
+        self.metrics = metrics
+        self.address_cache = address_cache
+        self._origins: Dict[str, tuple[str, int, str]] = {}
+        if stripes < 1:
+            raise ValueError("stripes must be >= 1.")
+        self._stripe_count = stripes
+        self._stripes: StripeSet | None = None
+        # Stripe sets replaced after an environment change, still closing; see aclose().
+        self._retiring: set[asyncio.Task[None]] = set()
+
+    async def __aenter__(self) -> ApnsClient:
+        if self._stripe_count == 1:
+            self._http_client()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
 
-        self._private_key = serialization.load_pem_private_key(
-            creds.p8_private_key_pem.encode("utf-8"), password=None
+    async def aclose(self) -> None:
+        http, self._http = self._http, None
+        if http is not None:
+            await http.aclose()
+        stripes, self._stripes = self._stripes, None
+        if stripes is not None:
+            await stripes.aclose()
+        retiring, self._retiring = self._retiring, set()
+        if retiring:
+            # Best effort, like their closing: failures are logged by _retired, not raised here.
+            await asyncio.gather(*retiring, return_exceptions=True)
+
+    def _http_client(self) -> httpx.AsyncClient:
+        # One long-lived HTTP/2 client per ApnsClient: connections (and their TLS
+        # sessions) are reused across pushes, and streams are multiplexed on them.
+        if self._http is None or self._http.is_closed:
+            self._http = self._new_http_client(self._limits)
+        return self._http
+
+    def _new_http_client(self, limits: httpx.Limits) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=True,
+            timeout=self._timeout_seconds,
+            transport=self._transport,
+            limits=limits,
+            verify=self._verify,
+            trust_env=True,
         )
 
+    @property
+    def stripe_set(self) -> StripeSet | None:
+        """The connections of a client with `stripes > 1`, once it has sent something."""
+        return self._stripes
+
+    def _stripe_set(self) -> StripeSet:
+        server = self.apns_server
+        stripes = self._stripes
+        if stripes is None or stripes.server != server:
+            if stripes is not None:
+                # The environment changed. Close the old set in the background (this is
+                # called mid-request) and keep the task, so aclose() waits for it.
+                task = asyncio.ensure_future(stripes.aclose())
+                self._retiring.add(task)
+                task.add_done_callback(self._retired)
+            # One connection per stripe, so each stripe is its own HTTP/2 connection.
+            limits = httpx.Limits(
+                max_connections=1, max_keepalive_connections=1, keepalive_expiry=self._limits.keepalive_expiry
+            )
+            stripes = self._stripes = StripeSet(
+                server,
+                self._stripe_count,
+                lambda: self._new_http_client(limits),
+                address_cache=self.address_cache,
+                # A transport passed in is shared by every stripe; closing one stripe must not close it.
+                close_clients=self._transport is None,
+                on_eject=self.metrics.stripe_ejected if self.metrics is not None else None,
+            )
+        return stripes
+
+    def _retired(self, task: asyncio.Task[None]) -> None:
+        self._retiring.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Closing the connections of a replaced stripe set failed", exc_info=task.exception())
+
+    @property
+    def credentials(self) -> ApnsCredentials:
+        if self._provider is not None:
+            creds = self._provider.credentials()
+            if creds is not self._creds:
+                self._swap_credentials(creds)
+        return self._creds
+
+    def _swap_credentials(self, creds: ApnsCredentials) -> None:
+        old, self._creds = self._creds, creds
+        if (old.team_id, old.key_id) == (creds.team_id, creds.key_id) and (
+            old.p8_private_key_pem != creds.p8_private_key_pem
+        ):
+            # Same key id with new key material: a token signed with the old key must not be reused.
+            self._token_cache.invalidate(old.team_id, old.key_id)
+
     @property
     def environment(self) -> ApnsEnvironment:
-        return self._creds.environment
+        return self.credentials.environment
 
     @property
     def apns_server(self) -> str:
+        if self._server_url is not None:
+            return self._server_url
         return (
             "https://api.sandbox.push.apple.com"
-            if self._creds.environment == "sandbox"
+            if self.credentials.environment == "sandbox"
             else "https://api.push.apple.com"
         )
 
     def generate_jwt_token(self) -> str:
-        headers = {"alg": "ES256", "kid": self._creds.key_id}
-        payload = {"iss": self._creds.team_id, "iat": int(time.time())}
-        return jwt.encode(payload, self._private_key, algorithm="ES256", headers=headers)
+        import jwt  # deferred with the key: only needed when a token is actually signed
+
+        creds = self.credentials
+        headers = {"alg": "ES256", "kid": creds.key_id}
+        payload = {"iss": creds.team_id, "iat": int(time.time())}
+        if self.metrics is not None:
+            self.metrics.token_signed()
+        return jwt.encode(payload, load_signing_key(creds.p8_private_key_pem), algorithm="ES256", headers=headers)
+
+    def provider_token(self) -> str:
+        """Return a cached provider token, signing a new one only when it is due for refresh."""
+        creds = self.credentials
+        return self._token_cache.get(creds.team_id, creds.key_id, self.generate_jwt_token)
+
+    def invalidate_provider_token(self, token: str | None = None) -> None:
+        creds = self.credentials
+        self._token_cache.invalidate(creds.team_id, creds.key_id, token)
 
+    @staticmethod
     def create_basic_payload(
-        self,
         *,
         title: str,
         body: str,
         badge: Optional[int] = None,
         sound: str = "default",
         custom_data: Optional[Dict[str, Any]] = None,
+        thread_id: Optional[str] = None,
     ) -> Dict[str, Any]:
-        aps: Dict[str, Any] = {"alert": {"title": title, "body": body}, "sound": sound}
-        if badge is not None:
-            aps["badge"] = badge
+        return basic_payload(
+            title=title, body=body, badge=badge, sound=sound, custom_data=custom_data, thread_id=thread_id
+        )
 
-        payload: Dict[str, Any] = {"aps": aps}
-        if custom_data:
-            payload.update(custom_data)
-        return payload
+    def _build_headers(
+        self,
+        *,
+        topic: Optional[str],
+        push_type: str,
+        priority: int,
+        collapse_id: Optional[str],
+        expiration: Optional[int] = None,
+        apns_id: Optional[str] = None,
+    ) -> Dict[str, str]:
+        headers: Dict[str, str] = {
+            "apns-topic": topic if topic is not None else self.credentials.bundle_id,
+            "apns-push-type": push_type,
+            "apns-priority": str(priority),
+            "content-type": "application/json",
+        }
+        if collapse_id:
+            headers["apns-collapse-id"] = collapse_id
+        if expiration is not None:
+            headers["apns-expiration"] = str(expiration)
+        if apns_id:
+            headers["apns-id"] = apns_id
+        return headers
 
     async def send_push(
         self,
         *,
         device_token: str,
-        payload: Dict[str, Any],
+        payload: Dict[str, Any] | bytes,
         topic: Optional[str] = None,
         push_type: str = "alert",
         priority: int = 10,
         collapse_id: Optional[str] = None,
-    ) -> Dict[str, Any]:
-        if topic is None:
-            topic = self._creds.bundle_id
+        expiration: Optional[int] = None,
+        apns_id: Optional[str] = None,
+    ) -> PushResult:
+        headers = self._build_headers(
+            topic=topic,
+            push_type=push_type,
+            priority=priority,
+            collapse_id=collapse_id,
+            expiration=expiration,
+            apns_id=apns_id,
+        )
+        return await self._send_encoded(device_token, _content(payload), headers)
 
-        jwt_token = self.generate_jwt_token()
-        headers: Dict[str, str] = {
-            "authorization": f"bearer {jwt_token}",
-            "apns-topic": topic,
-            "apns-push-type": push_type,
-            "apns-priority": str(priority),
-            "content-type": "application/json",
-        }
-        if collapse_id:
-            headers["apns-collapse-id"] = collapse_id
+    async def send_many(
+        self,
+        device_tokens: Iterable[str] | AsyncIterable[str],
+        *,
+        payload: Dict[str, Any] | bytes,
+        topic: Optional[str] = None,
+        push_type: str = "alert",
+        priority: int = 10,
+        collapse_id: Optional[str] = None,
+        expiration: Optional[int] = None,
+        max_in_flight: int = 1000,
+    ) -> AsyncIterator[tuple[str, PushResult]]:
+        """
+        Send one payload to many device tokens, yielding `(device_token, result)` as each
+        push completes (not in input order).
 
-        url = f"{self.apns_server}/3/device/{device_token}"
+        The payload is encoded and the headers are built once for the whole run. At most
+        `max_in_flight` pushes are outstanding at a time, further capped by the
+        SETTINGS_MAX_CONCURRENT_STREAMS the server advertised on the open connections.
+        """
+        content = _content(payload)
+        headers = self._build_headers(
+            topic=topic,
+            push_type=push_type,
+            priority=priority,
+            collapse_id=collapse_id,
+            expiration=expiration,
+        )
+        jobs = (
+            (token, self._send_encoded(token, content, headers))
+            async for token in aiterate(device_tokens)
+        )
+        async for item in self._run_bounded(jobs, max_in_flight=max_in_flight):
+            yield item
 
-        async with httpx.AsyncClient(
-            http2=True,
-            timeout=self._timeout_seconds,
-            transport=self._transport,
-            trust_env=True,
-        ) as client:
-            try:
-                response = await client.post(url, headers=headers, json=payload)
-            except Exception as e:
-                return {
-                    "success": False,
-                    "error": str(e),
-                    "device_token": device_token[:8] + "...",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                }
-
-        result: Dict[str, Any] = {
-            "success": response.status_code == 200,
-            "status_code": response.status_code,
-            "headers": dict(response.headers),
-            "device_token": device_token[:8] + "...",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-        }
+    async def send_batch(
+        self,
+        messages: Iterable[tuple[_K, PushMessage]] | AsyncIterable[tuple[_K, PushMessage]],
+        *,
+        max_in_flight: int = 1000,
+    ) -> AsyncIterator[tuple[_K, PushResult]]:
+        """
+        Send individually addressed messages, yielding `(key, result)` as each push
+        completes. Keys are opaque to the client and only used for correlation.
+
+        Messages are pulled from `messages` lazily, so a large input is never held
+        in memory beyond the in-flight window.
+        """
+
+        async def jobs() -> AsyncIterator[tuple[_K, Awaitable[PushResult]]]:
+            async for key, message in aiterate(messages):
+                yield key, self.send_message(message)
+
+        async for item in self._run_bounded(jobs(), max_in_flight=max_in_flight):
+            yield item
+
+    async def send_message(self, message: PushMessage) -> PushResult:
+        return await self.send_push(
+            device_token=message.device_token,
+            payload=message.payload,
+            topic=message.topic,
+            push_type=message.push_type,
+            priority=message.priority,
+            collapse_id=message.collapse_id,
+            expiration=message.expiration,
+            apns_id=message.apns_id,
+        )
+
+    def _run_bounded(
+        self,
+        jobs: AsyncIterator[tuple[_K, Awaitable[PushResult]]],
+        *,
+        max_in_flight: int,
+    ) -> AsyncIterator[tuple[_K, PushResult]]:
+        return run_bounded(jobs, window=lambda: self._send_window(max_in_flight))
+
+    def _send_window(self, max_in_flight: int) -> int:
+        # httpcore already queues streams beyond each connection's
+        # SETTINGS_MAX_CONCURRENT_STREAMS; bounding our own window to the same
+        # capacity keeps us from building a backlog of waiting tasks. Each stripe
+        # is one HTTP/2 connection; without striping httpx multiplexes everything
+        # over a single connection to the origin, whatever `max_connections` says.
+        if self._stripes is not None:
+            streams = [_advertised_max_streams(stripe.http) for stripe in self._stripes]
+            known = [s for s in streams if s is not None]
+            if not known:
+                return max_in_flight
+            # Stripes not connected yet will talk to the same service; assume the same limit.
+            capacity = sum(known) + max(known) * (len(streams) - len(known))
+        else:
+            capacity = _advertised_max_streams(self._http)
+            if capacity is None:
+                return max_in_flight
+        return max(1, min(max_in_flight, capacity))
+
+    async def _send_encoded(
+        self, device_token: str, content: bytes, headers: Dict[str, str]
+    ) -> PushResult:
+        metrics = self.metrics
+        if metrics is None:
+            return await self._deliver(device_token, content, headers, None)
+        topic = headers["apns-topic"]
+        metrics.request_started(device_token, topic)
+        try:
+            result = await self._deliver(device_token, content, headers, metrics.tracer())
+        except BaseException:
+            metrics.request_cancelled(device_token, topic)
+            raise
+        metrics.request_finished(result, topic)
+        return result
+
+    async def _deliver(
+        self, device_token: str, content: bytes, headers: Dict[str, str], trace: Optional[_Trace]
+    ) -> PushResult:
+        if self.registry is not None and self.registry.is_blocked(
+            device_token, environment=self.environment, topic=headers["apns-topic"]
+        ):
+            # APNs already told us this token is dead; don't spend a stream on it.
+            return PushResult(
+                device_token,
+                reason=Reason.KNOWN_INVALID_TOKEN,
+                error={"reason": Reason.KNOWN_INVALID_TOKEN.value, "skipped": True},
+            )
+
+        limit = max_payload_size(headers["apns-push-type"])
+        if len(content) > limit:
+            # Fail locally instead of paying a round trip for a 413 PayloadTooLarge.
+            return PushResult(
+                device_token,
+                reason=Reason.PAYLOAD_TOO_LARGE,
+                error={"reason": Reason.PAYLOAD_TOO_LARGE.value, "size": len(content), "limit": limit},
+            )
+
+        started = time.monotonic()
+        try:
+            response = await self._post(f"/3/device/{device_token}", headers=headers, content=content, trace=trace)
+        except Exception as e:
+            finished = time.monotonic()
+            return PushResult(
+                device_token,
+                reason=Reason.CONNECTION_ERROR,
+                error=str(e),
+                elapsed=finished - started,
+                completed_at=finished,
+            )
+        finished = time.monotonic()
+
+        result = PushResult(
+            device_token,
+            status_code=response.status_code,
+            apns_id=response.headers.get("apns-id"),
+            elapsed=finished - started,
+            completed_at=finished,
+        )
 
         if response.status_code != 200:
             try:
-                result["error"] = response.json()
+                result.error = response.json()
             except Exception:
-                result["error"] = {"reason": "Unknown error", "status": response.status_code}
+                result.error = {"reason": "Unknown error", "status": response.status_code}
+            reason = result.error.get("reason") if isinstance(result.error, dict) else None
+            result.reason = Reason.parse(reason)
+            if self.registry is not None:
+                self.registry.record(device_token, result, environment=self.environment, topic=headers["apns-topic"])
 
         return result
 
+    async def _target(self, path: str, headers: Dict[str, str], extensions: Dict[str, Any]) -> str:
+        """URL for `path`; with an address cache, the cached address plus SNI/authority for the real host."""
+        server = self.apns_server
+        if self.address_cache is None:
+            return server + path
+        origin = self._origins.get(server)
+        if origin is None:
+            url = httpx.URL(server)
+            origin = self._origins[server] = (url.host, url.port or 443, url.netloc.decode("ascii"))
+        host, port, authority = origin
+        address = await self.address_cache.resolve(host, port)
+        if address is None:
+            return server + path
+        headers["host"] = authority
+        extensions["sni_hostname"] = host
+        return f"https://[{address}]:{port}{path}" if ":" in address else f"https://{address}:{port}{path}"
+
+    def _forget_address(self) -> None:
+        if self.address_cache is not None:
+            host, port, _ = self._origins[self.apns_server]
+            self.address_cache.forget(host, port)
+
+    async def _post(
+        self, path: str, *, headers: Dict[str, str], content: bytes, trace: Optional[_Trace] = None
+    ) -> httpx.Response:
+        # `headers` may be shared by concurrent sends, so never mutate it.
+        jwt_token = self.provider_token()
+        request_headers = {**headers, "authorization": f"bearer {jwt_token}"}
+        extensions: Dict[str, Any] = {"trace": _StreamProbe(trace)}
+        response = await self._request(path, request_headers, content, extensions)
+
+        if _is_expired_provider_token(response):
+            # The cached token was rejected; re-sign once and retry.
+            self.invalidate_provider_token(jwt_token)
+            if self.metrics is not None:
+                self.metrics.retried("expired_token")
+            request_headers["authorization"] = f"bearer {self.provider_token()}"
+            response = await self._request(path, request_headers, content, extensions)
+        return response
+
+    async def _request(
+        self, path: str, headers: Dict[str, str], content: bytes, extensions: Dict[str, Any]
+    ) -> httpx.Response:
+        if self._stripe_count > 1:
+            return await self._request_striped(path, headers, content, extensions)
+        client = self._http_client()
+        probe: _StreamProbe = extensions["trace"]
+        url = await self._target(path, headers, extensions)
+        for attempt in range(1, _UNDELIVERED_ATTEMPTS + 1):
+            probe.reset()
+            try:
+                return await client.post(url, headers=headers, content=content, extensions=extensions)
+            except httpx.ConnectError:
+                # A cached address that no longer answers: look the host up again.
+                if "sni_hostname" not in extensions or attempt == _UNDELIVERED_ATTEMPTS:
+                    raise
+                self._forget_address()
+                headers.pop("host", None)
+                extensions.pop("sni_hostname", None)
+                url = await self._target(path, headers, extensions)
+            except (httpx.RemoteProtocolError, httpx.WriteError) as e:
+                # The pooled connection went away under us. Resend only what certainly
+                # never reached APNs; a push that may have been delivered would show
+                # twice, so it fails with CONNECTION_ERROR and the caller decides.
+                if attempt == _UNDELIVERED_ATTEMPTS or not _undelivered(e, probe):
+                    raise
+                if self.metrics is not None:
+                    self.metrics.retried("connection")
+        raise AssertionError("unreachable")
+
+    async def _request_striped(
+        self, path: str, headers: Dict[str, str], content: bytes, extensions: Dict[str, Any]
+    ) -> httpx.Response:
+        stripes = self._stripe_set()
+        probe: _StreamProbe = extensions["trace"]
+        for attempt in range(1, _UNDELIVERED_ATTEMPTS + 1):
+            stripe = await stripes.pick()
+            url = stripes.pin(stripe, path, headers, extensions)
+            stripe.outstanding += 1
+            started = time.monotonic()
+            probe.reset()
+            try:
+                response = await stripe.http.post(url, headers=headers, content=content, extensions=extensions)
+            except STRIPE_FAILURES as e:
+                # The stripe is unhealthy either way; the push is retried on another one
+                # only if it certainly never reached APNs (see _request).
+                stripes.eject(stripe, "goaway" if isinstance(e, httpx.RemoteProtocolError) else "error")
+                if attempt == _UNDELIVERED_ATTEMPTS or not _undelivered(e, probe):
+                    raise
+                if self.metrics is not None:
+                    self.metrics.retried("connection")
+                continue
+            finally:
+                stripe.outstanding -= 1
+                stripes.release(stripe)
+            stripes.finished(stripe, time.monotonic() - started)
+            return response
+        raise AssertionError("unreachable")
+
     async def send_long_message(
         self,
         *,
         device_token: str,
         title: str,
         long_text: str,
-        max_chars: int = 50,
+        max_chars: Optional[int] = None,
         delay_seconds: float = 2.5,
         start_badge: int = 1,
-    ) -> list[Dict[str, Any]]:
-        chunks = [long_text[i : i + max_chars] for i in range(0, len(long_text), max_chars)]
-        total_messages = len(chunks)
-        results: list[Dict[str, Any] | None] = [None] * total_messages
+        pipeline: bool = False,
+        expiration: Optional[int] = None,
+    ) -> list[PushResult]:
+        """
+        Split `long_text` into as few pushes as fit the APNs payload limit (optionally
+        also capped at `max_chars` characters) and send them last part first, so part 1
+        ends up on top in Notification Center.
 
-        for send_order in range(total_messages, 0, -1):
-            index = send_order - 1
-            chunk = chunks[index]
+        By default parts are sent one at a time with `delay_seconds` between them. With
+        `pipeline=True` all parts go out back to back as concurrent streams on the pooled
+        connection; they share a thread-id so iOS groups them, and the badge and
+        part/total fields keep the order recoverable.
+        """
+        thread_id = f"apn-pushtool-{uuid.uuid4().hex}" if pipeline else None
+        timestamp = int(time.time())
 
-            current_badge = start_badge + send_order - 1 if start_badge > 0 else None
-            payload = self.create_basic_payload(
-                title=f"{title} ({send_order}/{total_messages})",
+        def payload_for(part: int, total: int, chunk: str) -> Dict[str, Any]:
+            return self.create_basic_payload(
+                title=f"{title} ({part}/{total})",
                 body=chunk,
-                badge=current_badge,
+                badge=start_badge + part - 1 if start_badge > 0 else None,
+                thread_id=thread_id,
                 custom_data={
                     "source": "long_message",
-                    "part": send_order,
-                    "total": total_messages,
-                    "send_order": total_messages - send_order + 1,
-                    "timestamp": int(time.time()),
+                    "part": part,
+                    "total": total,
+                    "send_order": total - part + 1,
+                    "timestamp": timestamp,
                 },
             )
 
-            results[index] = await self.send_push(device_token=device_token, payload=payload)
+        # The title and badge grow with the number of parts, so size the body budget
+        # for the widest part number and re-split if the count needs more digits.
+        digits = 1
+        while True:
+            widest = 10**digits - 1
+            overhead = len(_content(payload_for(widest, widest, "")))
+            budget = max_payload_size("alert") - overhead
+            if budget <= 0:
+                raise PayloadTooLargeError(overhead, max_payload_size("alert"))
+            chunks = split_text(long_text, budget, max_chars=max_chars) if long_text else []
+            if len(str(len(chunks))) <= digits:
+                break
+            digits += 1
+
+        total_messages = len(chunks)
+        messages = [
+            (index, PushMessage(
+                device_token=device_token,
+                payload=payload_for(index + 1, total_messages, chunks[index]),
+                expiration=expiration,
+            ))
+            for index in range(total_messages - 1, -1, -1)
+        ]
+        results: list[PushResult | None] = [None] * total_messages
 
-            if send_order > 1:
-                await asyncio.sleep(delay_seconds)
+        if pipeline:
+            async for index, result in self.send_batch(messages, max_in_flight=max(1, total_messages)):
+                results[index] = result
+        else:
+            for index, message in messages:
+                results[index] = await self.send_message(message)
+                if index > 0:
+                    await asyncio.sleep(delay_seconds)
 
         return [r for r in results if r is not None]
+
+
+class _StreamProbe:
+    """
+    httpx `trace` callback that notes which HTTP/2 stream, if any, carried the
+    request, so a failure can be told apart from one that may have been
+    delivered (see `_undelivered`). Passes every event on to `inner`.
+    """
+
+    __slots__ = ("_inner", "traced", "stream_id")
+
+    def __init__(self, inner: Optional[_Trace]) -> None:
+        self._inner = inner
+        self.traced = False
+        self.stream_id: Optional[int] = None
+
+    def reset(self) -> None:
+        self.traced = False
+        self.stream_id = None
+
+    async def __call__(self, name: str, info: Dict[str, Any]) -> None:
+        self.traced = True
+        if name == "http2.send_request_headers.started":
+            self.stream_id = info.get("stream_id")
+        if self._inner is not None:
+            await self._inner(name, info)
+
+
+def _undelivered(error: Exception, probe: _StreamProbe) -> bool:
+    """
+    Whether a failed request certainly did not reach APNs, so it is safe to resend:
+    a GOAWAY refused its stream (the server processed nothing above
+    `last_stream_id`), or it failed before its headers were written. A transport
+    that does not report `trace` events gives no such certainty.
+    """
+    if isinstance(error, httpx.ConnectError):
+        return True
+    cause: BaseException | None = error
+    while cause is not None:
+        # httpcore raises RemoteProtocolError(ConnectionTerminated) for a GOAWAY; httpx chains it.
+        last_stream_id = getattr(cause.args[0], "last_stream_id", None) if cause.args else None
+        if last_stream_id is not None:
+            return last_stream_id == 0 or (probe.stream_id is not None and probe.stream_id > last_stream_id)
+        cause = cause.__cause__ or cause.__context__
+    return probe.traced and probe.stream_id is None
+
+
+def _is_expired_provider_token(response: httpx.Response) -> bool:
+    if response.status_code != 403:
+        return False
+    try:
+        return response.json().get("reason") == "ExpiredProviderToken"
+    except Exception:
+        return False
+
+
+def _content(payload: Dict[str, Any] | bytes) -> bytes:
+    # Pre-encoded payloads (e.g. from PayloadTemplate.render) are sent as-is.
+    return payload if isinstance(payload, bytes) else encode_payload(payload)
+
+
+async def run_bounded(
+    jobs: AsyncIterator[tuple[_K, Awaitable[_V]]],
+    *,
+    window: Callable[[], int],
+) -> AsyncIterator[tuple[_K, _V]]:
+    """
+    Run `(key, awaitable)` jobs with at most `window()` outstanding, yielding
+    `(key, result)` in completion order. Jobs are pulled lazily; any still pending
+    when the consumer stops iterating are cancelled.
+    """
+    pending: dict[asyncio.Future[_V], _K] = {}
+    try:
+        async for key, job in jobs:
+            # Schedule before waiting, so a job pulled from `jobs` is never left unawaited.
+            pending[asyncio.ensure_future(job)] = key
+            while len(pending) >= window():
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    yield pending.pop(fut), fut.result()
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                yield pending.pop(fut), fut.result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+async def aiterate(items: Iterable[_K] | AsyncIterable[_K]) -> AsyncIterator[_K]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def _advertised_max_streams(http: httpx.AsyncClient | None) -> int | None:
+    """
+    SETTINGS_MAX_CONCURRENT_STREAMS the server advertised on the client's open
+    HTTP/2 connection (the largest, if several are open), or None if unknown.
+
+    httpx has no public API for this, so it is read from httpcore's private
+    connection state (httpx 0.28 / httpcore 1.0). This is the only place that
+    does; if that layout changes the answer is None and callers fall back to
+    their own limit.
+    """
+    try:
+        connections = http._transport._pool.connections  # type: ignore[union-attr]
+        states = [c._connection._h2_state for c in connections if hasattr(c._connection, "_h2_state")]
+        return max((s.remote_settings.max_concurrent_streams for s in states), default=None)
+    except Exception:
+        return None
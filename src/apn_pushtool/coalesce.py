@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import time
+from typing import Awaitable, Callable, Optional
+
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult, Reason
+
+_Key = tuple[str, Optional[str]]
+
+
+@dataclass(slots=True)
+class CoalescingStats:
+    enqueued: int = 0
+    sent: int = 0
+    # Messages replaced by a newer one for the same (device, collapse id) before they were sent.
+    coalesced: int = 0
+
+
+@dataclass(slots=True)
+class _Pending:
+    message: PushMessage
+    future: asyncio.Future[PushResult]
+    due: float
+
+
+class CoalescingQueue:
+    """
+    Send queue that drops superseded notifications before they hit the wire.
+
+    A message waits up to `window_seconds` before it is sent. If a newer message
+    for the same device and collapse id arrives meanwhile, it takes the older
+    one's place (and send time, so a steady stream of updates still goes out at
+    least once per window); the older one's future resolves with a
+    `Coalesced` result. Messages without a collapse id are never merged unless
+    `coalesce_without_collapse_id=True`, which merges them per device.
+
+    `put` returns a future for the message's result; at most `max_in_flight`
+    sends run at once and at most `max_pending` messages wait (further `put`s
+    wait for room).
+    """
+
+    def __init__(
+        self,
+        send: Callable[[PushMessage], Awaitable[PushResult]],
+        *,
+        window_seconds: float = 0.5,
+        max_in_flight: int = 100,
+        max_pending: int = 100_000,
+        coalesce_without_collapse_id: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._send = send
+        self._window_seconds = window_seconds
+        self._max_pending = max_pending
+        self._coalesce_without_collapse_id = coalesce_without_collapse_id
+        self._clock = clock
+        # Insertion order is send order: replacing an entry keeps its position and due time.
+        self._pending: OrderedDict[_Key | int, _Pending] = OrderedDict()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._arrived = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._room = asyncio.Event()
+        self._sending: set[asyncio.Task[None]] = set()
+        self._dispatcher: asyncio.Task[None] | None = None
+        self._unkeyed = 0
+        self._closing = False
+        self.stats = CoalescingStats()
+
+    async def __aenter__(self) -> CoalescingQueue:
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self) -> None:
+        """Send everything still pending (without waiting out the window), then stop."""
+        self._closing = True
+        self._stop.set()
+        self._arrived.set()
+        if self._dispatcher is not None:
+            await self._dispatcher
+            self._dispatcher = None
+        if self._sending:
+            await asyncio.wait(set(self._sending))
+
+    def _key(self, message: PushMessage) -> _Key | int:
+        if message.collapse_id is not None or self._coalesce_without_collapse_id:
+            return (message.device_token, message.collapse_id)
+        # Unique key: never merged with anything.
+        self._unkeyed += 1
+        return self._unkeyed
+
+    async def put(self, message: PushMessage) -> asyncio.Future[PushResult]:
+        if self._closing:
+            raise RuntimeError("CoalescingQueue is closed.")
+        self.start()
+        future: asyncio.Future[PushResult] = asyncio.get_running_loop().create_future()
+        key = self._key(message)
+        self.stats.enqueued += 1
+
+        older = self._pending.get(key)
+        if older is not None:
+            if not older.future.done():
+                older.future.set_result(
+                    PushResult(message.device_token, reason=Reason.COALESCED, error={"reason": Reason.COALESCED.value})
+                )
+            older.message, older.future = message, future
+            self.stats.coalesced += 1
+            return future
+
+        while len(self._pending) >= self._max_pending:
+            self._room.clear()
+            await self._room.wait()
+        self._pending[key] = _Pending(message, future, self._clock() + self._window_seconds)
+        self._arrived.set()
+        return future
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._arrived.clear()
+                await self._arrived.wait()
+                continue
+            key, head = next(iter(self._pending.items()))
+            wait = head.due - self._clock()
+            if wait > 0 and not self._closing:
+                try:
+                    # Only close() cuts the wait short; new arrivals are due after the head.
+                    await asyncio.wait_for(self._stop.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._slots.acquire()
+            # Popped only now, so a newer message can still replace it while we wait for a slot.
+            entry = self._pending.pop(key)
+            self._room.set()
+            task = asyncio.create_task(self._deliver(entry))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _deliver(self, entry: _Pending) -> None:
+        try:
+            result = await self._send(entry.message)
+        except Exception as e:
+            result = PushResult(entry.message.device_token, reason=Reason.CONNECTION_ERROR, error=str(e))
+        finally:
+            self._slots.release()
+        self.stats.sent += 1
+        if not entry.future.done():
+            entry.future.set_result(result)
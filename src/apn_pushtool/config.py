@@ -3,9 +3,10 @@ from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
 import os
-from typing import Literal
-
-from dotenv import load_dotenv
+import string
+import threading
+import time
+from typing import Callable, Literal, Mapping, Optional
 
 
 class ConfigError(RuntimeError):
@@ -24,25 +25,45 @@ class ApnsCredentials:
     environment: ApnsEnvironment
 
 
+# .env files already loaded into os.environ, with the stamp they had at the time.
+_loaded_dotenv: dict[str, "_FileStamp"] = {}
+
+
+def _load_dotenv(dotenv_path: str) -> None:
+    # load_dotenv never overrides, so re-loading an unchanged file is pure overhead
+    # (load_device_token and load_apns_credentials both get here in one command).
+    stamp = _stamp(Path(dotenv_path).expanduser())
+    if stamp is not None and _loaded_dotenv.get(dotenv_path) == stamp:
+        return
+    # python-dotenv is imported on first use; commands that never read a .env skip it.
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path, override=False)
+    _loaded_dotenv[dotenv_path] = stamp
+
+
+_DELETE_HEX_DIGITS = str.maketrans("", "", string.hexdigits)
+
+
 def normalize_device_token(token: str) -> str:
     return token.strip().replace(" ", "").replace("-", "")
 
 
 def is_valid_device_token(token: str) -> bool:
+    # Anything left after deleting the hex digits (including "_" and "0x",
+    # which int(token, 16) would accept) makes the token invalid.
     token = normalize_device_token(token)
-    if len(token) != 64:
-        return False
-    try:
-        int(token, 16)
-    except ValueError:
-        return False
-    return True
+    return len(token) == 64 and not token.translate(_DELETE_HEX_DIGITS)
 
 
 def load_device_token(*, dotenv_path: str | None = None) -> str:
     if dotenv_path:
-        load_dotenv(dotenv_path, override=False)
-    token = os.getenv("APNS_DEVICE_TOKEN", "").strip()
+        _load_dotenv(dotenv_path)
+    return _device_token_from(os.environ)
+
+
+def _device_token_from(env: Mapping[str, str | None]) -> str:
+    token = (env.get("APNS_DEVICE_TOKEN") or "").strip()
     if not token:
         raise ConfigError("Missing APNS_DEVICE_TOKEN (or pass --device-token).")
     token = normalize_device_token(token)
@@ -87,14 +108,22 @@ def load_apns_credentials(*, dotenv_path: str | None = None) -> ApnsCredentials:
     - APNS_USE_SANDBOX: 1|0 / true|false (legacy, overrides APNS_ENV if set)
     """
     if dotenv_path:
-        load_dotenv(dotenv_path, override=False)
+        _load_dotenv(dotenv_path)
+    return _credentials_from(os.environ, dotenv_path=dotenv_path)
+
 
-    team_id = os.getenv("APNS_TEAM_ID", "").strip()
-    key_id = os.getenv("APNS_KEY_ID", "").strip()
-    bundle_id = os.getenv("APNS_BUNDLE_ID", "").strip()
+def _p8_path(env: Mapping[str, str | None], *, dotenv_path: str | None) -> Path | None:
+    p8_path = (env.get("APNS_P8_PATH") or "").strip()
+    return _resolve_path(p8_path, dotenv_path=dotenv_path) if p8_path else None
 
-    p8_path = os.getenv("APNS_P8_PATH", "").strip()
-    p8_inline = os.getenv("APNS_P8_PRIVATE_KEY", "").strip()
+
+def _credentials_from(env: Mapping[str, str | None], *, dotenv_path: str | None) -> ApnsCredentials:
+    team_id = (env.get("APNS_TEAM_ID") or "").strip()
+    key_id = (env.get("APNS_KEY_ID") or "").strip()
+    bundle_id = (env.get("APNS_BUNDLE_ID") or "").strip()
+
+    p8_path = _p8_path(env, dotenv_path=dotenv_path)
+    p8_inline = (env.get("APNS_P8_PRIVATE_KEY") or "").strip()
 
     if not team_id or not key_id or not bundle_id or (not p8_path and not p8_inline):
         raise ConfigError(
@@ -103,12 +132,11 @@ def load_apns_credentials(*, dotenv_path: str | None = None) -> ApnsCredentials:
 
     p8_private_key_pem = p8_inline
     if p8_path:
-        resolved_p8 = _resolve_path(p8_path, dotenv_path=dotenv_path)
-        p8_private_key_pem = _read_text_file(resolved_p8)
+        p8_private_key_pem = _read_text_file(p8_path)
 
     # Environment
-    env_value = os.getenv("APNS_ENV", "").strip().lower()
-    use_sandbox_value = os.getenv("APNS_USE_SANDBOX", "").strip().lower()
+    env_value = (env.get("APNS_ENV") or "").strip().lower()
+    use_sandbox_value = (env.get("APNS_USE_SANDBOX") or "").strip().lower()
 
     environment: ApnsEnvironment = "production"
     if env_value in ("sandbox", "production"):
@@ -129,3 +157,102 @@ def load_apns_credentials(*, dotenv_path: str | None = None) -> ApnsCredentials:
         p8_private_key_pem=p8_private_key_pem,
         environment=environment,
     )
+
+
+# (mtime_ns, inode, size) of a file, or None if it does not exist.
+_FileStamp = Optional[tuple[int, int, int]]
+
+
+def _stamp(path: Path | None) -> _FileStamp:
+    if path is None:
+        return None
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+class CredentialsProvider:
+    """
+    Cached credentials for long-running processes (the daemon, library use).
+
+    The .env file is parsed without touching os.environ (process environment
+    variables still take precedence over it, as with `load_apns_credentials`),
+    the .p8 file is read, and the private key is parsed once to validate it.
+    The result is kept until the mtime, inode or size of the .env or .p8 file
+    changes; files are stat'ed at most every `check_interval_seconds`.
+
+    A reload builds the new credentials completely before swapping them in, so
+    readers always see a consistent set. If the edited files are invalid (for
+    example half-written), the previous credentials stay in use and the error
+    is kept in `last_error`.
+    """
+
+    def __init__(
+        self,
+        dotenv_path: str | None = None,
+        *,
+        check_interval_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.dotenv_path = dotenv_path
+        self._check_interval_seconds = check_interval_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._env: dict[str, str | None] = {}
+        self._creds: ApnsCredentials | None = None
+        self._stamps: tuple[_FileStamp, _FileStamp] = (None, None)
+        self._p8_path: Path | None = None
+        self._checked_at = -float("inf")
+        self.generation = 0
+        self.last_error: ConfigError | None = None
+
+    def credentials(self) -> ApnsCredentials:
+        if self._creds is None or self._clock() - self._checked_at >= self._check_interval_seconds:
+            self.refresh()
+        assert self._creds is not None
+        return self._creds
+
+    def device_token(self) -> str:
+        """APNS_DEVICE_TOKEN from the same cached environment as the credentials."""
+        self.credentials()
+        return _device_token_from(self._env)
+
+    def refresh(self, *, force: bool = False) -> bool:
+        """Reload if the files changed (or `force`); returns True if new credentials were swapped in."""
+        with self._lock:
+            self._checked_at = self._clock()
+            dotenv = Path(self.dotenv_path).expanduser() if self.dotenv_path else None
+            stamps = (_stamp(dotenv), _stamp(self._p8_path))
+            if self._creds is not None and not force and stamps == self._stamps:
+                return False
+            try:
+                env, creds, p8_path = self._load(dotenv)
+            except ConfigError as e:
+                if self._creds is None:
+                    raise
+                self.last_error = e
+                return False
+            self._env, self._creds, self._p8_path = env, creds, p8_path
+            self._stamps = (stamps[0], _stamp(p8_path))
+            self.generation += 1
+            self.last_error = None
+            return True
+
+    def _load(self, dotenv: Path | None) -> tuple[dict[str, str | None], ApnsCredentials, Path | None]:
+        env: dict[str, str | None] = {}
+        if dotenv is not None:
+            from dotenv import dotenv_values
+
+            env.update(dotenv_values(dotenv))
+        env.update((k, v) for k, v in os.environ.items() if k.startswith("APNS_"))
+
+        creds = _credentials_from(env, dotenv_path=self.dotenv_path)
+        from apn_pushtool.auth import load_signing_key
+
+        try:
+            load_signing_key(creds.p8_private_key_pem)
+        except (ValueError, TypeError) as e:
+            raise ConfigError(f"Invalid APNs private key: {e}") from e
+        return env, creds, _p8_path(env, dotenv_path=self.dotenv_path)
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import asdict, dataclass
+import json
+import os
+from pathlib import Path
+import secrets
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+
+# DaemonClient and DaemonError are re-exported so callers need only this module.
+from apn_pushtool.daemon_client import (
+    DaemonClient,
+    DaemonError,
+    read_state,
+    default_state_path,
+    result_to_wire,
+)
+from apn_pushtool.coalesce import CoalescingQueue
+from apn_pushtool.lanes import LaneScheduler
+from apn_pushtool.schedule import SendScheduler
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult, Reason
+
+if TYPE_CHECKING:
+    from apn_pushtool.client import ApnsClient
+
+# Requests are single JSON lines; this bounds one line (e.g. a large `send` batch).
+_MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+def _write_state(path: Path, state: Dict[str, Any]) -> None:
+    # The state file holds the shared secret, so it is created owner-only.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+@dataclass(slots=True)
+class DaemonStats:
+    queued: int = 0
+    sent: int = 0
+    failed: int = 0
+    coalesced: int = 0
+    scheduled: int = 0
+
+
+_Job = tuple[Callable[[], Awaitable[list[PushResult]]], Optional["asyncio.Future[list[PushResult]]"]]
+
+
+class PushDaemon:
+    """
+    Keeps an ApnsClient warm and accepts notifications from other processes.
+
+    Clients connect over TCP on localhost and exchange JSON lines; every request
+    carries the secret from the state file, which is readable only by its owner.
+    Accepted notifications go into an in-memory queue that `max_in_flight` workers
+    drain over the client's pooled HTTP/2 connection, so a caller pays for one
+    local round trip instead of startup, key loading, JWT signing and a TLS
+    handshake. Requests with `"wait": false` are acknowledged as soon as they
+    are queued.
+
+    With `coalesce_seconds`, single notifications go through a CoalescingQueue
+    instead: each waits up to that long, and one superseded by a newer message
+    for the same device and collapse id is dropped (counted in `coalesced`).
+
+    With `lanes=True`, single notifications are sent through a LaneScheduler,
+    so calls and priority-10 alerts overtake queued priority-5 traffic.
+
+    Notifications sent with `schedule` wait in a SendScheduler until their
+    send-at time, spread over `release_spread_seconds` and paced at
+    `release_rate` per second. They are kept in memory only: the ones not yet
+    due when the daemon stops are dropped.
+    """
+
+    def __init__(
+        self,
+        client: ApnsClient,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        state_path: str | Path | None = None,
+        queue_size: int = 10_000,
+        max_in_flight: int = 100,
+        dotenv: str | None = None,
+        coalesce_seconds: float | None = None,
+        lanes: bool = False,
+        release_spread_seconds: float = 0.0,
+        release_rate: float | None = None,
+    ) -> None:
+        self.client = client
+        self.host = host
+        self.port = port
+        self.state_path = Path(state_path).expanduser() if state_path is not None else default_state_path()
+        self._secret = secrets.token_urlsafe(32)
+        self._dotenv = dotenv
+        self._queue: asyncio.Queue[_Job] = asyncio.Queue(maxsize=queue_size)
+        self._max_in_flight = max_in_flight
+        self._workers: list[asyncio.Task[None]] = []
+        self._server: asyncio.Server | None = None
+        self._stopping = False
+        self._stopped = asyncio.Event()
+        self._close_task: asyncio.Task[None] | None = None
+        self.stats = DaemonStats()
+        self._lanes = (
+            LaneScheduler(client.send_message, max_in_flight=max_in_flight, max_pending=queue_size) if lanes else None
+        )
+        send = self._lanes.send if self._lanes is not None else client.send_message
+        self._scheduler = SendScheduler(
+            send,
+            spread_seconds=release_spread_seconds,
+            max_rate=release_rate,
+            max_in_flight=max_in_flight,
+            on_result=lambda message, result: self._count(result),
+        )
+        self._coalescer = (
+            # In front of the lanes, it only hands messages on; the lanes bound what is in flight.
+            CoalescingQueue(
+                send, window_seconds=coalesce_seconds, max_in_flight=queue_size if lanes else max_in_flight
+            )
+            if coalesce_seconds is not None
+            else None
+        )
+
+    async def __aenter__(self) -> PushDaemon:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=_MAX_LINE_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self._max_in_flight)]
+        self._scheduler.start()
+        _write_state(
+            self.state_path,
+            {"host": self.host, "port": self.port, "secret": self._secret, "pid": os.getpid(), "dotenv": self._dotenv},
+        )
+
+    async def serve_forever(self) -> None:
+        """Run until a client sends `shutdown` (or the task is cancelled)."""
+        await self._stopped.wait()
+
+    async def close(self) -> None:
+        """
+        Stop accepting requests, finish everything already queued, then stop the
+        workers. Later calls (e.g. `__aexit__` after a `shutdown` request) wait for
+        the first one and see its error, if any.
+        """
+        await self._begin_close()
+
+    def _begin_close(self) -> asyncio.Task[None]:
+        if self._close_task is None:
+            self._close_task = asyncio.create_task(self._close())
+        return self._close_task
+
+    async def _close(self) -> None:
+        try:
+            await self._drain()
+        finally:
+            self._stopped.set()
+
+    async def _drain(self) -> None:
+        self._stopping = True
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        state = read_state(self.state_path)
+        if state is not None and state.get("secret") == self._secret:
+            self.state_path.unlink(missing_ok=True)
+        await self._queue.join()
+        await self._scheduler.close()
+        if self._coalescer is not None:
+            await self._coalescer.close()
+        if self._lanes is not None:
+            await self._lanes.close()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _count(self, result: PushResult) -> None:
+        if result.success:
+            self.stats.sent += 1
+        elif result.reason is Reason.COALESCED:
+            self.stats.coalesced += 1
+        else:
+            self.stats.failed += 1
+
+    def _count_future(self, future: asyncio.Future[PushResult]) -> None:
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.stats.failed += 1
+        else:
+            self._count(future.result())
+
+    async def _work(self) -> None:
+        while True:
+            run, future = await self._queue.get()
+            try:
+                results = await run()
+            except Exception as e:  # a failing job must not take the worker down
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            else:
+                for result in results:
+                    self._count(result)
+                if future is not None and not future.done():
+                    future.set_result(results)
+            finally:
+                self._queue.task_done()
+
+    async def _enqueue(
+        self, run: Callable[[], Awaitable[list[PushResult]]], *, wait: bool
+    ) -> Optional[asyncio.Future[list[PushResult]]]:
+        if self._stopping:
+            raise DaemonError("Daemon is shutting down.")
+        future = asyncio.get_running_loop().create_future() if wait else None
+        # Blocks while the queue is full, which pushes back on the sender.
+        await self._queue.put((run, future))
+        self.stats.queued += 1
+        return future
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict) or not secrets.compare_digest(
+                        str(request.get("secret", "")), self._secret
+                    ):
+                        writer.write(b'{"ok": false, "error": "Unauthorized."}\n')
+                        return
+                    response = await self._dispatch(request)
+                except (ValueError, KeyError, TypeError, DaemonError) as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass  # client went away, or sent an oversized line
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        wait = bool(request.get("wait", True))
+
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid()}
+
+        if op == "stats":
+            pending = self._queue.qsize() + sum(len(q) for q in (self._coalescer, self._lanes) if q is not None)
+            return {
+                "ok": True,
+                "stats": asdict(self.stats),
+                "pending": pending,
+                "scheduled": len(self._scheduler),
+                "next_due": self._scheduler.next_due(),
+            }
+
+        if op == "send":
+            messages = [PushMessage.from_dict(m) for m in request["messages"]]
+            if self._coalescer is not None or self._lanes is not None:
+                return await self._send_direct(messages, wait=wait)
+            futures = []
+            for message in messages:
+                futures.append(await self._enqueue(lambda m=message: self._send_one(m), wait=wait))
+            if not wait:
+                return {"ok": True, "queued": len(messages)}
+            batches = await asyncio.gather(*futures)  # type: ignore[arg-type]
+            return {"ok": True, "results": [result_to_wire(r) for batch in batches for r in batch]}
+
+        if op == "schedule":
+            if self._stopping:
+                raise DaemonError("Daemon is shutting down.")
+            send_at = float(request["send_at"])
+            messages = [PushMessage.from_dict(m) for m in request["messages"]]  # all valid, or none scheduled
+            count = self._scheduler.schedule_many(messages, send_at)
+            self.stats.scheduled += count
+            return {"ok": True, "scheduled": count}
+
+        if op == "send_long":
+            kwargs = {
+                "device_token": str(request["device_token"]),
+                "title": str(request["title"]),
+                "long_text": str(request["long_text"]),
+                "max_chars": request.get("max_chars"),
+                "delay_seconds": float(request.get("delay_seconds", 2.5)),
+                "start_badge": int(request.get("start_badge", 1)),
+                "pipeline": bool(request.get("pipeline", False)),
+            }
+            future = await self._enqueue(lambda: self.client.send_long_message(**kwargs), wait=wait)
+            if future is None:
+                return {"ok": True, "queued": 1}
+            return {"ok": True, "results": [result_to_wire(r) for r in await future]}
+
+        if op == "shutdown":
+            self._begin_close()  # serve_forever returns once it is done; the owner's close() waits for it
+            return {"ok": True}
+
+        raise DaemonError(f"Unknown op {op!r}.")
+
+    async def _send_direct(self, messages: list[PushMessage], *, wait: bool) -> Dict[str, Any]:
+        # Past the worker queue, straight into the coalescer (which feeds the lanes, if any) or the lanes.
+        if self._coalescer is not None:
+            put = self._coalescer.put
+        else:
+            assert self._lanes is not None
+            put = self._lanes.submit
+        if self._stopping:
+            raise DaemonError("Daemon is shutting down.")
+        futures = []
+        for message in messages:
+            future = await put(message)
+            future.add_done_callback(self._count_future)
+            futures.append(future)
+        self.stats.queued += len(messages)
+        if not wait:
+            return {"ok": True, "queued": len(messages)}
+        return {"ok": True, "results": [result_to_wire(r) for r in await asyncio.gather(*futures)]}
+
+    async def _send_one(self, message: PushMessage) -> list[PushResult]:
+        return [await self.client.send_message(message)]
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+import socket
+from typing import Any, Dict, Iterable, Optional
+
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult, Reason
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+def default_state_path() -> Path:
+    env = os.getenv("APNS_DAEMON_STATE", "").strip()
+    if env:
+        return Path(env).expanduser()
+    return Path.home() / ".apn-pushtool" / "daemon.json"
+
+
+def result_to_wire(result: PushResult) -> Dict[str, Any]:
+    return {
+        "device_token": result.device_token,
+        "status_code": result.status_code,
+        "apns_id": result.apns_id,
+        "reason": str(result.reason) if result.reason is not None else None,
+        "error": result.error,
+        "elapsed": result.elapsed,
+    }
+
+
+def result_from_wire(record: Dict[str, Any]) -> PushResult:
+    reason = record.get("reason")
+    return PushResult(
+        record["device_token"],
+        status_code=record.get("status_code"),
+        apns_id=record.get("apns_id"),
+        reason=Reason.parse(reason) if reason is not None else None,
+        error=record.get("error"),
+        elapsed=record.get("elapsed", 0.0),
+    )
+
+
+def read_state(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or not {"host", "port", "secret"} <= state.keys():
+        return None
+    return state
+
+
+class DaemonClient:
+    """
+    Blocking client for a running PushDaemon.
+
+        client = DaemonClient.connect()
+        if client is not None:
+            with client:
+                client.enqueue([PushMessage(device_token=token, payload=payload)])
+    """
+
+    def __init__(self, host: str, port: int, secret: str, *, timeout_seconds: float = 60.0) -> None:
+        self._secret = secret
+        self._timeout_seconds = timeout_seconds
+        self._sock = socket.create_connection((host, port), timeout=timeout_seconds)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rwb")
+
+    @classmethod
+    def connect(
+        cls,
+        state_path: str | Path | None = None,
+        *,
+        dotenv: str | None = None,
+        match_dotenv: bool = False,
+        timeout_seconds: float = 60.0,
+    ) -> Optional[DaemonClient]:
+        """
+        Connect to the daemon described by the state file, or return None if none is
+        running. With `match_dotenv=True`, only a daemon started with the same
+        `dotenv` (i.e. the same credentials) is used.
+        """
+        path = Path(state_path).expanduser() if state_path is not None else default_state_path()
+        state = read_state(path)
+        if state is None or (match_dotenv and state.get("dotenv") != dotenv):
+            return None
+        try:
+            return cls(state["host"], int(state["port"]), state["secret"], timeout_seconds=timeout_seconds)
+        except OSError:
+            return None  # stale state file from a daemon that is gone
+
+    def __enter__(self) -> DaemonClient:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+    def _call(self, request: Dict[str, Any], *, wait: bool = False) -> Dict[str, Any]:
+        """
+        One request/response round trip. With `wait`, the daemon answers only once
+        APNs has (a long message takes `delay_seconds` per part), so there is no
+        timeout; the daemon's own request timeout bounds each push.
+        """
+        request["secret"] = self._secret
+        try:
+            self._sock.settimeout(None if wait else self._timeout_seconds)
+            self._file.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        except OSError as e:  # includes socket.timeout
+            raise DaemonError(f"Daemon connection failed: {e or type(e).__name__}") from e
+        if not line:
+            raise DaemonError("Daemon closed the connection.")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise DaemonError(response.get("error") or "Daemon request failed.")
+        return response
+
+    def ping(self) -> int:
+        return int(self._call({"op": "ping"})["pid"])
+
+    def stats(self) -> Dict[str, Any]:
+        return self._call({"op": "stats"})
+
+    def enqueue(self, messages: Iterable[PushMessage]) -> int:
+        """Queue messages on the daemon and return without waiting for APNs."""
+        response = self._call({"op": "send", "messages": [m.to_dict() for m in messages], "wait": False})
+        return int(response["queued"])
+
+    def schedule(self, messages: Iterable[PushMessage], send_at: float) -> int:
+        """Have the daemon send messages at `send_at` (Unix time); returns how many it accepted."""
+        response = self._call({"op": "schedule", "messages": [m.to_dict() for m in messages], "send_at": send_at})
+        return int(response["scheduled"])
+
+    def send(self, messages: Iterable[PushMessage]) -> list[PushResult]:
+        """Send messages through the daemon and wait for their results (in order)."""
+        response = self._call({"op": "send", "messages": [m.to_dict() for m in messages]}, wait=True)
+        return [result_from_wire(r) for r in response["results"]]
+
+    def send_long(
+        self,
+        *,
+        device_token: str,
+        title: str,
+        long_text: str,
+        max_chars: Optional[int] = None,
+        delay_seconds: float = 2.5,
+        start_badge: int = 1,
+        pipeline: bool = False,
+        wait: bool = True,
+    ) -> list[PushResult]:
+        response = self._call(
+            {
+                "op": "send_long",
+                "device_token": device_token,
+                "title": title,
+                "long_text": long_text,
+                "max_chars": max_chars,
+                "delay_seconds": delay_seconds,
+                "start_badge": start_badge,
+                "pipeline": pipeline,
+                "wait": wait,
+            },
+            wait=wait,
+        )
+        return [result_from_wire(r) for r in response.get("results", [])]
+
+    def shutdown(self) -> None:
+        """Ask the daemon to finish its queue and exit."""
+        self._call({"op": "shutdown"})
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, TypeVar
+
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult, Reason
+
+_K = TypeVar("_K")
+
+# (apns-priority, apns-push-type, apns-topic)
+LaneKey = tuple[int, str, Optional[str]]
+
+# Push types whose notifications are useless when late.
+URGENT_PUSH_TYPES = frozenset({"voip", "liveactivity", "location"})
+
+
+def default_lane(message: PushMessage) -> LaneKey:
+    return (message.priority, message.push_type, message.topic)
+
+
+def default_weight(lane: LaneKey) -> float:
+    """16 for calls and live activities, 4 for other priority-10 pushes, 1 for priority 5."""
+    priority, push_type, _ = lane
+    if push_type in URGENT_PUSH_TYPES:
+        return 16.0
+    return 4.0 if priority == 10 else 1.0
+
+
+@dataclass(slots=True)
+class _Entry:
+    lane: LaneKey
+    message: PushMessage
+    future: asyncio.Future[PushResult]
+
+
+class _Lane:
+    __slots__ = ("key", "weight", "queue", "deficit")
+
+    def __init__(self, key: LaneKey, weight: float) -> None:
+        self.key = key
+        self.weight = weight
+        self.queue: deque[_Entry] = deque()
+        self.deficit = 0.0
+
+
+class LaneScheduler:
+    """
+    Send queue with one lane per (priority, push type, topic), shared by
+    weighted fair queuing, so urgent notifications do not wait behind a bulk
+    broadcast.
+
+    At most `max_in_flight` sends run at once; whenever one finishes, the next
+    message is taken by deficit round robin over the lanes with messages
+    waiting: each turn a lane may send `weight` messages (see
+    `default_weight`), and idle lanes take nothing. A priority-10 alert thus
+    waits for at most one bulk message per round instead of the whole
+    backlog, while bulk traffic gets every slot urgent lanes leave unused.
+    Keep `max_in_flight` at or below what the client's connections carry, so
+    messages wait here and not in the connection pool, where there are no
+    lanes.
+
+    Each lane holds at most `max_pending` messages; `submit` waits for room in
+    its own lane only.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[PushMessage], Awaitable[PushResult]],
+        *,
+        max_in_flight: int = 100,
+        max_pending: int = 10_000,
+        lane: Callable[[PushMessage], LaneKey] = default_lane,
+        weight: Callable[[LaneKey], float] = default_weight,
+    ) -> None:
+        self._send = send
+        self._max_in_flight = max_in_flight
+        self._max_pending = max_pending
+        self._lane_of = lane
+        self._weight_of = weight
+        self._lanes: Dict[LaneKey, _Lane] = {}
+        # Lanes with messages waiting, in round-robin order; the head has the turn.
+        self._active: deque[_Lane] = deque()
+        self._pending = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._arrived = asyncio.Event()
+        self._room = asyncio.Event()
+        self._sending: set[asyncio.Task[None]] = set()
+        self._dispatcher: asyncio.Task[None] | None = None
+        self._closing = False
+        self.sent: Counter[LaneKey] = Counter()
+
+    async def __aenter__(self) -> LaneScheduler:
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    def __len__(self) -> int:
+        return self._pending
+
+    def start(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self) -> None:
+        """Send everything still waiting, then stop."""
+        self._closing = True
+        self._arrived.set()
+        if self._dispatcher is not None:
+            await self._dispatcher
+            self._dispatcher = None
+        if self._sending:
+            await asyncio.wait(set(self._sending))
+
+    def pending(self) -> Dict[LaneKey, int]:
+        """Messages waiting, by lane."""
+        return {key: len(lane.queue) for key, lane in self._lanes.items() if lane.queue}
+
+    async def submit(self, message: PushMessage) -> asyncio.Future[PushResult]:
+        """Queue a message; returns a future for its result."""
+        if self._closing:
+            raise RuntimeError("LaneScheduler is closed.")
+        self.start()
+        key = self._lane_of(message)
+        lane = self._lanes.get(key)
+        if lane is None:
+            weight = self._weight_of(key)
+            if weight <= 0:
+                raise ValueError(f"Lane weight must be > 0, got {weight} for {key}.")
+            lane = self._lanes[key] = _Lane(key, weight)
+        while len(lane.queue) >= self._max_pending:
+            self._room.clear()
+            await self._room.wait()
+        future: asyncio.Future[PushResult] = asyncio.get_running_loop().create_future()
+        if not lane.queue:
+            self._active.append(lane)
+        lane.queue.append(_Entry(key, message, future))
+        self._pending += 1
+        self._arrived.set()
+        return future
+
+    async def send(self, message: PushMessage) -> PushResult:
+        return await (await self.submit(message))
+
+    async def send_batch(
+        self,
+        messages: Iterable[tuple[_K, PushMessage]] | AsyncIterable[tuple[_K, PushMessage]],
+    ) -> AsyncIterator[tuple[_K, PushResult]]:
+        """Like ApnsClient.send_batch, with every message going through its lane."""
+        from apn_pushtool.client import aiterate, run_bounded  # keeps httpx out of the daemon's imports
+
+        async def jobs() -> AsyncIterator[tuple[_K, Awaitable[PushResult]]]:
+            async for key, message in aiterate(messages):
+                yield key, self.send(message)
+
+        # Enough queued to keep every slot busy, little enough that other lanes stay short.
+        async for item in run_bounded(jobs(), window=lambda: 2 * self._max_in_flight):
+            yield item
+
+    def _next(self) -> _Entry:
+        # Deficit round robin with a cost of 1 per message.
+        while True:
+            lane = self._active[0]
+            if lane.deficit < 1:
+                lane.deficit += lane.weight
+                if lane.deficit < 1:  # weight below 1: this lane sends every few rounds
+                    self._active.rotate(-1)
+                    continue
+            entry = lane.queue.popleft()
+            lane.deficit -= 1
+            if not lane.queue:
+                lane.deficit = 0.0  # an idle lane does not bank turns
+                self._active.popleft()
+            elif lane.deficit < 1:
+                self._active.rotate(-1)
+            return entry
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._active:
+                if self._closing:
+                    return
+                self._arrived.clear()
+                await self._arrived.wait()
+                continue
+            await self._slots.acquire()
+            # Chosen only now, so a message that arrived while we waited for a slot can win it.
+            entry = self._next()
+            self._pending -= 1
+            self._room.set()
+            task = asyncio.create_task(self._deliver(entry))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _deliver(self, entry: _Entry) -> None:
+        try:
+            result = await self._send(entry.message)
+        except Exception as e:
+            result = PushResult(entry.message.device_token, reason=Reason.CONNECTION_ERROR, error=str(e))
+        finally:
+            self._slots.release()
+        self.sent[entry.lane] += 1
+        if not entry.future.done():
+            entry.future.set_result(result)
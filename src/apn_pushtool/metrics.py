@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import bisect
+from collections import Counter
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence
+
+from apn_pushtool.results import LATENCY_BUCKETS, PushResult
+
+if TYPE_CHECKING:
+    import asyncio
+
+# Connection set-up is usually well below the push latency buckets.
+CONNECT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Fixed-bucket histogram, rendered in the Prometheus format."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def _render(self, name: str, labels: str, lines: list[str]) -> None:
+        cumulative = 0
+        for bound, count in zip((*self.bounds, float("inf")), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum!r}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+
+
+class ClientMetrics:
+    """
+    Counters and histograms for an ApnsClient, passed as `ApnsClient(metrics=...)`.
+
+    The client calls the hook methods below (request start/finish, retries, JWT
+    signing); connection set-up, TLS and the wait for APNs's response are timed
+    from httpx trace events on each request. Subclass and override the hooks to
+    forward events elsewhere, calling `super()` to keep the counters. Without a
+    metrics object the client skips all of this, so disabled metrics cost one
+    `is None` check per push.
+
+    `render()` returns the Prometheus text format; `serve_metrics` exposes it on
+    `/metrics`.
+    """
+
+    def __init__(self, *, trace_connections: bool = True) -> None:
+        self.requests: Counter[tuple[str, str, str]] = Counter()  # (status, reason, topic)
+        self.latency: Dict[str, Histogram] = {}  # by topic
+        self.in_flight = 0
+        self.tokens_signed = 0
+        self.retries: Counter[str] = Counter()
+        self.stripe_ejections: Counter[str] = Counter()
+        self.connections_opened = 0
+        self.connect_seconds = Histogram(CONNECT_BUCKETS)
+        self.tls_seconds = Histogram(CONNECT_BUCKETS)
+        self.response_seconds = Histogram()
+        self._trace_connections = trace_connections
+
+    def request_started(self, device_token: str, topic: str) -> None:
+        self.in_flight += 1
+
+    def request_finished(self, result: PushResult, topic: str) -> None:
+        self.in_flight -= 1
+        status = str(result.status_code) if result.status_code is not None else "none"
+        reason = str(result.reason) if result.reason is not None else ""
+        self.requests[(status, reason, topic)] += 1
+        histogram = self.latency.get(topic)
+        if histogram is None:
+            histogram = self.latency[topic] = Histogram()
+        histogram.observe(result.elapsed)
+
+    def request_cancelled(self, device_token: str, topic: str) -> None:
+        self.in_flight -= 1
+
+    def retried(self, cause: str) -> None:
+        """A request was sent again: `connection` (GOAWAY/write error) or `expired_token`."""
+        self.retries[cause] += 1
+
+    def stripe_ejected(self, cause: str) -> None:
+        """A striped connection was taken out of rotation: `error`, `goaway` or `slow`."""
+        self.stripe_ejections[cause] += 1
+
+    def token_signed(self) -> None:
+        self.tokens_signed += 1
+
+    def tracer(self) -> Optional[_RequestTrace]:
+        """The httpx `trace` extension for one request, or None to skip tracing."""
+        return _RequestTrace(self) if self._trace_connections else None
+
+    def connection_opened(self, connect_seconds: float) -> None:
+        self.connections_opened += 1
+        self.connect_seconds.observe(connect_seconds)
+
+    def tls_established(self, seconds: float) -> None:
+        self.tls_seconds.observe(seconds)
+
+    def response_received(self, seconds: float) -> None:
+        """Time from the request being written to APNs's response headers arriving."""
+        self.response_seconds.observe(seconds)
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        header("apns_requests_total", "counter", "Push requests by HTTP status, APNs reason and topic.")
+        for (status, reason, topic), count in sorted(self.requests.items()):
+            lines.append(
+                f'apns_requests_total{{status="{status}",reason="{_escape(reason)}",topic="{_escape(topic)}"}} {count}'
+            )
+        header("apns_request_duration_seconds", "histogram", "Push latency, including retries, by topic.")
+        for topic, histogram in sorted(self.latency.items()):
+            histogram._render("apns_request_duration_seconds", f'topic="{_escape(topic)}"', lines)
+        header("apns_requests_in_flight", "gauge", "Pushes sent and not yet answered.")
+        lines.append(f"apns_requests_in_flight {self.in_flight}")
+        header("apns_retries_total", "counter", "Requests sent again, by cause.")
+        for cause, count in sorted(self.retries.items()):
+            lines.append(f'apns_retries_total{{cause="{_escape(cause)}"}} {count}')
+        header("apns_stripe_ejections_total", "counter", "Striped connections ejected, by cause.")
+        for cause, count in sorted(self.stripe_ejections.items()):
+            lines.append(f'apns_stripe_ejections_total{{cause="{_escape(cause)}"}} {count}')
+        header("apns_provider_tokens_signed_total", "counter", "Provider JWTs signed.")
+        lines.append(f"apns_provider_tokens_signed_total {self.tokens_signed}")
+        header("apns_connections_opened_total", "counter", "HTTP/2 connections opened to APNs.")
+        lines.append(f"apns_connections_opened_total {self.connections_opened}")
+        header("apns_connect_duration_seconds", "histogram", "TCP connect time of new connections.")
+        self.connect_seconds._render("apns_connect_duration_seconds", "", lines)
+        header("apns_tls_handshake_duration_seconds", "histogram", "TLS handshake time of new connections.")
+        self.tls_seconds._render("apns_tls_handshake_duration_seconds", "", lines)
+        header("apns_response_wait_seconds", "histogram", "Time from request written to response headers.")
+        self.response_seconds._render("apns_response_wait_seconds", "", lines)
+        return "\n".join(lines) + "\n"
+
+
+class _RequestTrace:
+    """httpx/httpcore `trace` callback for one request; times the phases we report."""
+
+    __slots__ = ("_metrics", "_connect", "_tls", "_wait")
+
+    def __init__(self, metrics: ClientMetrics) -> None:
+        self._metrics = metrics
+        self._connect = self._tls = self._wait = 0.0
+
+    async def __call__(self, name: str, info: Dict[str, Any]) -> None:
+        if name == "http2.receive_response_headers.started":
+            self._wait = time.monotonic()
+        elif name == "http2.receive_response_headers.complete":
+            self._metrics.response_received(time.monotonic() - self._wait)
+        elif name == "connection.connect_tcp.started":
+            self._connect = time.monotonic()
+        elif name == "connection.connect_tcp.complete":
+            self._metrics.connection_opened(time.monotonic() - self._connect)
+        elif name == "connection.start_tls.started":
+            self._tls = time.monotonic()
+        elif name == "connection.start_tls.complete":
+            self._metrics.tls_established(time.monotonic() - self._tls)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+async def serve_metrics(metrics: ClientMetrics, *, host: str = "127.0.0.1", port: int = 0) -> asyncio.Server:
+    """Serve `metrics.render()` at `GET /metrics` (plain HTTP/1.1, for a Prometheus scraper)."""
+    import asyncio
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not needed
+            parts = request_line.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", metrics.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"Not found\n", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii")
+                + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+import datetime
+import ipaddress
+import json
+from pathlib import Path
+import random
+import ssl
+import tempfile
+import time
+import uuid
+from typing import Dict, Optional
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+import h2.settings
+
+from apn_pushtool.payload import max_payload_size
+
+# HTTP status APNs uses for each reason the mock can inject.
+ERROR_STATUS: Dict[str, int] = {
+    "BadDeviceToken": 400,
+    "ExpiredProviderToken": 403,
+    "Unregistered": 410,
+    "PayloadTooLarge": 413,
+    "TooManyRequests": 429,
+    "InternalServerError": 500,
+    "ServiceUnavailable": 503,
+}
+
+
+@dataclass(slots=True)
+class MockApnsConfig:
+    """Behaviour of a MockApnsServer."""
+
+    # Delay before each response, in seconds.
+    latency_seconds: float = 0.0
+    # Probability of answering with a given error reason, e.g. {"TooManyRequests": 0.01}.
+    error_mix: Dict[str, float] = field(default_factory=dict)
+    # Send GOAWAY after this many responses on a connection (None: never).
+    goaway_after: Optional[int] = None
+    goaway_grace_seconds: float = 1.0
+    max_concurrent_streams: int = 1000
+    # Provider tokens (JWTs) answered with ExpiredProviderToken.
+    rejected_provider_tokens: set[str] = field(default_factory=set)
+    seed: Optional[int] = None
+
+
+def generate_self_signed_cert(hostname: str = "localhost") -> tuple[bytes, bytes]:
+    """Return (cert_pem, key_pem) for a short-lived certificate valid for `hostname` and 127.0.0.1."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    public_key = key.public_key()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(public_key)
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [x509.DNSName(hostname), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+            ),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=True,
+                content_commitment=False,
+                key_encipherment=False,
+                data_encipherment=False,
+                key_agreement=False,
+                key_cert_sign=True,
+                crl_sign=False,
+                encipher_only=False,
+                decipher_only=False,
+            ),
+            critical=True,
+        )
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(public_key), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    return cert.public_bytes(serialization.Encoding.PEM), key_pem
+
+
+class _H2Protocol(asyncio.Protocol):
+    def __init__(self, server: MockApnsServer) -> None:
+        self._server = server
+        self._conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        self._transport: asyncio.Transport | None = None
+        self._requests: dict[int, tuple[dict[str, str], bytearray]] = {}
+        self._pending: set[int] = set()
+        self._responses = 0
+        self._last_stream_id: Optional[int] = None  # set once GOAWAY was sent
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self._transport = transport
+        self._server.connections += 1
+        self._conn.initiate_connection()
+        self._conn.update_settings(
+            {h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: self._server.config.max_concurrent_streams}
+        )
+        self._flush()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._transport = None
+
+    def _flush(self) -> None:
+        if self._transport is not None and not self._transport.is_closing():
+            self._transport.write(self._conn.data_to_send())
+
+    def data_received(self, data: bytes) -> None:
+        if self._last_stream_id is not None:
+            return  # after GOAWAY, new streams are ignored; the client sees last_stream_id
+        try:
+            events = self._conn.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self._flush()
+            if self._transport is not None:
+                self._transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self._requests[event.stream_id] = (dict(event.headers), bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                request = self._requests.get(event.stream_id)
+                if request is not None:
+                    request[1].extend(event.data)
+                self._conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                if event.stream_id in self._requests:
+                    self._pending.add(event.stream_id)
+                    asyncio.ensure_future(self._respond(event.stream_id))
+            elif isinstance(event, h2.events.StreamReset):
+                self._requests.pop(event.stream_id, None)
+                self._pending.discard(event.stream_id)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                if self._transport is not None:
+                    self._transport.close()
+        self._flush()
+
+    async def _respond(self, stream_id: int) -> None:
+        if self._server.config.latency_seconds:
+            await asyncio.sleep(self._server.config.latency_seconds)
+        self._pending.discard(stream_id)
+        request = self._requests.pop(stream_id, None)
+        if request is None or self._transport is None:
+            return
+        if self._last_stream_id is not None and stream_id > self._last_stream_id:
+            return  # refused by the GOAWAY; the client must retry elsewhere
+
+        status, body = self._server.outcome(*request)
+        headers = [(":status", str(status)), ("apns-id", request[0].get("apns-id") or str(uuid.uuid4()).upper())]
+        try:
+            if body:
+                headers.append(("content-type", "application/json"))
+                self._conn.send_headers(stream_id, headers)
+                self._conn.send_data(stream_id, body, end_stream=True)
+            else:
+                self._conn.send_headers(stream_id, headers, end_stream=True)
+        except h2.exceptions.StreamClosedError:
+            return
+        self._server.responses += 1
+        self._responses += 1
+
+        goaway_after = self._server.config.goaway_after
+        if goaway_after is not None and self._last_stream_id is None and self._responses >= goaway_after:
+            self._last_stream_id = stream_id
+            self._conn.close_connection(last_stream_id=stream_id)
+            self._server.goaways += 1
+        self._flush()
+
+        if self._last_stream_id is not None and not any(s <= self._last_stream_id for s in self._pending):
+            # Like a real server, give the client a moment to read the GOAWAY before closing.
+            asyncio.get_running_loop().call_later(self._server.config.goaway_grace_seconds, self._close)
+
+    def _close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+
+
+class MockApnsServer:
+    """
+    A local stand-in for the APNs provider API: HTTP/2 over TLS on 127.0.0.1.
+
+    It checks the request the way APNs does where cheap (path, provider token,
+    payload size) and answers 200 with an apns-id, or an injected error from
+    `config.error_mix`. Latency, GOAWAY and SETTINGS_MAX_CONCURRENT_STREAMS are
+    configurable, which makes it usable both in tests and for benchmarks.
+
+        async with MockApnsServer() as server:
+            client = ApnsClient(creds, server_url=server.url, verify=server.client_ssl_context())
+    """
+
+    def __init__(self, config: MockApnsConfig | None = None, *, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config if config is not None else MockApnsConfig()
+        self.host = host
+        self.port = port
+        self.cert_pem, self._key_pem = generate_self_signed_cert()
+        self._rng = random.Random(self.config.seed)
+        self._server: asyncio.Server | None = None
+        self.connections = 0
+        self.responses = 0
+        self.goaways = 0
+
+    @property
+    def url(self) -> str:
+        return f"https://{self.host}:{self.port}"
+
+    def client_ssl_context(self) -> ssl.SSLContext:
+        """An SSL context that trusts this server's self-signed certificate."""
+        return ssl.create_default_context(cadata=self.cert_pem.decode("ascii"))
+
+    def _server_ssl_context(self) -> ssl.SSLContext:
+        ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        with tempfile.TemporaryDirectory() as tmp:
+            cert_path = Path(tmp) / "cert.pem"
+            key_path = Path(tmp) / "key.pem"
+            cert_path.write_bytes(self.cert_pem)
+            key_path.write_bytes(self._key_pem)
+            ctx.load_cert_chain(cert_path, key_path)
+        ctx.set_alpn_protocols(["h2"])
+        return ctx
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(
+            lambda: _H2Protocol(self), self.host, self.port, ssl=self._server_ssl_context()
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def __aenter__(self) -> MockApnsServer:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    def outcome(self, headers: dict[str, str], body: bytes | bytearray) -> tuple[int, bytes]:
+        path = headers.get(":path", "")
+        token = path.rpartition("/")[2]
+        if not path.startswith("/3/device/") or len(token) != 64:
+            return _error("BadDeviceToken")
+        authorization = headers.get("authorization", "")
+        if not authorization.startswith("bearer "):
+            return 403, json.dumps({"reason": "MissingProviderToken"}).encode()
+        if authorization[len("bearer ") :] in self.config.rejected_provider_tokens:
+            return _error("ExpiredProviderToken")
+        if len(body) > max_payload_size(headers.get("apns-push-type", "alert")):
+            return _error("PayloadTooLarge")
+
+        roll = self._rng.random()
+        for reason, probability in self.config.error_mix.items():
+            if roll < probability:
+                return _error(reason)
+            roll -= probability
+        return 200, b""
+
+
+def _error(reason: str) -> tuple[int, bytes]:
+    body: dict[str, object] = {"reason": reason}
+    if reason == "Unregistered":
+        body["timestamp"] = int(time.time() * 1000)
+    return ERROR_STATUS.get(reason, 400), json.dumps(body).encode()
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import os
+from pathlib import Path
+import threading
+import uuid
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+)
+
+from apn_pushtool.client import PushMessage, aiterate, run_bounded
+from apn_pushtool.payload import encode_payload
+from apn_pushtool.results import PushResult, Reason
+
+# Keys identify a message within a campaign (e.g. its input line number).
+OutboxKey = str | int
+
+_SEGMENT_SUFFIX = ".log"
+
+
+def _segment_name(number: int) -> str:
+    return f"{number:08d}{_SEGMENT_SUFFIX}"
+
+
+def _is_final(result: PushResult) -> bool:
+    # A transport failure means we don't know whether APNs got the push; leave it
+    # pending so a resumed run tries again. Everything else is an answer.
+    return result.reason is not Reason.CONNECTION_ERROR
+
+
+def _fsync_directory(directory: Path) -> None:
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_records(path: Path) -> Iterator[tuple[Dict[str, Any], bytes]]:
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn tail of a segment that was being written during a crash
+            if isinstance(record, dict) and "key" in record:
+                yield record, line
+
+
+class Outbox:
+    """
+    Durable, append-only journal of a push campaign.
+
+    `add` records a message as pending, with an apns-id assigned up front so the
+    journal and APNs agree on its identity; `ack` records that APNs answered it.
+    Records are buffered and written by `commit`, which appends them to the active
+    segment and fsyncs once for the whole batch (group commit). Reopening the
+    outbox replays the segments, so a campaign that died halfway resumes with
+    `pending()`, exactly the messages that were never answered.
+
+    Segments are rotated at `segment_bytes`; `compact` folds sealed segments into
+    one, keeping pending messages and only the key of finished ones. It touches
+    sealed segments only, so it can run in a background thread.
+    """
+
+    def __init__(self, directory: str | Path, *, segment_bytes: int = 64 * 1024 * 1024) -> None:
+        self.directory = Path(directory).expanduser()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._added: set[OutboxKey] = set()
+        self._done: set[OutboxKey] = set()
+        self._buffer: list[bytes] = []
+
+        self._segments = sorted(self.directory.glob("*" + _SEGMENT_SUFFIX))
+        for path in self._segments:
+            for record, _ in _read_records(path):
+                self._added.add(record["key"])
+                if record["op"] in ("ack", "done"):
+                    self._done.add(record["key"])
+
+        # Always start a fresh segment, so nothing is appended after a torn line.
+        last = int(self._segments[-1].stem) if self._segments else 0
+        self._active = open(self.directory / _segment_name(last + 1), "ab")
+        self._segments.append(Path(self._active.name))
+
+    def __enter__(self) -> Outbox:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @property
+    def added(self) -> int:
+        return len(self._added)
+
+    @property
+    def done(self) -> int:
+        return len(self._done)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._added) - len(self._done)
+
+    @property
+    def sealed_segments(self) -> int:
+        return len(self._segments) - 1
+
+    def __contains__(self, key: OutboxKey) -> bool:
+        return key in self._added
+
+    def add(self, key: OutboxKey, message: PushMessage) -> Optional[PushMessage]:
+        """
+        Journal `message` under `key` and return it with its apns-id set, or None if
+        the key is already in the outbox (sent or pending from an earlier run).
+        Not durable until the next `commit`.
+        """
+        if key in self._added:
+            return None
+        if message.apns_id is None:
+            message = dataclasses.replace(message, apns_id=str(uuid.uuid4()).upper())
+        self._added.add(key)
+        self._buffer.append(encode_payload({"op": "add", "key": key, "message": message.to_dict()}) + b"\n")
+        return message
+
+    def ack(self, key: OutboxKey, result: PushResult) -> bool:
+        """Record the answer for `key`; returns False (and keeps it pending) for transport failures."""
+        if not _is_final(result):
+            return False
+        self._done.add(key)
+        record = {
+            "op": "ack",
+            "key": key,
+            "status": result.status_code,
+            "reason": str(result.reason) if result.reason is not None else None,
+            "apns_id": result.apns_id,
+        }
+        self._buffer.append(encode_payload(record) + b"\n")
+        return True
+
+    def commit(self) -> None:
+        """Write buffered records and fsync them; rotates the segment when it is full."""
+        with self._lock:
+            if not self._buffer:
+                return
+            # Swap first: add/ack may keep appending from the event loop meanwhile.
+            buffer, self._buffer = self._buffer, []
+            self._active.write(b"".join(buffer))
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            if self._active.tell() >= self._segment_bytes:
+                self._rotate_locked()
+
+    def _rotate_locked(self) -> None:
+        self._active.close()
+        self._active = open(self.directory / _segment_name(int(self._segments[-1].stem) + 1), "ab")
+        self._segments.append(Path(self._active.name))
+        _fsync_directory(self.directory)
+
+    def pending(self) -> Iterator[tuple[OutboxKey, PushMessage]]:
+        """Messages journaled but never answered, in the order they were added."""
+        self.commit()
+        # Read them all before yielding: a consumer that stops early must not leave
+        # compaction waiting on the lock until this generator is collected. run_campaign
+        # commits before sending, so at most a batch plus what was in flight is pending.
+        records: dict[OutboxKey, Dict[str, Any]] = {}
+        with self._compact_lock:
+            for path in list(self._segments):
+                for record, _ in _read_records(path):
+                    key = record["key"]
+                    if record["op"] == "add" and key not in self._done:
+                        records.setdefault(key, record["message"])
+        for key, message in records.items():
+            yield key, PushMessage.from_dict(message)
+
+    def compact(self) -> None:
+        """
+        Merge all sealed segments into the oldest one: pending messages are kept in
+        full, finished ones shrink to a `done` marker (so a resumed run still skips
+        them). Crash-safe: the merged segment replaces the oldest atomically, and a
+        leftover segment only repeats what the merged one already says.
+        """
+        with self._compact_lock:
+            with self._lock:
+                sealed = self._segments[:-1]
+            if len(sealed) < 2:
+                return
+
+            done: set[OutboxKey] = set()
+            adds: dict[OutboxKey, bytes] = {}
+            for path in sealed:
+                for record, line in _read_records(path):
+                    if record["op"] == "add":
+                        adds.setdefault(record["key"], line)
+                    else:
+                        done.add(record["key"])
+                        adds.setdefault(record["key"], b"")
+
+            tmp = sealed[0].with_name(sealed[0].name + ".compact")
+            with open(tmp, "wb") as f:
+                for key, line in adds.items():
+                    f.write(encode_payload({"op": "done", "key": key}) + b"\n" if key in done else line)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, sealed[0])
+            _fsync_directory(self.directory)
+            for path in sealed[1:]:
+                path.unlink(missing_ok=True)
+            with self._lock:
+                self._segments = [sealed[0], *[p for p in self._segments if p not in sealed]]
+
+    def close(self) -> None:
+        self.commit()
+        with self._lock:
+            empty = self._active.tell() == 0
+            self._active.close()
+            if empty:
+                Path(self._active.name).unlink(missing_ok=True)
+
+
+async def run_campaign(
+    send: Callable[[PushMessage], Awaitable[PushResult]],
+    outbox: Outbox,
+    messages: Iterable[tuple[OutboxKey, PushMessage]] | AsyncIterable[tuple[OutboxKey, PushMessage]] = (),
+    *,
+    max_in_flight: int = 1000,
+    commit_every: int = 1000,
+) -> AsyncIterator[tuple[OutboxKey, PushResult]]:
+    """
+    Send a campaign through `outbox`, yielding `(key, result)` as pushes complete.
+
+    Messages left pending by an earlier run go first; then `messages` are journaled
+    in batches of `commit_every` and each batch is committed before any of it is
+    sent, so every push on the wire is on disk. Keys already in the outbox are
+    skipped, which makes re-running with the same input a resume. Commits and
+    compaction run in worker threads, off the event loop.
+    """
+    compaction: asyncio.Task[None] | None = None
+
+    async def commit() -> None:
+        nonlocal compaction
+        await asyncio.to_thread(outbox.commit)
+        if outbox.sealed_segments >= 2 and (compaction is None or compaction.done()):
+            compaction = asyncio.create_task(asyncio.to_thread(outbox.compact))
+
+    async def jobs() -> AsyncIterator[tuple[OutboxKey, Awaitable[PushResult]]]:
+        for key, message in outbox.pending():
+            yield key, send(message)
+
+        batch: list[tuple[OutboxKey, PushMessage]] = []
+        async for key, message in aiterate(messages):
+            journaled = outbox.add(key, message)
+            if journaled is not None:
+                batch.append((key, journaled))
+            if len(batch) >= commit_every:
+                await commit()
+                for item in batch:
+                    yield item[0], send(item[1])
+                batch = []
+        await commit()
+        for key, message in batch:
+            yield key, send(message)
+
+    acked = 0
+    try:
+        async for key, result in run_bounded(jobs(), window=lambda: max_in_flight):
+            outbox.ack(key, result)
+            acked += 1
+            if acked % commit_every == 0:
+                await commit()
+            yield key, result
+    finally:
+        await asyncio.to_thread(outbox.commit)
+        if compaction is not None:
+            await compaction
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterator, Optional
+import unicodedata
+
+try:  # Optional faster encoder; the stdlib encoder produces the same bytes.
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    _orjson = None
+
+
+# https://developer.apple.com/documentation/usernotifications/generating-a-remote-notification
+MAX_PAYLOAD_BYTES = 4096
+MAX_VOIP_PAYLOAD_BYTES = 5120
+
+
+class PayloadTooLargeError(ValueError):
+    def __init__(self, size: int, limit: int) -> None:
+        super().__init__(f"Payload is {size} bytes; APNs limit is {limit} bytes.")
+        self.size = size
+        self.limit = limit
+
+
+def max_payload_size(push_type: str = "alert") -> int:
+    return MAX_VOIP_PAYLOAD_BYTES if push_type == "voip" else MAX_PAYLOAD_BYTES
+
+
+def basic_payload(
+    *,
+    title: str,
+    body: str,
+    badge: Optional[int] = None,
+    sound: str = "default",
+    custom_data: Optional[Dict[str, Any]] = None,
+    thread_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    aps: Dict[str, Any] = {"alert": {"title": title, "body": body}, "sound": sound}
+    if badge is not None:
+        aps["badge"] = badge
+    if thread_id:
+        aps["thread-id"] = thread_id
+
+    payload: Dict[str, Any] = {"aps": aps}
+    if custom_data:
+        payload.update(custom_data)
+    return payload
+
+
+def encode_payload(payload: Any) -> bytes:
+    """Encode to compact UTF-8 JSON (no whitespace, non-ASCII kept as UTF-8)."""
+    if _orjson is not None:
+        return _orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def check_payload_size(content: bytes, *, push_type: str = "alert") -> None:
+    limit = max_payload_size(push_type)
+    if len(content) > limit:
+        raise PayloadTooLargeError(len(content), limit)
+
+
+class Slot:
+    """Placeholder for a per-recipient value inside a PayloadTemplate."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"Slot({self.name!r})"
+
+
+class PayloadTemplate:
+    """
+    A payload encoded once, with `Slot` placeholders spliced in per recipient.
+
+        template = PayloadTemplate({"aps": {"alert": {"title": "Hi", "body": Slot("body")}, "badge": Slot("badge")}})
+        content = template.render(body="Hello Ann", badge=3)
+
+    `render` only encodes the slot values and joins them with the pre-encoded
+    fragments, so a large personalized fan-out avoids a full encode per device.
+    Slots may appear anywhere a JSON value can (not as object keys).
+    """
+
+    def __init__(self, payload: Dict[str, Any], *, push_type: str = "alert") -> None:
+        names: list[str] = []
+
+        def replace(value: Any) -> Any:
+            if isinstance(value, Slot):
+                names.append(value.name)
+                return _sentinel(len(names) - 1)
+            if isinstance(value, dict):
+                return {k: replace(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [replace(v) for v in value]
+            return value
+
+        encoded = encode_payload(replace(payload))
+
+        fragments: list[bytes] = []
+        rest = encoded
+        for index in range(len(names)):
+            head, sep, rest = rest.partition(encode_payload(_sentinel(index)))
+            if not sep:  # pragma: no cover - sentinels are unique, so this cannot happen
+                raise ValueError("Failed to compile payload template.")
+            fragments.append(head)
+        fragments.append(rest)
+
+        self._fragments = tuple(fragments)
+        self._names = tuple(names)
+        self._limit = max_payload_size(push_type)
+        self.fields = frozenset(names)
+
+    def render(self, **values: Any) -> bytes:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Missing template values: {', '.join(sorted(missing))}")
+
+        encoded = {name: _encode_value(values[name]) for name in self.fields}
+        parts: list[bytes] = [self._fragments[0]]
+        for name, fragment in zip(self._names, self._fragments[1:]):
+            parts.append(encoded[name])
+            parts.append(fragment)
+        content = b"".join(parts)
+
+        if len(content) > self._limit:
+            raise PayloadTooLargeError(len(content), self._limit)
+        return content
+
+
+def _sentinel(index: int) -> str:
+    return f"\x00apn-pushtool-slot-{index}\x00"
+
+
+def _encode_value(value: Any) -> bytes:
+    if type(value) is int:
+        return str(value).encode("ascii")
+    return encode_payload(value)
+
+
+def split_text(text: str, budget_bytes: int, *, max_chars: int | None = None) -> list[str]:
+    """
+    Split `text` into chunks whose JSON-encoded size fits `budget_bytes`.
+
+    Chunks never split a grapheme cluster (base character plus combining marks,
+    variation selectors, emoji modifiers and ZWJ sequences) and prefer to end at
+    a word boundary: after whitespace, or after a CJK character, which needs no
+    space to break. Joining the chunks gives back `text` unchanged.
+    """
+    if budget_bytes <= 0:
+        raise ValueError("budget_bytes must be positive.")
+
+    chunks: list[str] = []
+    start = 0  # start of the current chunk
+    size = 0  # encoded size of text[start:end]
+    chars = 0
+    break_at = -1  # last word-boundary offset inside the current chunk
+    break_size = 0
+    break_chars = 0
+
+    for cluster_start, cluster_end in _clusters(text):
+        cluster = text[cluster_start:cluster_end]
+        cost = sum(_json_char_cost(ch) for ch in cluster)
+        n = cluster_end - cluster_start
+
+        too_big = size + cost > budget_bytes or (max_chars is not None and chars + n > max_chars)
+        if too_big and cluster_start > start:
+            if break_at > start:
+                cut, size, chars = break_at, size - break_size, chars - break_chars
+            else:
+                cut, size, chars = cluster_start, 0, 0
+            chunks.append(text[start:cut])
+            start = cut
+            break_at = -1
+            # The word carried over from the last boundary may still leave no room.
+            if cut < cluster_start and (
+                size + cost > budget_bytes or (max_chars is not None and chars + n > max_chars)
+            ):
+                chunks.append(text[start:cluster_start])
+                start, size, chars = cluster_start, 0, 0
+
+        size += cost
+        chars += n
+        if _is_break_after(cluster):
+            break_at, break_size, break_chars = cluster_end, size, chars
+
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+
+_JSON_SHORT_ESCAPES = frozenset('"\\\b\f\n\r\t')
+
+
+def _json_char_cost(ch: str) -> int:
+    code = ord(ch)
+    if ch in _JSON_SHORT_ESCAPES:
+        return 2
+    if code < 0x20:
+        return 6  # \u00XX
+    if code < 0x80:
+        return 1
+    if code < 0x800:
+        return 2
+    if code < 0x10000:
+        return 3
+    return 4
+
+
+def _extends_cluster(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        unicodedata.combining(ch) != 0
+        or unicodedata.category(ch) in ("Mn", "Me", "Mc")
+        or 0xFE00 <= code <= 0xFE0F  # variation selectors
+        or 0x1F3FB <= code <= 0x1F3FF  # emoji skin-tone modifiers
+        or 0xE0020 <= code <= 0xE007F  # emoji tag sequences
+        or code == 0x200D  # zero width joiner
+    )
+
+
+def _is_regional_indicator(ch: str) -> bool:
+    return 0x1F1E6 <= ord(ch) <= 0x1F1FF
+
+
+def _clusters(text: str) -> Iterator[tuple[int, int]]:
+    """Yield (start, end) offsets of approximate extended grapheme clusters."""
+    i = 0
+    n = len(text)
+    while i < n:
+        j = i + 1
+        if text[i] == "\r" and j < n and text[j] == "\n":
+            j += 1
+        elif _is_regional_indicator(text[i]) and j < n and _is_regional_indicator(text[j]):
+            j += 1  # flag = pair of regional indicators
+        while j < n and _extends_cluster(text[j]):
+            if text[j] == "\u200d" and j + 1 < n:
+                j += 2  # ZWJ glues the next character to this cluster
+            else:
+                j += 1
+        yield i, j
+        i = j
+
+
+def _is_break_after(cluster: str) -> bool:
+    ch = cluster[0]
+    return ch.isspace() or unicodedata.east_asian_width(ch) in ("W", "F")
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import dataclasses
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Iterable, Optional, TypeVar
+
+from apn_pushtool.auth import ProviderTokenCache
+from apn_pushtool.client import ApnsClient, PushMessage, aiterate, run_bounded
+from apn_pushtool.config import ApnsCredentials, ApnsEnvironment, ConfigError
+from apn_pushtool.registry import TokenRegistry
+from apn_pushtool.results import PushResult, Reason
+
+_K = TypeVar("_K")
+
+
+def _other(environment: ApnsEnvironment) -> ApnsEnvironment:
+    return "production" if environment == "sandbox" else "sandbox"
+
+
+class ApnsClientPool:
+    """
+    Warm ApnsClients for several credential sets and both APNs environments.
+
+    Messages are routed by topic to the credentials whose bundle id is the
+    longest prefix of the topic (so `com.example.app.voip` uses the
+    `com.example.app` key), and to that credential's environment unless one is
+    given explicitly. Clients are created on first use and keep their pooled
+    connections; all of them share one ProviderTokenCache, so a key's JWT is
+    signed once for every bundle and environment it serves.
+
+    With `fallback_environment=True`, a BadDeviceToken answer (typically a
+    sandbox token sent to production or vice versa) is retried once against
+    the other environment, and the environment that worked is remembered for
+    that token.
+    """
+
+    def __init__(
+        self,
+        credentials: Iterable[ApnsCredentials],
+        *,
+        fallback_environment: bool = True,
+        token_cache: ProviderTokenCache | None = None,
+        registry: TokenRegistry | None = None,
+        max_remembered_tokens: int = 100_000,
+        **client_kwargs: Any,
+    ) -> None:
+        self._credentials = {c.bundle_id: c for c in credentials}
+        if not self._credentials:
+            raise ConfigError("ApnsClientPool needs at least one set of credentials.")
+        self._fallback_environment = fallback_environment
+        self._token_cache = token_cache if token_cache is not None else ProviderTokenCache()
+        self.registry = registry
+        self._client_kwargs = client_kwargs
+        self._clients: dict[tuple[str, ApnsEnvironment], ApnsClient] = {}
+        self._token_environments: OrderedDict[str, ApnsEnvironment] = OrderedDict()
+        self._max_remembered_tokens = max_remembered_tokens
+
+    async def __aenter__(self) -> ApnsClientPool:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    def credentials_for(self, topic: str) -> ApnsCredentials:
+        candidate = topic
+        while candidate:
+            creds = self._credentials.get(candidate)
+            if creds is not None:
+                return creds
+            candidate = candidate.rpartition(".")[0]
+        raise ConfigError(f"No credentials configured for topic {topic!r}.")
+
+    def client_for(self, topic: str, environment: Optional[ApnsEnvironment] = None) -> ApnsClient:
+        creds = self.credentials_for(topic)
+        environment = environment or creds.environment
+        key = (creds.bundle_id, environment)
+        client = self._clients.get(key)
+        if client is None:
+            if creds.environment != environment:
+                creds = dataclasses.replace(creds, environment=environment)
+            client = ApnsClient(creds, token_cache=self._token_cache, **self._client_kwargs)
+            self._clients[key] = client
+        return client
+
+    def _remember(self, device_token: str, environment: ApnsEnvironment) -> None:
+        self._token_environments[device_token] = environment
+        self._token_environments.move_to_end(device_token)
+        while len(self._token_environments) > self._max_remembered_tokens:
+            self._token_environments.popitem(last=False)
+
+    async def send(
+        self,
+        message: PushMessage,
+        *,
+        environment: Optional[ApnsEnvironment] = None,
+    ) -> PushResult:
+        topic = message.topic or next(iter(self._credentials))
+        if message.topic is None:
+            message = dataclasses.replace(message, topic=topic)
+
+        if environment is None:
+            environment = self._token_environments.get(message.device_token)
+        client = self.client_for(topic, environment)
+        if self.registry is not None and self.registry.is_blocked(
+            message.device_token, environment=client.environment, topic=topic
+        ):
+            return PushResult(
+                message.device_token,
+                reason=Reason.KNOWN_INVALID_TOKEN,
+                error={"reason": Reason.KNOWN_INVALID_TOKEN.value, "skipped": True},
+            )
+        result = await client.send_message(message)
+
+        if result.reason is Reason.BAD_DEVICE_TOKEN and self._fallback_environment:
+            other = _other(client.environment)
+            retry = await self.client_for(topic, other).send_message(message)
+            if retry.status_code is not None and retry.reason is not Reason.BAD_DEVICE_TOKEN:
+                # The token belongs to the other environment; go there directly next time.
+                self._remember(message.device_token, other)
+                client, result = self.client_for(topic, other), retry
+
+        if self.registry is not None:
+            self.registry.record(message.device_token, result, environment=client.environment, topic=topic)
+        return result
+
+    async def send_batch(
+        self,
+        messages: Iterable[tuple[_K, PushMessage]] | AsyncIterable[tuple[_K, PushMessage]],
+        *,
+        max_in_flight: int = 1000,
+    ) -> AsyncIterator[tuple[_K, PushResult]]:
+        """Route and send messages concurrently, yielding `(key, result)` as they complete."""
+
+        async def jobs() -> AsyncIterator[tuple[_K, Awaitable[PushResult]]]:
+            async for key, message in aiterate(messages):
+                yield key, self.send(message)
+
+        async for item in run_bounded(jobs(), window=lambda: max_in_flight):
+            yield item
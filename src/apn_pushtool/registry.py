@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional
+
+from apn_pushtool.results import PushResult, Reason
+
+# Reasons that mean the token is dead. APNs answers them per environment and topic (a
+# sandbox token is a BadDeviceToken in production), so entries are scoped by both.
+DEAD_TOKEN_REASONS = frozenset({Reason.UNREGISTERED, Reason.EXPIRED_TOKEN, Reason.BAD_DEVICE_TOKEN})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_tokens (
+    environment TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    token BLOB NOT NULL,
+    reason TEXT NOT NULL,
+    apns_timestamp INTEGER,
+    recorded_at INTEGER NOT NULL,
+    PRIMARY KEY (environment, topic, token)
+) WITHOUT ROWID
+"""
+
+# Files written before entries were scoped have a token-only table. Their rows are kept
+# (and exported) with an empty environment and topic, which never matches a send.
+_MIGRATE = """
+ALTER TABLE dead_tokens RENAME TO dead_tokens_unscoped;
+{schema};
+INSERT INTO dead_tokens (environment, topic, token, reason, apns_timestamp, recorded_at)
+    SELECT '', '', token, reason, apns_timestamp, recorded_at FROM dead_tokens_unscoped;
+DROP TABLE dead_tokens_unscoped;
+""".format(schema=_SCHEMA.strip())
+
+_UPSERT = """
+INSERT INTO dead_tokens (environment, topic, token, reason, apns_timestamp, recorded_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(environment, topic, token) DO UPDATE SET
+    reason = excluded.reason,
+    apns_timestamp = COALESCE(excluded.apns_timestamp, dead_tokens.apns_timestamp),
+    recorded_at = excluded.recorded_at
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class TokenStatus:
+    device_token: str
+    reason: str
+    # Milliseconds since the epoch at which APNs says the token stopped being valid (410 only).
+    apns_timestamp: Optional[int]
+    recorded_at: int
+    environment: str
+    topic: str
+
+
+def _key(device_token: str) -> bytes | None:
+    try:
+        key = bytes.fromhex(device_token)
+    except ValueError:
+        return None
+    return key if len(key) == 32 else None
+
+
+class TokenRegistry:
+    """
+    Persistent set of device tokens APNs reported as dead (410 Unregistered /
+    ExpiredToken, 400 BadDeviceToken), stored in SQLite.
+
+    Entries are scoped by APNs environment and topic: a token rejected by
+    production for one app says nothing about sandbox or another topic.
+
+    Tokens are kept in memory as packed 32-byte keys, so `is_blocked` is a set
+    lookup. New entries are written in batches of `flush_every` (and on
+    `flush`/`close`), which keeps recording cheap during large campaigns.
+    """
+
+    def __init__(self, path: str | Path, *, flush_every: int = 1000) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._flush_every = flush_every
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(dead_tokens)")}
+        if columns and "environment" not in columns:
+            self._db.executescript(_MIGRATE)
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+        self._blocked: dict[tuple[str, str], set[bytes]] = {}
+        for environment, topic, token in self._db.execute("SELECT environment, topic, token FROM dead_tokens"):
+            self._blocked.setdefault((environment, topic), set()).add(token)
+        self._pending: list[tuple[str, str, bytes, str, Optional[int], int]] = []
+
+    def __enter__(self) -> TokenRegistry:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._blocked.values())
+
+    def blocked_keys(self, *, environment: str, topic: str) -> frozenset[bytes]:
+        """Snapshot of one scope's dead tokens as 32-byte keys (e.g. for `TokenSet.difference`)."""
+        with self._lock:
+            return frozenset(self._blocked.get((environment, topic), ()))
+
+    def is_blocked(self, device_token: str, *, environment: str, topic: str) -> bool:
+        key = _key(device_token)
+        return key is not None and key in self._blocked.get((environment, topic), ())
+
+    def mark(
+        self,
+        device_token: str,
+        reason: str,
+        *,
+        environment: str,
+        topic: str,
+        apns_timestamp: Optional[int] = None,
+    ) -> None:
+        key = _key(device_token)
+        if key is None:
+            return
+        with self._lock:
+            self._blocked.setdefault((environment, topic), set()).add(key)
+            self._pending.append((environment, topic, key, reason, apns_timestamp, int(time.time())))
+            if len(self._pending) >= self._flush_every:
+                self._flush_locked()
+
+    def record(self, device_token: str, result: PushResult, *, environment: str, topic: str) -> bool:
+        """Feed a send result; returns True if it marked the token as dead."""
+        if result.success or result.reason not in DEAD_TOKEN_REASONS:
+            return False
+        timestamp = result.error.get("timestamp") if isinstance(result.error, dict) else None
+        self.mark(
+            device_token,
+            str(result.reason),
+            environment=environment,
+            topic=topic,
+            apns_timestamp=int(timestamp) if timestamp is not None else None,
+        )
+        return True
+
+    def remove(self, device_token: str, *, environment: str, topic: str) -> None:
+        key = _key(device_token)
+        if key is None:
+            return
+        with self._lock:
+            self._flush_locked()
+            self._blocked.get((environment, topic), set()).discard(key)
+            self._db.execute(
+                "DELETE FROM dead_tokens WHERE environment = ? AND topic = ? AND token = ?",
+                (environment, topic, key),
+            )
+            self._db.commit()
+
+    def get(self, device_token: str, *, environment: str, topic: str) -> Optional[TokenStatus]:
+        key = _key(device_token)
+        if key is None or not self.is_blocked(device_token, environment=environment, topic=topic):
+            return None
+        with self._lock:
+            self._flush_locked()
+            row = self._db.execute(
+                "SELECT reason, apns_timestamp, recorded_at FROM dead_tokens"
+                " WHERE environment = ? AND topic = ? AND token = ?",
+                (environment, topic, key),
+            ).fetchone()
+        if row is None:
+            return None
+        return TokenStatus(
+            device_token=key.hex(),
+            reason=row[0],
+            apns_timestamp=row[1],
+            recorded_at=row[2],
+            environment=environment,
+            topic=topic,
+        )
+
+    def export(
+        self,
+        *,
+        environment: Optional[str] = None,
+        topic: Optional[str] = None,
+        page_size: int = 10_000,
+    ) -> Iterator[TokenStatus]:
+        """
+        Iterate over the dead tokens ordered by environment, topic and token,
+        optionally limited to one environment and/or topic, reading the
+        database page by page.
+        """
+        self.flush()
+        where, params = "(environment, topic, token) > (?, ?, ?)", []
+        if environment is not None:
+            where += " AND environment = ?"
+            params.append(environment)
+        if topic is not None:
+            where += " AND topic = ?"
+            params.append(topic)
+        last: tuple[str, str, bytes] = ("", "", b"")
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT environment, topic, token, reason, apns_timestamp, recorded_at FROM dead_tokens"
+                    f" WHERE {where} ORDER BY environment, topic, token LIMIT ?",
+                    (*last, *params, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            for env, tpc, token, reason, apns_timestamp, recorded_at in rows:
+                yield TokenStatus(
+                    device_token=token.hex(),
+                    reason=reason,
+                    apns_timestamp=apns_timestamp,
+                    recorded_at=recorded_at,
+                    environment=env,
+                    topic=tpc,
+                )
+            last = rows[-1][:3]
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        self._db.executemany(_UPSERT, self._pending)
+        self._db.commit()
+        self._pending.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._db.close()
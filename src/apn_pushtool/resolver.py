@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from pathlib import Path
+import socket
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Apple publishes no TTL guarantee for api(.sandbox).push.apple.com; a few minutes
+# saves the lookup for back-to-back invocations without pinning a stale address.
+DEFAULT_TTL_SECONDS = 300.0
+
+
+class AddressCache:
+    """
+    On-disk cache of the addresses of APNs hosts, so a short-lived process (a
+    cron job, one CLI `send`) connects without waiting for DNS.
+
+    Entries are keyed by host and port, so production and sandbox (and a
+    `server_url` override) never share one, and each expires `ttl_seconds`
+    after it was resolved. The file is owner-only and is rewritten only when
+    an entry is added or dropped; a missing or corrupt file is treated as
+    empty. `ApnsClient(address_cache=...)` connects to the cached address with
+    the real host name for SNI, certificate checks and `:authority`, and drops
+    the entry if the connection fails.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path).expanduser()
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self.lookups = 0
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                entries = {}
+            self._entries = entries if isinstance(entries, dict) else {}
+        return self._entries
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+
+    def get(self, host: str, port: int) -> Optional[str]:
+        """The first cached address, or None if there is none or it has expired."""
+        addresses = self.get_all(host, port)
+        return addresses[0] if addresses else None
+
+    def get_all(self, host: str, port: int) -> list[str]:
+        entry = self._load().get(f"{host}:{port}")
+        if not isinstance(entry, dict) or not isinstance(entry.get("addresses"), list):
+            return []
+        if not isinstance(entry.get("expires"), (int, float)) or entry["expires"] <= self._clock():
+            return []
+        return [a for a in entry["addresses"] if isinstance(a, str)]
+
+    async def resolve(self, host: str, port: int) -> Optional[str]:
+        """The first cached address, else look the host up and cache it; None if the lookup fails."""
+        addresses = await self.resolve_all(host, port)
+        return addresses[0] if addresses else None
+
+    async def resolve_all(self, host: str, port: int) -> list[str]:
+        addresses = self.get_all(host, port)
+        if addresses:
+            return addresses
+        self.lookups += 1
+        addresses = await lookup(host, port)
+        if addresses:
+            self._load()[f"{host}:{port}"] = {"addresses": addresses, "expires": self._clock() + self.ttl_seconds}
+            self._save()
+        return addresses
+
+    def forget(self, host: str, port: int) -> None:
+        if self._load().pop(f"{host}:{port}", None) is not None:
+            self._save()
+
+
+async def lookup(host: str, port: int) -> list[str]:
+    """The distinct addresses `host` resolves to, in resolver order; empty if the lookup fails."""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError:
+        return []
+    return list(dict.fromkeys(str(info[4][0]) for info in infos))
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import bisect
+from collections import Counter
+from datetime import datetime, timezone
+import enum
+import time
+from typing import Any, Dict, Optional
+
+# Wall clock = monotonic + offset; results only store the cheap monotonic reading.
+_WALL_CLOCK_OFFSET = time.time() - time.monotonic()
+
+
+class Reason(enum.StrEnum):
+    """APNs error reasons, plus the few the client reports without a response."""
+
+    BAD_COLLAPSE_ID = "BadCollapseId"
+    BAD_DEVICE_TOKEN = "BadDeviceToken"
+    BAD_EXPIRATION_DATE = "BadExpirationDate"
+    BAD_MESSAGE_ID = "BadMessageId"
+    BAD_PRIORITY = "BadPriority"
+    BAD_TOPIC = "BadTopic"
+    DEVICE_TOKEN_NOT_FOR_TOPIC = "DeviceTokenNotForTopic"
+    DUPLICATE_HEADERS = "DuplicateHeaders"
+    IDLE_TIMEOUT = "IdleTimeout"
+    INVALID_PUSH_TYPE = "InvalidPushType"
+    MISSING_DEVICE_TOKEN = "MissingDeviceToken"
+    MISSING_TOPIC = "MissingTopic"
+    PAYLOAD_EMPTY = "PayloadEmpty"
+    TOPIC_DISALLOWED = "TopicDisallowed"
+    BAD_CERTIFICATE = "BadCertificate"
+    BAD_CERTIFICATE_ENVIRONMENT = "BadCertificateEnvironment"
+    EXPIRED_PROVIDER_TOKEN = "ExpiredProviderToken"
+    FORBIDDEN = "Forbidden"
+    INVALID_PROVIDER_TOKEN = "InvalidProviderToken"
+    MISSING_PROVIDER_TOKEN = "MissingProviderToken"
+    UNRELATED_KEY_ID_IN_TOKEN = "UnrelatedKeyIdInToken"
+    BAD_ENVIRONMENT_KEY_ID_IN_TOKEN = "BadEnvironmentKeyIdInToken"
+    BAD_PATH = "BadPath"
+    METHOD_NOT_ALLOWED = "MethodNotAllowed"
+    EXPIRED_TOKEN = "ExpiredToken"
+    UNREGISTERED = "Unregistered"
+    PAYLOAD_TOO_LARGE = "PayloadTooLarge"
+    TOO_MANY_PROVIDER_TOKEN_UPDATES = "TooManyProviderTokenUpdates"
+    TOO_MANY_REQUESTS = "TooManyRequests"
+    INTERNAL_SERVER_ERROR = "InternalServerError"
+    SERVICE_UNAVAILABLE = "ServiceUnavailable"
+    SHUTDOWN = "Shutdown"
+    # Client-side outcomes.
+    KNOWN_INVALID_TOKEN = "KnownInvalidToken"
+    COALESCED = "Coalesced"
+    EXPIRED_BEFORE_SEND = "ExpiredBeforeSend"
+    CONNECTION_ERROR = "ConnectionError"
+    UNKNOWN = "Unknown error"
+
+    @classmethod
+    def parse(cls, value: Any) -> Reason:
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.UNKNOWN
+
+
+class PushResult:
+    """
+    Outcome of one push.
+
+    Only what is needed to act on the result is kept (status, apns-id, reason,
+    monotonic completion time); `to_dict()` renders the historical dict shape on
+    demand, and mapping-style access (`result["success"]`, `result.get(...)`) is
+    supported for code written against that shape.
+    """
+
+    __slots__ = ("device_token", "status_code", "apns_id", "reason", "error", "completed_at", "elapsed")
+
+    def __init__(
+        self,
+        device_token: str,
+        *,
+        status_code: Optional[int] = None,
+        apns_id: Optional[str] = None,
+        reason: Optional[Reason] = None,
+        error: Dict[str, Any] | str | None = None,
+        elapsed: float = 0.0,
+        completed_at: Optional[float] = None,
+    ) -> None:
+        self.device_token = device_token
+        self.status_code = status_code
+        self.apns_id = apns_id
+        self.reason = reason
+        # Raw error detail: the APNs JSON body for rejected pushes, or an exception
+        # message for transport failures. None on success.
+        self.error = error
+        self.elapsed = elapsed
+        self.completed_at = time.monotonic() if completed_at is None else completed_at
+
+    @property
+    def success(self) -> bool:
+        return self.status_code == 200
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(_WALL_CLOCK_OFFSET + self.completed_at, tz=timezone.utc)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"success": self.success}
+        if self.status_code is not None:
+            result["status_code"] = self.status_code
+            result["headers"] = {"apns-id": self.apns_id} if self.apns_id else {}
+        result["device_token"] = self.device_token[:8] + "..."
+        result["timestamp"] = self.timestamp.isoformat()
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "success":
+            return self.success
+        return self.to_dict()[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "success":
+            return self.success
+        return self.to_dict().get(key, default)
+
+    def __repr__(self) -> str:
+        return (
+            f"PushResult(status_code={self.status_code!r}, reason={self.reason!r}, "
+            f"apns_id={self.apns_id!r}, device_token={self.device_token[:8]!r}...)"
+        )
+
+
+# Latency histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class ResultCollector:
+    """
+    Aggregates results of a large run without retaining them: counts by status
+    and reason, a latency histogram, and up to `keep_failures` failed results
+    for inspection.
+    """
+
+    def __init__(self, *, keep_failures: int = 100) -> None:
+        self.total = 0
+        self.succeeded = 0
+        self.by_status: Counter[Optional[int]] = Counter()
+        self.by_reason: Counter[str] = Counter()
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.failures: list[PushResult] = []
+        self._keep_failures = keep_failures
+
+    def add(self, result: PushResult) -> None:
+        self.total += 1
+        self.by_status[result.status_code] += 1
+        self.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, result.elapsed)] += 1
+        self.latency_sum += result.elapsed
+        if result.success:
+            self.succeeded += 1
+            return
+        self.by_reason[str(result.reason or Reason.UNKNOWN)] += 1
+        if len(self.failures) < self._keep_failures:
+            self.failures.append(result)
+
+    @property
+    def failed(self) -> int:
+        return self.total - self.succeeded
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the histogram bucket holding the q-quantile (inf if beyond the last)."""
+        if self.total == 0:
+            return None
+        rank = q * self.total
+        seen = 0
+        for bound, count in zip((*LATENCY_BUCKETS, float("inf")), self.latency_buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "by_status": {str(k) if k is not None else "none": v for k, v in sorted(self.by_status.items(), key=str)},
+            "by_reason": dict(self.by_reason.most_common()),
+            "latency_mean_seconds": self.latency_sum / self.total if self.total else None,
+            "latency_p50_seconds": self.latency_quantile(0.5),
+            "latency_p99_seconds": self.latency_quantile(0.99),
+        }
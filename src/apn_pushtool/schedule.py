@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import heapq
+import itertools
+import math
+import random
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult, Reason
+
+# With a release rate, due messages go out in bursts of rate * tick every tick.
+_RELEASE_TICK_SECONDS = 0.05
+
+
+@dataclass(slots=True)
+class ScheduleStats:
+    scheduled: int = 0
+    released: int = 0
+    # Due after their apns-expiration, so dropped instead of sent.
+    expired: int = 0
+
+
+class SendScheduler:
+    """
+    Holds notifications until their send-at time, then sends them.
+
+    Entries live in a binary heap keyed by due time: `schedule` is O(log n)
+    and costs one tuple per message, so millions of pending notifications
+    (a "09:00 local time" campaign per time zone) fit in one process. Times
+    are Unix timestamps on `clock`.
+
+    To avoid a thundering herd at a round deadline, each message's due time
+    is moved by a random offset in `[0, spread_seconds)` when it is scheduled,
+    and with `max_rate` due messages are released in bursts of at most
+    `max_rate / 20` every 50 ms. A message whose `expiration` (apns-expiration)
+    has passed by the time it is due is not sent; its result has reason
+    `ExpiredBeforeSend`.
+
+    Results are passed to `on_result`. `close` stops the scheduler and returns
+    what was not due yet, as `(due, message)` pairs, for the caller to keep.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[PushMessage], Awaitable[PushResult]],
+        *,
+        spread_seconds: float = 0.0,
+        max_rate: Optional[float] = None,
+        max_in_flight: int = 100,
+        on_result: Callable[[PushMessage, PushResult], None] | None = None,
+        clock: Callable[[], float] = time.time,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError("max_rate must be > 0.")
+        self._send = send
+        self._spread_seconds = spread_seconds
+        self._burst = max(1, math.ceil(max_rate * _RELEASE_TICK_SECONDS)) if max_rate is not None else None
+        self._on_result = on_result
+        self._clock = clock
+        self._rng = rng
+        self._heap: list[tuple[float, int, PushMessage]] = []
+        self._seq = itertools.count()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._arrived = asyncio.Event()
+        self._sending: set[asyncio.Task[None]] = set()
+        self._dispatcher: asyncio.Task[None] | None = None
+        self._closing = False
+        self.stats = ScheduleStats()
+
+    async def __aenter__(self) -> SendScheduler:
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def start(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def schedule(self, message: PushMessage, send_at: float) -> None:
+        if self._closing:
+            raise RuntimeError("SendScheduler is closed.")
+        due = send_at + self._spread_seconds * self._rng() if self._spread_seconds else send_at
+        head = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due, next(self._seq), message))
+        self.stats.scheduled += 1
+        if head is None or due < head:
+            self._arrived.set()  # the dispatcher may be sleeping until a later time
+
+    def schedule_many(self, messages: Iterable[PushMessage], send_at: float) -> int:
+        if self._closing:
+            raise RuntimeError("SendScheduler is closed.")
+        spread, rng, seq = self._spread_seconds, self._rng, self._seq
+        if spread:
+            entries = [(send_at + spread * rng(), next(seq), message) for message in messages]
+        else:
+            entries = [(send_at, next(seq), message) for message in messages]
+        if not entries:
+            return 0
+        heap = self._heap
+        head = heap[0][0] if heap else None
+        if len(entries) * 16 >= len(heap):
+            # A large batch: one O(n) heapify beats a push (and its sift) per message.
+            heap.extend(entries)
+            heapq.heapify(heap)
+        else:
+            for entry in entries:
+                heapq.heappush(heap, entry)
+        self.stats.scheduled += len(entries)
+        if head is None or heap[0][0] < head:
+            self._arrived.set()
+        return len(entries)
+
+    async def close(self) -> list[tuple[float, PushMessage]]:
+        """Stop releasing, wait for sends in flight and return the messages not sent."""
+        self._closing = True
+        self._arrived.set()
+        if self._dispatcher is not None:
+            await self._dispatcher
+            self._dispatcher = None
+        if self._sending:
+            await asyncio.wait(set(self._sending))
+        left = [(due, message) for due, _, message in sorted(self._heap)]
+        self._heap = []
+        return left
+
+    async def _dispatch(self) -> None:
+        heap = self._heap
+        while not self._closing:
+            if not heap:
+                self._arrived.clear()
+                await self._arrived.wait()
+                continue
+            wait = heap[0][0] - self._clock()
+            if wait > 0:
+                self._arrived.clear()
+                try:
+                    # Woken early by close() or by a message due before the current head.
+                    await asyncio.wait_for(self._arrived.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = self._clock()
+            budget = self._burst
+            while heap and heap[0][0] <= now and (budget is None or budget > 0) and not self._closing:
+                await self._slots.acquire()
+                _, _, message = heapq.heappop(heap)
+                self.stats.released += 1
+                if budget is not None:
+                    budget -= 1
+                task = asyncio.create_task(self._deliver(message, now))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+            if self._burst is not None:
+                await asyncio.sleep(_RELEASE_TICK_SECONDS)
+
+    async def _deliver(self, message: PushMessage, now: float) -> None:
+        try:
+            if message.expiration is not None and 0 < message.expiration <= now:
+                self.stats.expired += 1
+                result = PushResult(
+                    message.device_token,
+                    reason=Reason.EXPIRED_BEFORE_SEND,
+                    error={"reason": Reason.EXPIRED_BEFORE_SEND.value, "expiration": message.expiration},
+                )
+            else:
+                result = await self._send(message)
+        except Exception as e:
+            result = PushResult(message.device_token, reason=Reason.CONNECTION_ERROR, error=str(e))
+        finally:
+            self._slots.release()
+        if self._on_result is not None:
+            self._on_result(message, result)
@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing
+import multiprocessing.connection
+import os
+import ssl
+import threading
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Optional, TypeVar
+import zlib
+
+from apn_pushtool.auth import ProviderTokenCache
+from apn_pushtool.client import ApnsClient, aiterate
+from apn_pushtool.config import ApnsCredentials
+from apn_pushtool.daemon_client import result_from_wire, result_to_wire
+from apn_pushtool.message import PushMessage
+from apn_pushtool.registry import TokenRegistry
+from apn_pushtool.results import PushResult, Reason
+
+_K = TypeVar("_K")
+
+_WORKER_START_TIMEOUT_SECONDS = 60.0
+
+# Parent -> worker: ("token", jwt) | ("batch", [(seq, message_dict), ...]) | ("close",)
+# Worker -> parent: ("ready",) | ("results", [(seq, wire_result), ...]) | ("token_rejected", jwt) | ("closed",)
+_Message = tuple[Any, ...]
+
+
+def shard_of(device_token: str, shards: int) -> int:
+    """Worker index for a token; stable, so every push to one device goes through the same worker."""
+    return zlib.crc32(device_token.encode("utf-8")) % shards
+
+
+class _HandedTokenCache(ProviderTokenCache):
+    """
+    Token cache of a worker: it only ever uses the token the parent handed it,
+    so N workers cost one JWT signature per refresh, not N (and never trip
+    TooManyProviderTokenUpdates). A rejected token is reported to the parent,
+    which re-signs and hands the new one to every worker; until it arrives the
+    worker signs its own, so the client's ExpiredProviderToken retry does not
+    resend the rejected one.
+    """
+
+    def __init__(self, report_rejected: Callable[[str], None]) -> None:
+        super().__init__()
+        self._token: Optional[str] = None
+        self._report_rejected = report_rejected
+
+    def hand(self, token: str) -> None:
+        self._token = token
+
+    def get(self, team_id: str, key_id: str, sign: Callable[[], str]) -> str:
+        if self._token is None:  # the parent sends a token before any batch
+            self._token = sign()
+        return self._token
+
+    def invalidate(self, team_id: str, key_id: str, token: str | None = None) -> None:
+        if self._token is not None and token in (None, self._token):
+            rejected, self._token = self._token, None
+            self._report_rejected(rejected)
+
+
+def _worker_main(
+    creds: ApnsCredentials,
+    options: Dict[str, Any],
+    inbox: multiprocessing.connection.Connection,
+    outbox: multiprocessing.connection.Connection,
+) -> None:
+    asyncio.run(_work(creds, options, inbox, outbox))
+
+
+async def _work(
+    creds: ApnsCredentials,
+    options: Dict[str, Any],
+    inbox: multiprocessing.connection.Connection,
+    outbox: multiprocessing.connection.Connection,
+) -> None:
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[_Message] = asyncio.Queue()
+
+    def read() -> None:
+        while True:
+            try:
+                message = inbox.recv()
+            except (EOFError, OSError):
+                message = ("close",)
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+            if message[0] == "close":
+                return
+
+    threading.Thread(target=read, daemon=True).start()
+
+    results: list[tuple[int, Dict[str, Any]]] = []
+    flush_scheduled = False
+
+    def flush() -> None:
+        # Completions from one loop iteration go back to the parent as one message.
+        nonlocal results, flush_scheduled
+        flush_scheduled = False
+        if results:
+            batch, results = results, []
+            outbox.send(("results", batch))
+
+    def done(seq: int, device_token: str, task: asyncio.Task[PushResult]) -> None:
+        nonlocal flush_scheduled
+        tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        result = task.result() if exc is None else PushResult(device_token, reason=Reason.CONNECTION_ERROR, error=str(exc))
+        results.append((seq, result_to_wire(result)))
+        if not flush_scheduled:
+            flush_scheduled = True
+            loop.call_soon(flush)
+
+    ca_pem = options.pop("ca_pem", None)
+    verify: ssl.SSLContext | bool = ssl.create_default_context(cadata=ca_pem) if ca_pem else True
+    cache = _HandedTokenCache(lambda token: outbox.send(("token_rejected", token)))
+    tasks: set[asyncio.Task[PushResult]] = set()
+    async with ApnsClient(creds, token_cache=cache, verify=verify, **options) as client:
+        outbox.send(("ready",))
+        while True:
+            message = await queue.get()
+            if message[0] == "token":
+                cache.hand(message[1])
+            elif message[0] == "batch":
+                for seq, record in message[1]:
+                    push = PushMessage.from_dict(record)
+                    task = loop.create_task(client.send_message(push))
+                    tasks.add(task)
+                    task.add_done_callback(functools.partial(done, seq, push.device_token))
+            else:
+                break
+        if tasks:
+            await asyncio.wait(set(tasks))
+        flush()
+    outbox.send(("closed",))
+
+
+class ShardedSender:
+    """
+    Sends through `workers` processes, each with its own event loop, ApnsClient
+    and HTTP/2 connections, so TLS, h2 framing and JSON use every core instead
+    of one.
+
+    Messages are partitioned by device token (`shard_of`) and shipped to the
+    workers in batches of `batch_size`; results come back batched and are merged
+    into the single `(key, result)` stream of `send`. Each worker has at most
+    `max_in_flight` pushes outstanding. The parent signs the provider token and
+    hands it to the workers (see `_HandedTokenCache`), and applies `registry`:
+    known-dead tokens are answered without reaching a worker and new dead tokens
+    are recorded.
+
+    `ca_pem` replaces `verify` (an SSLContext cannot be sent to another process);
+    other keyword arguments are passed to each worker's ApnsClient.
+
+        async with ShardedSender(creds, workers=8) as sender:
+            async for key, result in sender.send(messages):
+                ...
+    """
+
+    def __init__(
+        self,
+        creds: ApnsCredentials,
+        *,
+        workers: Optional[int] = None,
+        max_in_flight: int = 1000,
+        batch_size: int = 256,
+        registry: TokenRegistry | None = None,
+        token_cache: ProviderTokenCache | None = None,
+        ca_pem: str | None = None,
+        **client_kwargs: Any,
+    ) -> None:
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        if self.workers < 1:
+            raise ValueError("workers must be >= 1.")
+        self._creds = creds
+        self._max_in_flight = max_in_flight
+        self._batch_size = batch_size
+        self.registry = registry
+        # Never connects: it only signs (and caches) the token the workers share.
+        self._signer = ApnsClient(creds, token_cache=token_cache)
+        self._options: Dict[str, Any] = {**client_kwargs, "ca_pem": ca_pem}
+        self._processes: list[multiprocessing.process.BaseProcess] = []
+        self._conns: list[multiprocessing.connection.Connection] = []
+        self._inbox: asyncio.Queue[tuple[int, Optional[_Message]]] | None = None
+        self._token: Optional[str] = None
+        self._seq = 0
+        self._sending = False
+
+    async def __aenter__(self) -> ShardedSender:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        inbox: asyncio.Queue[tuple[int, Optional[_Message]]] = asyncio.Queue()
+        self._inbox = inbox
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.workers):
+            theirs_in, ours_out = context.Pipe(duplex=False)
+            ours_in, theirs_out = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_worker_main, args=(self._creds, dict(self._options), theirs_in, theirs_out), daemon=True
+            )
+            process.start()
+            theirs_in.close()
+            theirs_out.close()
+            self._processes.append(process)
+            self._conns.append(ours_out)
+            threading.Thread(target=self._read, args=(index, ours_in, loop, inbox), daemon=True).start()
+
+        ready = 0
+        while ready < self.workers:
+            index, message = await asyncio.wait_for(inbox.get(), _WORKER_START_TIMEOUT_SECONDS)
+            if message is None:
+                await self.close()
+                raise RuntimeError(f"Shard worker {index} exited during start-up.")
+            ready += message[0] == "ready"
+
+    @staticmethod
+    def _read(
+        index: int,
+        conn: multiprocessing.connection.Connection,
+        loop: asyncio.AbstractEventLoop,
+        inbox: asyncio.Queue[tuple[int, Optional[_Message]]],
+    ) -> None:
+        # Blocking reads in a thread: pipes are not selectable on every platform.
+        with conn:
+            while True:
+                try:
+                    message: Optional[_Message] = conn.recv()
+                except (EOFError, OSError):
+                    message = None
+                try:
+                    loop.call_soon_threadsafe(inbox.put_nowait, (index, message))
+                except RuntimeError:
+                    return  # the loop is gone
+                if message is None or message[0] == "closed":
+                    return
+
+    def _hand_token(self) -> None:
+        token = self._signer.provider_token()
+        if token != self._token:
+            self._token = token
+            for conn in self._conns:
+                conn.send(("token", token))
+
+    async def close(self) -> None:
+        """Let the workers finish what they were given, then stop them."""
+        for conn in self._conns:
+            try:
+                conn.send(("close",))
+            except OSError:
+                pass
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, 30)
+            if process.is_alive():
+                process.kill()
+        for conn in self._conns:
+            conn.close()
+        self._processes, self._conns = [], []
+
+    async def send(
+        self,
+        messages: Iterable[tuple[_K, PushMessage]] | AsyncIterable[tuple[_K, PushMessage]],
+    ) -> AsyncIterator[tuple[_K, PushResult]]:
+        """Send `(key, message)` pairs, yielding `(key, result)` in completion order."""
+        inbox = self._inbox
+        if inbox is None or not self._conns:
+            raise RuntimeError("ShardedSender is not started.")
+        if self._sending:
+            raise RuntimeError("ShardedSender.send is already running.")
+        self._sending = True
+
+        shards = len(self._conns)
+        environment = self._signer.environment
+        # seq -> (key, shard, topic) of everything sent and unanswered
+        keys: dict[int, tuple[_K, int, str]] = {}
+        buffers: list[list[tuple[int, Dict[str, Any]]]] = [[] for _ in range(shards)]
+        permits = [asyncio.Semaphore(self._max_in_flight) for _ in range(shards)]
+
+        def flush(shard: int) -> None:
+            if buffers[shard]:
+                self._hand_token()
+                batch, buffers[shard] = buffers[shard], []
+                self._conns[shard].send(("batch", batch))
+
+        async def feed() -> None:
+            async for key, message in aiterate(messages):
+                topic = message.topic or self._signer.credentials.bundle_id
+                if self.registry is not None and self.registry.is_blocked(
+                    message.device_token, environment=environment, topic=topic
+                ):
+                    result = PushResult(
+                        message.device_token,
+                        reason=Reason.KNOWN_INVALID_TOKEN,
+                        error={"reason": Reason.KNOWN_INVALID_TOKEN.value, "skipped": True},
+                    )
+                    inbox.put_nowait((-1, ("local", key, result)))
+                    continue
+                shard = shard_of(message.device_token, shards)
+                if permits[shard].locked():
+                    # About to wait for this worker: ship every partial batch first,
+                    # so nothing we hold back is what it is waiting for.
+                    for other in range(shards):
+                        flush(other)
+                await permits[shard].acquire()
+                self._seq += 1
+                keys[self._seq] = (key, shard, topic)
+                buffers[shard].append((self._seq, message.to_dict()))
+                if len(buffers[shard]) >= self._batch_size:
+                    flush(shard)
+            for shard in range(shards):
+                flush(shard)
+
+        def fed(task: asyncio.Task[None]) -> None:
+            inbox.put_nowait((-1, ("fed",)))
+
+        feeder = asyncio.create_task(feed())
+        feeder.add_done_callback(fed)
+        feeding = True
+        try:
+            while feeding or keys:
+                index, message = await inbox.get()
+                if message is None:
+                    raise RuntimeError(f"Shard worker {index} exited unexpectedly.")
+                kind = message[0]
+                if kind == "results":
+                    for seq, record in message[1]:
+                        entry = keys.pop(seq, None)
+                        if entry is None:
+                            continue  # from an earlier send() that was abandoned
+                        key, shard, topic = entry
+                        permits[shard].release()
+                        result = result_from_wire(record)
+                        if self.registry is not None and not result.success:
+                            self.registry.record(result.device_token, result, environment=environment, topic=topic)
+                        yield key, result
+                elif kind == "local":
+                    yield message[1], message[2]
+                elif kind == "token_rejected":
+                    self._signer.invalidate_provider_token(message[1])
+                    self._hand_token()
+                elif kind == "fed":
+                    feeding = False
+                    if feeder.exception() is not None:
+                        raise feeder.exception()  # type: ignore[misc]
+        finally:
+            feeder.cancel()
+            self._sending = False
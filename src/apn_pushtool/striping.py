@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import httpx
+
+from apn_pushtool.resolver import AddressCache, lookup
+
+# A stripe whose average latency is this many times that of the fastest other
+# stripe is ejected, once both have at least _MIN_SAMPLES responses.
+_SLOW_FACTOR = 3.0
+_MIN_SAMPLES = 20
+# Weight of the newest response in a stripe's latency average.
+_LATENCY_ALPHA = 0.1
+
+# Failures that say the connection (or the front-end behind it) is unhealthy.
+# Some of them happen after the request was written, so they eject the stripe
+# but do not by themselves make the push safe to resend (see client._undelivered).
+STRIPE_FAILURES = (httpx.ConnectError, httpx.RemoteProtocolError, httpx.WriteError)
+
+
+class Stripe:
+    """One HTTP/2 connection to one APNs address."""
+
+    __slots__ = ("address", "http", "outstanding", "latency", "samples", "ejected")
+
+    def __init__(self, address: str, http: httpx.AsyncClient) -> None:
+        self.address = address
+        self.http = http
+        self.outstanding = 0
+        self.latency = 0.0
+        self.samples = 0
+        self.ejected = False
+
+
+class StripeSet:
+    """
+    `size` connections spread over the addresses an APNs host resolves to, for
+    ApnsClient(stripes=...). One HTTP/2 connection caps the streams in flight
+    (SETTINGS_MAX_CONCURRENT_STREAMS) and ties every push to one front-end; a
+    stripe set adds capacity per connection and spreads the load over hosts.
+
+    New requests go to the stripe with the fewest outstanding. A stripe that
+    fails (connect error, GOAWAY, failed write) or becomes much slower than
+    the others is ejected: it takes no new requests, is closed once its
+    outstanding requests finish, and is replaced by a connection to the
+    address with the fewest stripes, preferring addresses other than the one
+    just ejected.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        size: int,
+        make_http: Callable[[], httpx.AsyncClient],
+        *,
+        address_cache: AddressCache | None = None,
+        close_clients: bool = True,
+        on_eject: Callable[[str], None] | None = None,
+    ) -> None:
+        url = httpx.URL(server)
+        self.server = server
+        self.host = url.host
+        self.port = url.port or 443
+        self.authority = url.netloc.decode("ascii")
+        self.size = size
+        self._make_http = make_http
+        self._address_cache = address_cache
+        self._close_clients = close_clients
+        self._on_eject = on_eject
+        self._addresses: list[str] = []
+        self._stripes: list[Stripe] = []
+        self._draining: set[Stripe] = set()
+        self._closing: set[asyncio.Task[None]] = set()
+        self._start_lock = asyncio.Lock()
+        self._cursor = 0
+        self.ejections: Counter[str] = Counter()
+
+    def __iter__(self) -> Iterator[Stripe]:
+        return iter(self._stripes)
+
+    async def _lookup(self) -> list[str]:
+        if self._address_cache is not None:
+            addresses = await self._address_cache.resolve_all(self.host, self.port)
+        else:
+            addresses = await lookup(self.host, self.port)
+        # If the lookup fails, connect by name and let the connection report the error.
+        return addresses or [self.host]
+
+    async def _start(self) -> None:
+        async with self._start_lock:
+            if self._stripes:
+                return
+            addresses = self._addresses = await self._lookup()
+            self._stripes = [
+                Stripe(addresses[i % len(addresses)], self._make_http()) for i in range(self.size)
+            ]
+
+    async def pick(self) -> Stripe:
+        """The live stripe with the fewest outstanding requests (ties in rotation)."""
+        if not self._stripes:
+            await self._start()
+        stripes = self._stripes
+        count = len(stripes)
+        self._cursor = (self._cursor + 1) % count
+        best = stripes[self._cursor]
+        for i in range(1, count):
+            stripe = stripes[(self._cursor + i) % count]
+            if stripe.outstanding < best.outstanding:
+                best = stripe
+        return best
+
+    def pin(self, stripe: Stripe, path: str, headers: Dict[str, str], extensions: Dict[str, Any]) -> str:
+        """URL for `path` on `stripe`, with the real host name for SNI and `:authority`."""
+        headers["host"] = self.authority
+        extensions["sni_hostname"] = self.host
+        address = stripe.address
+        host = f"[{address}]" if ":" in address else address
+        return f"https://{host}:{self.port}{path}"
+
+    def finished(self, stripe: Stripe, elapsed: float) -> None:
+        samples = stripe.samples = stripe.samples + 1
+        stripe.latency = elapsed if samples == 1 else stripe.latency + _LATENCY_ALPHA * (elapsed - stripe.latency)
+        if samples < _MIN_SAMPLES or stripe.ejected:
+            return
+        fastest: Optional[float] = None
+        for other in self._stripes:
+            if other is not stripe and other.samples >= _MIN_SAMPLES:
+                fastest = other.latency if fastest is None else min(fastest, other.latency)
+        if fastest is not None and stripe.latency > _SLOW_FACTOR * fastest:
+            self.eject(stripe, "slow")
+
+    def eject(self, stripe: Stripe, cause: str) -> None:
+        if stripe.ejected or stripe not in self._stripes:
+            return
+        stripe.ejected = True
+        self.ejections[cause] += 1
+        if self._on_eject is not None:
+            self._on_eject(cause)
+        index = self._stripes.index(stripe)
+        self._stripes[index] = Stripe(self._replacement_address(stripe.address), self._make_http())
+        self._draining.add(stripe)
+        self.release(stripe)
+
+    def _replacement_address(self, ejected: str) -> str:
+        # The addresses looked up at start; a fresh lookup would need to await,
+        # and ejection happens in the middle of a request.
+        candidates = [a for a in self._addresses if a != ejected] or self._addresses
+        in_use = Counter(s.address for s in self._stripes if not s.ejected)
+        return min(candidates, key=lambda a: in_use[a])
+
+    def release(self, stripe: Stripe) -> None:
+        """Close an ejected stripe once its last outstanding request is done."""
+        if stripe.ejected and stripe.outstanding == 0 and stripe in self._draining:
+            self._draining.discard(stripe)
+            if self._close_clients:
+                task = asyncio.ensure_future(stripe.http.aclose())
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+    async def aclose(self) -> None:
+        stripes = [*self._stripes, *self._draining]
+        self._stripes, self._draining = [], set()
+        if self._close_clients:
+            for stripe in stripes:
+                await stripe.http.aclose()
+        if self._closing:
+            await asyncio.wait(set(self._closing))
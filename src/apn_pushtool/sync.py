@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import Any, Coroutine, Dict, Iterable, Optional, TypeVar
+
+from apn_pushtool.client import ApnsClient
+from apn_pushtool.config import ApnsCredentials, CredentialsProvider
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult
+
+_T = TypeVar("_T")
+
+
+class SyncApnsClient:
+    """
+    Blocking, thread-safe facade over ApnsClient for code that does not run asyncio
+    (Django views, Celery tasks, scripts).
+
+    One event loop runs on a background thread and owns one ApnsClient, so every
+    caller shares its pooled HTTP/2 connections and cached provider token. Each
+    method returns a `concurrent.futures.Future` at once; any number of threads
+    can have sends in flight and they are multiplexed on the same connections.
+
+        client = SyncApnsClient(load_apns_credentials())  # e.g. module level
+        future = client.send_push(device_token=token, payload=payload)
+        result = future.result()
+
+    The loop is started on first use and restarted in a forked child (a prefork
+    Celery worker inherits the object but not the thread). Keyword arguments are
+    passed to ApnsClient.
+    """
+
+    def __init__(self, creds: ApnsCredentials | CredentialsProvider, **client_kwargs: Any) -> None:
+        self._creds = creds
+        self._client_kwargs = client_kwargs
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[ApnsClient] = None
+        self._pid = 0
+        self._closed = False
+
+    def __enter__(self) -> SyncApnsClient:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _ensure_started(self) -> tuple[asyncio.AbstractEventLoop, ApnsClient]:
+        loop, client = self._loop, self._client
+        if loop is not None and client is not None and self._pid == os.getpid():
+            return loop, client
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SyncApnsClient is closed.")
+            if self._loop is None or self._client is None or self._pid != os.getpid():
+                # Fresh start, or the parent's loop thread did not survive a fork.
+                self._loop = asyncio.new_event_loop()
+                self._client = ApnsClient(self._creds, **self._client_kwargs)
+                self._thread = threading.Thread(target=self._loop.run_forever, name="apns-client", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._loop, self._client
+
+    def submit(self, coro: Coroutine[Any, Any, _T]) -> concurrent.futures.Future[_T]:
+        """Run any coroutine (e.g. one using `client`) on the background loop."""
+        loop, _ = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    @property
+    def client(self) -> ApnsClient:
+        """The underlying ApnsClient; only use it from coroutines passed to `submit`."""
+        return self._ensure_started()[1]
+
+    def send_push(self, **kwargs: Any) -> concurrent.futures.Future[PushResult]:
+        """Non-blocking `ApnsClient.send_push`; same keyword arguments."""
+        return self.submit(self.client.send_push(**kwargs))
+
+    def send_message(self, message: PushMessage) -> concurrent.futures.Future[PushResult]:
+        return self.submit(self.client.send_message(message))
+
+    def send_long_message(self, **kwargs: Any) -> concurrent.futures.Future[list[PushResult]]:
+        """Non-blocking `ApnsClient.send_long_message`; same keyword arguments."""
+        return self.submit(self.client.send_long_message(**kwargs))
+
+    def send_many(
+        self, device_tokens: Iterable[str], *, payload: Dict[str, Any] | bytes, **kwargs: Any
+    ) -> concurrent.futures.Future[Dict[str, PushResult]]:
+        """Non-blocking `ApnsClient.send_many`, collected into `{device_token: result}`."""
+        client = self.client
+
+        async def collect() -> Dict[str, PushResult]:
+            return {token: result async for token, result in client.send_many(device_tokens, payload=payload, **kwargs)}
+
+        return self.submit(collect())
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        """Wait for sends in flight, close the connections and stop the loop thread."""
+        with self._lock:
+            self._closed = True
+            loop, client, thread = self._loop, self._client, self._thread
+            self._loop = self._client = self._thread = None
+        if loop is None or client is None or thread is None or self._pid != os.getpid():
+            return
+
+        async def shutdown() -> None:
+            others = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            if others:
+                await asyncio.wait(others, timeout=timeout)
+            await client.aclose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            if not thread.is_alive():
+                loop.close()
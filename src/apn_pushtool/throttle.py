@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import random
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    TypeVar,
+)
+
+from apn_pushtool.client import ApnsClient, PushMessage, aiterate, run_bounded
+from apn_pushtool.results import PushResult, Reason
+
+_K = TypeVar("_K")
+
+# Reasons worth retrying later: throttling, server trouble, connection loss.
+RETRYABLE_REASONS = frozenset(
+    {"TooManyRequests", "InternalServerError", "ServiceUnavailable", "Shutdown", "ConnectionError"}
+)
+# Reasons that will never succeed for this device/topic; retrying only wastes quota.
+PERMANENT_REASONS = frozenset(
+    {
+        "BadDeviceToken",
+        "Unregistered",
+        "ExpiredToken",
+        "DeviceTokenNotForTopic",
+        "TopicDisallowed",
+        "BadTopic",
+        "MissingDeviceToken",
+        "PayloadTooLarge",
+        "PayloadEmpty",
+        "KnownInvalidToken",
+    }
+)
+# Reasons that mean we are sending too fast and should shrink concurrency.
+CONGESTION_REASONS = frozenset({"TooManyRequests", "ServiceUnavailable", "Shutdown"})
+
+
+def result_reason(result: PushResult) -> Optional[str]:
+    """APNs failure reason of a send result, `ConnectionError` for transport failures."""
+    if result.success:
+        return None
+    return str(result.reason or Reason.UNKNOWN)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` banked."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float | None = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take one token, returning how many seconds the caller must wait for it."""
+        self._refill()
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    @property
+    def idle(self) -> bool:
+        self._refill()
+        return self._tokens >= self.burst
+
+
+class AimdLimiter:
+    """
+    Concurrency limit with additive increase / multiplicative decrease.
+
+    Every success grows the limit by 1/limit (about +1 per window of sends); a
+    congestion signal halves it, at most once per `cooldown_seconds` so a burst of
+    simultaneous 429s counts as one signal.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial: int = 50,
+        minimum: int = 1,
+        maximum: int = 1000,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError("Need 1 <= minimum <= initial <= maximum.")
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(initial)
+        self._decrease_factor = decrease_factor
+        self._cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self._last_decrease = -float("inf")
+        self._in_flight = 0
+        self._changed = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self) -> None:
+        async with self._changed:
+            self._in_flight -= 1
+            self._changed.notify_all()
+
+    def on_success(self) -> None:
+        self._limit = min(float(self.maximum), self._limit + 1.0 / self._limit)
+
+    def on_congestion(self) -> None:
+        now = self._clock()
+        if now - self._last_decrease < self._cooldown_seconds:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.minimum), self._limit * self._decrease_factor)
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    max_attempts: int = 5
+    base_delay_seconds: float = 0.5
+    max_delay_seconds: float = 30.0
+
+    def delay(self, attempt: int, *, rng: Callable[[], float] = random.random) -> float:
+        """Exponential backoff with full jitter for the given (1-based) failed attempt."""
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** (attempt - 1)))
+        return ceiling * rng()
+
+
+@dataclass(frozen=True, slots=True)
+class DeadLetter:
+    message: PushMessage
+    reason: str
+    result: PushResult
+
+
+@dataclass(slots=True)
+class DeliveryStats:
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    dead_lettered: int = 0
+    by_reason: Dict[str, int] = field(default_factory=dict)
+
+
+class DeliveryScheduler:
+    """
+    Rate-limited, retrying sender around an ApnsClient.
+
+    - Token buckets per topic and (optionally) per device cap the send rate.
+    - Retryable failures (429/500/503, connection errors) are retried with
+      exponential backoff and full jitter, up to `retry.max_attempts` attempts.
+    - An AIMD limiter shrinks concurrency when 429/503 responses appear and
+      grows it back while sends succeed.
+    - Permanent failures (BadDeviceToken, Unregistered, ...) are never retried
+      and are collected in `dead_letters`.
+    """
+
+    def __init__(
+        self,
+        client: ApnsClient,
+        *,
+        topic_rate: float | None = None,
+        topic_burst: float | None = None,
+        device_rate: float | None = None,
+        device_burst: float | None = None,
+        retry: RetryPolicy = RetryPolicy(),
+        limiter: AimdLimiter | None = None,
+        max_device_buckets: int = 100_000,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        self._client = client
+        self._topic_rate = topic_rate
+        self._topic_burst = topic_burst
+        self._device_rate = device_rate
+        self._device_burst = device_burst
+        self._retry = retry
+        self.limiter = limiter if limiter is not None else AimdLimiter()
+        self._max_device_buckets = max_device_buckets
+        self._sleep = sleep
+        self._topic_buckets: Dict[str, TokenBucket] = {}
+        self._device_buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.dead_letters: list[DeadLetter] = []
+        self.stats = DeliveryStats()
+
+    def _topic_bucket(self, topic: str) -> TokenBucket | None:
+        if self._topic_rate is None:
+            return None
+        bucket = self._topic_buckets.get(topic)
+        if bucket is None:
+            bucket = self._topic_buckets[topic] = TokenBucket(self._topic_rate, self._topic_burst)
+        return bucket
+
+    def _device_bucket(self, device_token: str) -> TokenBucket | None:
+        if self._device_rate is None:
+            return None
+        bucket = self._device_buckets.get(device_token)
+        if bucket is None:
+            bucket = self._device_buckets[device_token] = TokenBucket(self._device_rate, self._device_burst)
+            # Keep memory bounded on huge audiences: evict the oldest buckets,
+            # which are almost always idle (full) by the time they age out.
+            while len(self._device_buckets) > self._max_device_buckets:
+                self._device_buckets.popitem(last=False)
+        else:
+            self._device_buckets.move_to_end(device_token)
+        return bucket
+
+    async def _wait_for_rate(self, message: PushMessage) -> None:
+        wait = 0.0
+        topic_bucket = self._topic_bucket(message.topic or "")
+        if topic_bucket is not None:
+            wait = max(wait, topic_bucket.reserve())
+        device_bucket = self._device_bucket(message.device_token)
+        if device_bucket is not None:
+            wait = max(wait, device_bucket.reserve())
+        if wait > 0:
+            await self._sleep(wait)
+
+    async def send(self, message: PushMessage) -> PushResult:
+        attempt = 0
+        while True:
+            await self._wait_for_rate(message)
+            await self.limiter.acquire()
+            try:
+                result = await self._client.send_message(message)
+            finally:
+                await self.limiter.release()
+            attempt += 1
+
+            reason = result_reason(result)
+            if reason is None:
+                self.limiter.on_success()
+                self.stats.sent += 1
+                return result
+
+            if reason in CONGESTION_REASONS:
+                self.limiter.on_congestion()
+
+            if reason in RETRYABLE_REASONS and attempt < self._retry.max_attempts:
+                self.stats.retried += 1
+                await self._sleep(self._retry.delay(attempt))
+                continue
+
+            self.stats.failed += 1
+            self.stats.by_reason[reason] = self.stats.by_reason.get(reason, 0) + 1
+            if reason in PERMANENT_REASONS:
+                self.dead_letters.append(DeadLetter(message=message, reason=reason, result=result))
+                self.stats.dead_lettered += 1
+            return result
+
+    async def send_batch(
+        self,
+        messages: Iterable[tuple[_K, PushMessage]] | AsyncIterable[tuple[_K, PushMessage]],
+    ) -> AsyncIterator[tuple[_K, PushResult]]:
+        """
+        Like ApnsClient.send_batch, but every message goes through rate limits and
+        retries. The window of queued sends follows the AIMD limit.
+        """
+
+        async def jobs() -> AsyncIterator[tuple[_K, Awaitable[PushResult]]]:
+            async for key, message in aiterate(messages):
+                yield key, self.send(message)
+
+        # Allow a little more than the limit to be queued so a freed slot is
+        # picked up immediately; the limiter itself caps what is on the wire.
+        async for item in run_bounded(jobs(), window=lambda: self.limiter.limit * 2):
+            yield item
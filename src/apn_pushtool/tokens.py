@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import bisect
+import codecs
+from dataclasses import dataclass, field
+import mmap
+import os
+from pathlib import Path
+from typing import AbstractSet, Iterable, Iterator, Sequence
+
+# Bulk counterparts of config.normalize_device_token / is_valid_device_token, for
+# token exports with millions of rows. The work is done by C-level bytes methods
+# over the whole buffer (one translate, one split, one fromhex) instead of a
+# handful of Python-level string operations per token.
+
+TOKEN_BYTES = 32
+
+# Separators people paste into tokens ("aabb ccdd", "aabb-ccdd", CRLF files).
+_SEPARATORS = b" -\t\r"
+_SEPARATORS_STR = str.maketrans("", "", _SEPARATORS.decode("ascii"))
+
+
+@dataclass(frozen=True, slots=True)
+class TokenValidation:
+    """
+    Result of `validate_tokens`: the valid tokens, deduplicated and packed as
+    32-byte binary in first-seen order, plus the rows that were rejected.
+    """
+
+    packed: bytes = b""
+    # (1-based row number, raw row) of every non-blank row that is not a token.
+    invalid: list[tuple[int, str]] = field(default_factory=list)
+    duplicates: int = 0
+
+    def __len__(self) -> int:
+        return len(self.packed) // TOKEN_BYTES
+
+    def __iter__(self) -> Iterator[str]:
+        """Valid tokens as lowercase hex."""
+        packed = self.packed
+        for i in range(0, len(packed), TOKEN_BYTES):
+            yield packed[i : i + TOKEN_BYTES].hex()
+
+
+class TokenSet:
+    """
+    Immutable set of device tokens stored as one sorted array of 32-byte keys:
+    32 bytes per token instead of the ~113 of a 64-character `str`, so a
+    10M-device audience takes 320 MB, or next to nothing when the array is a
+    memory-mapped file (`save`/`open`).
+
+    Membership is a binary search. Iterating yields hex strings one at a time,
+    so tokens exist as `str` only while they are being sent; `keys()` yields
+    the raw keys as zero-copy memoryviews.
+    """
+
+    def __init__(self, tokens: Iterable[str | bytes] = ()) -> None:
+        keys: set[bytes] = set()
+        for token in tokens:
+            key = _token_key(token)
+            if key is None:
+                raise ValueError(f"Invalid device token: {token!r}")
+            keys.add(key)
+        self._buffer: bytes | mmap.mmap = b"".join(sorted(keys))
+        self._mmap: mmap.mmap | None = None
+
+    @classmethod
+    def from_packed(cls, packed: bytes) -> TokenSet:
+        """Build from concatenated 32-byte keys in any order (e.g. `TokenValidation.packed`)."""
+        if len(packed) % TOKEN_BYTES:
+            raise ValueError("Packed tokens must be a multiple of 32 bytes.")
+        keys = {packed[i : i + TOKEN_BYTES] for i in range(0, len(packed), TOKEN_BYTES)}
+        return cls._sorted(b"".join(sorted(keys)))
+
+    @classmethod
+    def open(cls, path: str | Path) -> TokenSet:
+        """Memory-map a file written by `save`; the keys are paged in by the OS as needed."""
+        with open(Path(path).expanduser(), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size % TOKEN_BYTES:
+                raise ValueError(f"{path} is not a token set file (size is not a multiple of 32).")
+            if size == 0:
+                return cls._sorted(b"")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        tokens = cls._sorted(mapped)
+        tokens._mmap = mapped
+        return tokens
+
+    @classmethod
+    def _sorted(cls, buffer: bytes | mmap.mmap) -> TokenSet:
+        tokens = cls.__new__(cls)
+        tokens._buffer = buffer
+        tokens._mmap = None
+        return tokens
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path).expanduser()
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(self._buffer)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._buffer = b""
+
+    def __enter__(self) -> TokenSet:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._buffer) // TOKEN_BYTES
+
+    def __contains__(self, token: object) -> bool:
+        key = _token_key(token) if isinstance(token, (str, bytes)) else None
+        if key is None:
+            return False
+        keys = _SortedKeys(self._buffer)
+        i = bisect.bisect_left(keys, key)
+        return i < len(keys) and keys[i] == key
+
+    def __iter__(self) -> Iterator[str]:
+        """Tokens as lowercase hex, in key order."""
+        for key in self.keys():
+            yield key.hex()
+
+    def keys(self) -> Iterator[memoryview]:
+        view = memoryview(self._buffer)
+        for i in range(0, len(view), TOKEN_BYTES):
+            yield view[i : i + TOKEN_BYTES]
+
+    def difference(self, other: TokenSet | AbstractSet[bytes] | Iterable[str | bytes]) -> TokenSet:
+        """
+        Tokens in this set but not in `other`, typically the audience minus the
+        dead tokens (`TokenRegistry.blocked_keys()`). `other` is read once into a
+        set of keys, which is the cheap side: it is usually the much smaller one.
+        """
+        if isinstance(other, TokenSet):
+            excluded: AbstractSet[bytes] = {bytes(key) for key in other.keys()}
+        elif isinstance(other, (set, frozenset)):
+            excluded = other
+        else:
+            excluded = {key for key in map(_token_key, other) if key is not None}
+        kept = bytearray()
+        for key in self.keys():
+            if key.tobytes() not in excluded:
+                kept += key
+        return TokenSet._sorted(bytes(kept))
+
+
+class _SortedKeys(Sequence[bytes]):
+    """The keys of a sorted buffer as a sequence, for `bisect`."""
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self, buffer: bytes | mmap.mmap) -> None:
+        self._buffer = buffer
+
+    def __len__(self) -> int:
+        return len(self._buffer) // TOKEN_BYTES
+
+    def __getitem__(self, i: int) -> bytes:  # type: ignore[override]
+        start = i * TOKEN_BYTES
+        return self._buffer[start : start + TOKEN_BYTES]
+
+
+def _token_key(token: str | bytes) -> bytes | None:
+    if isinstance(token, bytes):
+        return token if len(token) == TOKEN_BYTES else None
+    try:
+        key = bytes.fromhex(token.translate(_SEPARATORS_STR))
+    except ValueError:
+        return None
+    return key if len(key) == TOKEN_BYTES else None
+
+
+def normalize_tokens(tokens: Iterable[str]) -> list[str]:
+    """`normalize_device_token` for a whole list, in one translate pass."""
+    tokens = list(tokens)
+    if not tokens:
+        return []
+    if any("\n" in t for t in tokens):
+        return [t.strip().translate(_SEPARATORS_STR) for t in tokens]
+    return "\n".join(tokens).translate(_SEPARATORS_STR).split("\n")
+
+
+def validate_tokens(tokens: Iterable[str | bytes] | bytes) -> TokenValidation:
+    """
+    Normalize and validate tokens, given as a list of rows or as the raw bytes of
+    a one-token-per-line export. Blank rows are skipped.
+    """
+    if isinstance(tokens, (bytes, bytearray, memoryview)):
+        return _validate_buffer(bytes(tokens))
+    rows = [t.encode("utf-8", "surrogateescape") if isinstance(t, str) else t for t in tokens]
+    if any(b"\n" in row for row in rows):
+        rows = [row.replace(b"\n", b"") for row in rows]
+    return _validate_buffer(b"\n".join(rows))
+
+
+def validate_token_file(path: str | Path) -> TokenValidation:
+    """`validate_tokens` for a file with one token per line; row numbers are line numbers."""
+    return _validate_buffer(Path(path).expanduser().read_bytes())
+
+
+def is_token_set_file(path: str | Path) -> bool:
+    """
+    Whether `path` holds a token set written by `TokenSet.save` rather than a
+    token list, whatever its name: a token set is binary and a multiple of 32
+    bytes, while a token list is text. 32 random bytes that decode as text
+    without control characters are vanishingly rare.
+    """
+    with open(Path(path).expanduser(), "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(4096)
+    if size == 0 or size % TOKEN_BYTES:
+        return False
+    try:
+        text = codecs.getincrementaldecoder("utf-8")().decode(head)  # a cut-off last character is fine
+    except UnicodeDecodeError:
+        return True
+    return any(ch < " " and ch not in "\t\r\n" for ch in text)
+
+
+def write_tokens(path: str | Path, validation: TokenValidation) -> None:
+    """Write the valid tokens as hex, one per line."""
+    with open(Path(path).expanduser(), "w", encoding="ascii", newline="\n") as f:
+        for token in validation:
+            f.write(token + "\n")
+
+
+def _validate_buffer(data: bytes) -> TokenValidation:
+    text = data.translate(None, _SEPARATORS)
+    packed = _decode_clean(text)
+
+    invalid: list[tuple[int, str]] = []
+    if packed is not None:
+        chunks = [packed[i : i + TOKEN_BYTES] for i in range(0, len(packed), TOKEN_BYTES)]
+    else:
+        chunks = []
+        raw: list[bytes] | None = None
+        for number, line in enumerate(text.split(b"\n"), 1):
+            if not line:
+                continue
+            try:
+                token = bytes.fromhex(line.decode("ascii")) if len(line) == 2 * TOKEN_BYTES else None
+            except ValueError:
+                token = None
+            if token is None or len(token) != TOKEN_BYTES:
+                if raw is None:
+                    raw = data.split(b"\n")  # only for reporting rows as they were written
+                invalid.append((number, raw[number - 1].rstrip(b"\r").decode("utf-8", "replace")))
+            else:
+                chunks.append(token)
+
+    # A set is the cheapest duplicate check; only when there are duplicates is the
+    # (slower) order-preserving pass needed.
+    duplicates = len(chunks) - len(set(chunks))
+    if duplicates:
+        packed = b"".join(dict.fromkeys(chunks))
+    elif packed is None:
+        packed = b"".join(chunks)
+    return TokenValidation(packed=packed, invalid=invalid, duplicates=duplicates)
+
+
+def _decode_clean(text: bytes) -> bytes | None:
+    """
+    Fast path for the usual, clean export: if every row is exactly 64 characters
+    and the whole buffer is hex, decode it in one call; otherwise return None.
+    """
+    body = text.rstrip(b"\n")
+    rows, tail = divmod(len(body) + 1, 2 * TOKEN_BYTES + 1)
+    # Newlines at exactly every 65th byte, and nowhere else (so no blank rows).
+    if tail or body.count(b"\n") != rows - 1 or body[2 * TOKEN_BYTES :: 2 * TOKEN_BYTES + 1].count(b"\n") != rows - 1:
+        return None
+    try:
+        return bytes.fromhex(body.decode("ascii"))  # fromhex skips the newlines itself
+    except ValueError:
+        return None
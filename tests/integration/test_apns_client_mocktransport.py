@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import asyncio
 import json
 
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import ec
+import h2.events
+import httpcore
 import httpx
 import pytest
 
-from apn_pushtool.client import ApnsClient
-from apn_pushtool.config import ApnsCredentials
+from apn_pushtool.client import ApnsClient, PushMessage
+from apn_pushtool.config import ApnsCredentials, CredentialsProvider
+from apn_pushtool.registry import TokenRegistry
+from apn_pushtool.results import Reason
 
 
 def _creds(env: str = "sandbox") -> ApnsCredentials:
@@ -67,3 +72,362 @@ async def test_send_push_includes_error_body_for_non_200() -> None:
     assert result["success"] is False
     assert result["status_code"] == 400
     assert result["error"]["reason"] == "BadDeviceToken"
+
+
+@pytest.mark.asyncio
+async def test_send_push_reuses_provider_token_across_pushes() -> None:
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["authorization"])
+        return httpx.Response(status_code=200, json={})
+
+    client = ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler))
+    payload = client.create_basic_payload(title="T", body="B")
+
+    for _ in range(3):
+        await client.send_push(device_token="c" * 64, payload=payload)
+
+    assert len(set(seen)) == 1
+
+
+@pytest.mark.asyncio
+async def test_send_push_refreshes_token_on_expired_provider_token() -> None:
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["authorization"])
+        if len(seen) == 1:
+            return httpx.Response(status_code=403, json={"reason": "ExpiredProviderToken"})
+        return httpx.Response(status_code=200, json={})
+
+    client = ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler))
+    stale = client.provider_token()
+    payload = client.create_basic_payload(title="T", body="B")
+
+    result = await client.send_push(device_token="d" * 64, payload=payload)
+    assert result["success"] is True
+    assert seen[0] == f"bearer {stale}"
+    assert len(seen) == 2
+
+
+@pytest.mark.asyncio
+async def test_client_context_manager_reuses_one_http_client() -> None:
+    def handler(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(status_code=200, json={})
+
+    async with ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler)) as client:
+        http = client._http_client()
+        payload = client.create_basic_payload(title="T", body="B")
+        await client.send_push(device_token="e" * 64, payload=payload)
+        await client.send_push(device_token="e" * 64, payload=payload)
+        assert client._http_client() is http
+
+    assert http.is_closed
+
+
+def _goaway(last_stream_id: int, request: httpx.Request) -> httpx.RemoteProtocolError:
+    # What httpx raises for a GOAWAY: httpcore's RemoteProtocolError(ConnectionTerminated), chained.
+    event = h2.events.ConnectionTerminated()
+    event.last_stream_id = last_stream_id
+    error = httpx.RemoteProtocolError(str(event), request=request)
+    error.__cause__ = httpcore.RemoteProtocolError(event)
+    return error
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("failure", "retried"),
+    [
+        (lambda request: _goaway(1, request), True),  # stream 3 refused: APNs processed nothing above 1
+        (lambda request: _goaway(5, request), False),  # stream 3 may have been processed
+        (lambda request: httpx.RemoteProtocolError("Server disconnected", request=request), False),
+        (lambda request: httpx.WriteError("Broken pipe", request=request), False),
+    ],
+)
+async def test_send_push_resends_only_pushes_that_never_reached_apns(failure, retried: bool) -> None:
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        await request.extensions["trace"]("http2.send_request_headers.started", {"stream_id": 3})
+        if calls == 1:
+            raise failure(request)
+        return httpx.Response(status_code=200, json={})
+
+    async with ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler)) as client:
+        result = await client.send_message(PushMessage(device_token="f" * 64, payload={"aps": {}}))
+
+    assert calls == (2 if retried else 1)
+    assert result.success is retried
+    assert retried or result.reason is Reason.CONNECTION_ERROR
+
+
+@pytest.mark.asyncio
+async def test_send_push_resends_a_request_that_failed_before_its_headers_were_written() -> None:
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        await request.extensions["trace"]("http2.send_connection_init.started", {"request": request})
+        if calls == 1:
+            raise httpx.WriteError("Broken pipe", request=request)
+        return httpx.Response(status_code=200, json={})
+
+    async with ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler)) as client:
+        result = await client.send_message(PushMessage(device_token="f" * 64, payload={"aps": {}}))
+
+    assert result.success and calls == 2
+
+
+@pytest.mark.asyncio
+async def test_send_many_streams_results_with_bounded_window() -> None:
+    in_flight = 0
+    peak = 0
+    bodies: set[bytes] = set()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        bodies.add(request.content)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if request.url.path.endswith("0" * 64):
+            return httpx.Response(status_code=410, json={"reason": "Unregistered"})
+        return httpx.Response(status_code=200, json={})
+
+    tokens = [f"{i:x}".rjust(64, "0") for i in range(20)]
+
+    async def token_stream():
+        for token in tokens:
+            yield token
+
+    async with ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler)) as client:
+        payload = client.create_basic_payload(title="T", body="B")
+        results = [r async for r in client.send_many(token_stream(), payload=payload, max_in_flight=4)]
+
+    assert sorted(token for token, _ in results) == sorted(tokens)
+    by_token = dict(results)
+    assert by_token["0" * 64]["error"]["reason"] == "Unregistered"
+    assert sum(1 for _, r in results if r["success"]) == 19
+    assert peak <= 4
+    assert len(bodies) == 1
+
+
+@pytest.mark.asyncio
+async def test_send_batch_yields_results_keyed_by_caller() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content.decode("utf-8"))
+        assert request.headers["apns-priority"] == "5"
+        assert body["aps"]["alert"]["body"] == request.url.path[-64:]
+        return httpx.Response(status_code=200, json={})
+
+    messages = [
+        (line, PushMessage(device_token=token, payload={"aps": {"alert": {"title": "T", "body": token}}}, priority=5))
+        for line, token in enumerate(["1" * 64, "2" * 64, "3" * 64], start=1)
+    ]
+
+    async with ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler)) as client:
+        results = [r async for r in client.send_batch(messages, max_in_flight=2)]
+
+    assert sorted(line for line, _ in results) == [1, 2, 3]
+    assert all(r["success"] for _, r in results)
+
+
+@pytest.mark.asyncio
+async def test_send_push_rejects_oversized_payload_without_request() -> None:
+    def handler(_: httpx.Request) -> httpx.Response:
+        raise AssertionError("oversized payload must not be sent")
+
+    client = ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler))
+    payload = client.create_basic_payload(title="T", body="x" * 5000)
+
+    result = await client.send_push(device_token="a" * 64, payload=payload)
+    assert result["success"] is False
+    assert result["error"]["reason"] == "PayloadTooLarge"
+
+
+@pytest.mark.asyncio
+async def test_send_push_accepts_pre_encoded_payload() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.content == b'{"aps":{"alert":{"body":"hi"}}}'
+        return httpx.Response(status_code=200, json={})
+
+    client = ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler))
+    result = await client.send_push(device_token="a" * 64, payload=b'{"aps":{"alert":{"body":"hi"}}}')
+    assert result["success"] is True
+
+
+@pytest.mark.asyncio
+async def test_send_long_message_packs_parts_to_payload_limit() -> None:
+    bodies: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert len(request.content) <= 4096
+        bodies.append(json.loads(request.content.decode("utf-8")))
+        return httpx.Response(status_code=200, json={})
+
+    long_text = "这是一段很长的文本，用来测试按字节预算切分。" * 300
+
+    async with ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler)) as client:
+        results = await client.send_long_message(
+            device_token="a" * 64, title="Long", long_text=long_text, delay_seconds=0
+        )
+
+    assert all(r["success"] for r in results)
+    assert len(bodies) == len(results) < 10
+    assert [b["part"] for b in bodies] == list(range(len(bodies), 0, -1))
+    assert "".join(b["aps"]["alert"]["body"] for b in reversed(bodies)) == long_text
+
+
+@pytest.mark.asyncio
+async def test_send_long_message_pipeline_groups_parts_by_thread_id() -> None:
+    bodies: list[dict] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(json.loads(request.content.decode("utf-8")))
+        await asyncio.sleep(0.01)
+        return httpx.Response(status_code=200, json={})
+
+    async with ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler)) as client:
+        results = await client.send_long_message(
+            device_token="a" * 64,
+            title="Long",
+            long_text="word " * 100,
+            max_chars=50,
+            delay_seconds=60,
+            pipeline=True,
+        )
+
+    assert len(results) == 10
+    assert all(r["success"] for r in results)
+    assert len({b["aps"]["thread-id"] for b in bodies}) == 1
+    assert sorted(b["aps"]["badge"] for b in bodies) == list(range(1, 11))
+
+
+@pytest.mark.asyncio
+async def test_registry_short_circuits_known_dead_tokens(tmp_path) -> None:
+    calls = 0
+
+    def handler(_: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(status_code=410, json={"reason": "Unregistered", "timestamp": 1700000000000})
+
+    with TokenRegistry(tmp_path / "tokens.sqlite3") as registry:
+        async with ApnsClient(_creds("sandbox"), transport=httpx.MockTransport(handler), registry=registry) as client:
+            payload = client.create_basic_payload(title="T", body="B")
+            first = await client.send_push(device_token="9" * 64, payload=payload)
+            second = await client.send_push(device_token="9" * 64, payload=payload)
+        async with ApnsClient(_creds("production"), transport=httpx.MockTransport(handler), registry=registry) as client:
+            # Dead in sandbox says nothing about production.
+            third = await client.send_push(device_token="9" * 64, payload=payload)
+
+    assert first["error"]["reason"] == "Unregistered"
+    assert second["error"]["reason"] == "KnownInvalidToken"
+    assert third["error"]["reason"] == "Unregistered"
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_client_picks_up_rotated_key_from_provider(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    for name in ("APNS_TEAM_ID", "APNS_KEY_ID", "APNS_BUNDLE_ID", "APNS_P8_PATH", "APNS_P8_PRIVATE_KEY", "APNS_ENV"):
+        monkeypatch.delenv(name, raising=False)
+    p8 = tmp_path / "key.p8"
+    p8.write_text(_creds().p8_private_key_pem, encoding="utf-8")
+    env = tmp_path / ".env"
+    env.write_text("APNS_TEAM_ID=TEAM\nAPNS_KEY_ID=KEY123\nAPNS_BUNDLE_ID=com.example.app\nAPNS_P8_PATH=key.p8\n")
+    provider = CredentialsProvider(str(env), check_interval_seconds=0)
+    authorizations: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        authorizations.append(request.headers["authorization"])
+        return httpx.Response(status_code=200)
+
+    async with ApnsClient(provider, transport=httpx.MockTransport(handler)) as client:
+        await client.send_push(device_token="a" * 64, payload={"aps": {}})
+        await client.send_push(device_token="a" * 64, payload={"aps": {}})
+        rotated = tmp_path / "rotated.p8"
+        rotated.write_text(_creds().p8_private_key_pem, encoding="utf-8")
+        rotated.replace(p8)
+        await client.send_push(device_token="a" * 64, payload={"aps": {}})
+
+    # The cached token is reused until the key changes, then re-signed with the new key.
+    assert authorizations[0] == authorizations[1] != authorizations[2]
+    assert provider.generation == 2
+
+
+@pytest.mark.asyncio
+async def test_striped_client_ejects_failing_and_slow_addresses(tmp_path) -> None:
+    from apn_pushtool.resolver import AddressCache
+
+    path = tmp_path / "addresses.json"
+    addresses = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    path.write_text(json.dumps({"api.sandbox.push.apple.com:443": {"addresses": addresses, "expires": 2e9}}))
+    seen: dict[str, int] = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["host"] == "api.sandbox.push.apple.com"
+        assert request.extensions["sni_hostname"] == "api.sandbox.push.apple.com"
+        address = request.url.host
+        seen[address] = seen.get(address, 0) + 1
+        if address == "10.0.0.3" and seen[address] == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        await asyncio.sleep(0.005 if address == "10.0.0.1" else 0)
+        return httpx.Response(200, json={})
+
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(handler), address_cache=AddressCache(path), stripes=3)
+    async with client:
+        tokens = [f"{i:064x}" for i in range(300)]
+        results = [r async for _, r in client.send_many(tokens, payload={"aps": {}}, max_in_flight=6)]
+        assert client.stripe_set is not None
+        ejections = dict(client.stripe_set.ejections)
+        live = sorted(stripe.address for stripe in client.stripe_set)
+
+    assert all(r.success for r in results)
+    assert ejections == {"error": 1, "slow": 2}
+    assert "10.0.0.1" not in live
+    assert seen["10.0.0.1"] < seen["10.0.0.2"]
+
+
+@pytest.mark.asyncio
+async def test_striped_client_replaces_its_connections_when_the_environment_changes(
+    monkeypatch: pytest.MonkeyPatch, tmp_path
+) -> None:
+    from apn_pushtool.resolver import AddressCache
+
+    for name in ("APNS_TEAM_ID", "APNS_KEY_ID", "APNS_BUNDLE_ID", "APNS_P8_PATH", "APNS_P8_PRIVATE_KEY", "APNS_ENV"):
+        monkeypatch.delenv(name, raising=False)
+    (tmp_path / "key.p8").write_text(_creds().p8_private_key_pem, encoding="utf-8")
+    env = tmp_path / ".env"
+    settings = "APNS_TEAM_ID=TEAM\nAPNS_KEY_ID=KEY123\nAPNS_BUNDLE_ID=com.example.app\nAPNS_P8_PATH=key.p8\n"
+    env.write_text(settings + "APNS_ENV=sandbox\n")
+    cache = tmp_path / "addresses.json"
+    cache.write_text(
+        json.dumps(
+            {
+                "api.sandbox.push.apple.com:443": {"addresses": ["10.0.0.1"], "expires": 2e9},
+                "api.push.apple.com:443": {"addresses": ["10.0.0.2"], "expires": 2e9},
+            }
+        )
+    )
+    hosts: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.headers["host"])
+        return httpx.Response(status_code=200)
+
+    provider = CredentialsProvider(str(env), check_interval_seconds=0)
+    client = ApnsClient(provider, transport=httpx.MockTransport(handler), address_cache=AddressCache(cache), stripes=2)
+    async with client:
+        await client.send_push(device_token="a" * 64, payload={"aps": {}})
+        sandbox = client.stripe_set
+        env.write_text(settings + "APNS_ENV=production\n")
+        await client.send_push(device_token="a" * 64, payload={"aps": {}})
+        assert client.stripe_set is not sandbox
+
+    assert hosts == ["api.sandbox.push.apple.com", "api.push.apple.com"]
+    assert sandbox is not None and list(sandbox) == []  # closed by the time aclose() returned
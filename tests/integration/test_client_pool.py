@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import httpx
+import pytest
+
+from apn_pushtool.client import PushMessage
+from apn_pushtool.config import ApnsCredentials, ConfigError
+from apn_pushtool.pool import ApnsClientPool
+
+
+def _creds(bundle_id: str, env: str = "production") -> ApnsCredentials:
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode("utf-8")
+    return ApnsCredentials(
+        team_id="TEAM",
+        key_id="KEY123",
+        bundle_id=bundle_id,
+        p8_private_key_pem=pem,
+        environment=env,  # type: ignore[arg-type]
+    )
+
+
+def _message(token: str, topic: str | None) -> PushMessage:
+    return PushMessage(device_token=token, payload={"aps": {"alert": "hi"}}, topic=topic)
+
+
+@pytest.mark.asyncio
+async def test_pool_routes_by_topic_and_falls_back_to_other_environment() -> None:
+    sandbox_token = "5" * 64
+    seen: list[tuple[str, str]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.url.host, request.headers["apns-topic"]))
+        if request.url.path.endswith(sandbox_token) and request.url.host == "api.push.apple.com":
+            return httpx.Response(status_code=400, json={"reason": "BadDeviceToken"})
+        return httpx.Response(status_code=200, json={})
+
+    pool = ApnsClientPool(
+        [_creds("com.example.app"), _creds("com.example.other", "sandbox")],
+        transport=httpx.MockTransport(handler),
+    )
+    async with pool:
+        voip = await pool.send(_message("1" * 64, "com.example.app.voip"))
+        other = await pool.send(_message("2" * 64, "com.example.other"))
+        assert voip.success and other.success
+        assert seen == [
+            ("api.push.apple.com", "com.example.app.voip"),
+            ("api.sandbox.push.apple.com", "com.example.other"),
+        ]
+
+        seen.clear()
+        first = await pool.send(_message(sandbox_token, "com.example.app"))
+        again = await pool.send(_message(sandbox_token, "com.example.app"))
+
+    assert first.success and again.success
+    assert [host for host, _ in seen] == [
+        "api.push.apple.com",
+        "api.sandbox.push.apple.com",
+        "api.sandbox.push.apple.com",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pool_reports_bad_token_when_both_environments_reject_it() -> None:
+    def handler(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(status_code=400, json={"reason": "BadDeviceToken"})
+
+    async with ApnsClientPool([_creds("com.example.app")], transport=httpx.MockTransport(handler)) as pool:
+        result = await pool.send(_message("3" * 64, None))
+        with pytest.raises(ConfigError):
+            pool.client_for("org.unknown")
+
+    assert result.success is False
+    assert result["error"]["reason"] == "BadDeviceToken"
+
+
+@pytest.mark.asyncio
+async def test_pool_shares_provider_tokens_across_environments() -> None:
+    auth: set[str] = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        auth.add(request.headers["authorization"])
+        return httpx.Response(status_code=200, json={})
+
+    async with ApnsClientPool([_creds("com.example.app")], transport=httpx.MockTransport(handler)) as pool:
+        await pool.send(_message("4" * 64, None), environment="production")
+        await pool.send(_message("4" * 64, None), environment="sandbox")
+
+    assert len(auth) == 1
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import httpx
+import pytest
+
+from apn_pushtool.client import ApnsClient, PushMessage
+from apn_pushtool.config import ApnsCredentials
+from apn_pushtool.throttle import AimdLimiter, DeliveryScheduler, RetryPolicy
+
+
+def _creds() -> ApnsCredentials:
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode("utf-8")
+    return ApnsCredentials(
+        team_id="TEAM",
+        key_id="KEY123",
+        bundle_id="com.example.app",
+        p8_private_key_pem=pem,
+        environment="sandbox",
+    )
+
+
+def _message(token: str) -> PushMessage:
+    return PushMessage(device_token=token, payload={"aps": {"alert": {"title": "T", "body": "B"}}})
+
+
+@pytest.mark.asyncio
+async def test_scheduler_retries_throttled_sends_with_backoff() -> None:
+    calls = 0
+    sleeps: list[float] = []
+
+    def handler(_: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if calls <= 2:
+            return httpx.Response(status_code=429, json={"reason": "TooManyRequests"})
+        return httpx.Response(status_code=200, json={})
+
+    async def fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+
+    async with ApnsClient(_creds(), transport=httpx.MockTransport(handler)) as client:
+        limiter = AimdLimiter(initial=16, cooldown_seconds=0)
+        scheduler = DeliveryScheduler(client, limiter=limiter, retry=RetryPolicy(), sleep=fake_sleep)
+        result = await scheduler.send(_message("a" * 64))
+
+    assert result["success"] is True
+    assert calls == 3
+    assert len(sleeps) == 2
+    assert limiter.limit < 16
+    assert scheduler.stats.retried == 2
+    assert scheduler.dead_letters == []
+
+
+@pytest.mark.asyncio
+async def test_scheduler_dead_letters_permanent_failures_without_retry() -> None:
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if request.url.path.endswith("b" * 64):
+            return httpx.Response(status_code=410, json={"reason": "Unregistered", "timestamp": 1})
+        return httpx.Response(status_code=200, json={})
+
+    async def fake_sleep(_: float) -> None:
+        raise AssertionError("permanent failures must not be retried")
+
+    async with ApnsClient(_creds(), transport=httpx.MockTransport(handler)) as client:
+        scheduler = DeliveryScheduler(client, sleep=fake_sleep)
+        messages = [(token, _message(token)) for token in ("a" * 64, "b" * 64, "c" * 64)]
+        results = dict([r async for r in scheduler.send_batch(messages)])
+
+    assert calls == 3
+    assert results["b" * 64]["success"] is False
+    assert [d.reason for d in scheduler.dead_letters] == ["Unregistered"]
+    assert scheduler.dead_letters[0].message.device_token == "b" * 64
+    assert scheduler.stats.sent == 2
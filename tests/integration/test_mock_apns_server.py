@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import stat
+
+import pytest
+
+from apn_pushtool.bench import benchmark_credentials, run_benchmark
+from apn_pushtool.client import ApnsClient
+from apn_pushtool.metrics import ClientMetrics, serve_metrics
+from apn_pushtool.mockserver import MockApnsConfig, MockApnsServer
+from apn_pushtool.resolver import AddressCache
+from apn_pushtool.results import Reason
+
+
+def _client(server: MockApnsServer) -> ApnsClient:
+    return ApnsClient(benchmark_credentials(), server_url=server.url, verify=server.client_ssl_context())
+
+
+@pytest.mark.asyncio
+async def test_real_http2_round_trip() -> None:
+    async with MockApnsServer() as server, _client(server) as client:
+        result = await client.send_push(device_token="a" * 64, payload={"aps": {"alert": "hi"}})
+        bad = await client.send_push(device_token="abc", payload={"aps": {"alert": "hi"}})
+
+    assert result.success
+    assert result.apns_id
+    assert bad.reason is Reason.BAD_DEVICE_TOKEN
+    assert server.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_error_mix_is_reported_with_apns_reasons() -> None:
+    config = MockApnsConfig(error_mix={"Unregistered": 0.5, "TooManyRequests": 0.5}, seed=7)
+    async with MockApnsServer(config) as server, _client(server) as client:
+        tokens = [f"{i:064x}" for i in range(20)]
+        results = [r async for _, r in client.send_many(tokens, payload={"aps": {"alert": "hi"}})]
+
+    reasons = {r.reason for r in results}
+    assert reasons == {Reason.UNREGISTERED, Reason.TOO_MANY_REQUESTS}
+    unregistered = next(r for r in results if r.reason is Reason.UNREGISTERED)
+    assert unregistered.status_code == 410
+    assert isinstance(unregistered.error, dict) and "timestamp" in unregistered.error
+
+
+@pytest.mark.asyncio
+async def test_client_reconnects_after_goaway() -> None:
+    config = MockApnsConfig(goaway_after=5, goaway_grace_seconds=0.05)
+    async with MockApnsServer(config) as server, _client(server) as client:
+        results = [
+            await client.send_push(device_token=f"{i:064x}", payload={"aps": {"alert": "hi"}}) for i in range(12)
+        ]
+        tokens = [f"{i:064x}" for i in range(40)]
+        fanout = [r async for _, r in client.send_many(tokens, payload={"aps": {"alert": "hi"}}, max_in_flight=4)]
+
+    assert all(r.success for r in results + fanout)
+    assert server.goaways >= 2
+    assert server.connections >= 3
+
+
+
+@pytest.mark.asyncio
+async def test_send_window_follows_the_advertised_stream_limit() -> None:
+    config = MockApnsConfig(max_concurrent_streams=7)
+    async with MockApnsServer(config) as server, _client(server) as client:
+        assert client._send_window(100) == 100  # nothing known before the first connection
+        await client.send_push(device_token="a" * 64, payload={"aps": {"alert": "hi"}})
+
+        # Read from httpcore internals; this catches a layout change in a dependency upgrade.
+        # One connection to the origin, so the window is its limit, not `max_connections` times it.
+        assert client._send_window(100) == 7
+        assert client._send_window(5) == 5
+
+
+@pytest.mark.asyncio
+async def test_benchmark_reports_numbers() -> None:
+    report = await run_benchmark("fanout", count=50, concurrency=10, isolate_server=False)
+
+    assert report.pushes == report.succeeded == 50
+    assert report.pushes_per_second > 0
+    assert report.latency_p50_seconds is not None
+    assert report.latency_p99_seconds is not None
+    assert report.latency_p50_seconds <= report.latency_p99_seconds
+    assert report.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_count_requests_connections_and_serve_them() -> None:
+    metrics = ClientMetrics()
+    config = MockApnsConfig(error_mix={"Unregistered": 0.5}, seed=3)
+    async with MockApnsServer(config) as server:
+        client = ApnsClient(
+            benchmark_credentials(), server_url=server.url, verify=server.client_ssl_context(), metrics=metrics
+        )
+        async with client:
+            tokens = [f"{i:064x}" for i in range(10)]
+            results = [r async for _, r in client.send_many(tokens, payload={"aps": {}}, topic="com.example.app")]
+
+    failed = sum(not r.success for r in results)
+    assert metrics.requests[("200", "", "com.example.app")] == 10 - failed
+    assert metrics.requests[("410", "Unregistered", "com.example.app")] == failed
+    assert metrics.in_flight == 0
+    assert metrics.tokens_signed == 1
+    assert metrics.connections_opened == server.connections == 1
+    assert metrics.tls_seconds.count == 1 and metrics.response_seconds.count == 10
+
+    exporter = await serve_metrics(metrics)
+    try:
+        port = exporter.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = (await reader.read()).decode()
+        writer.close()
+    finally:
+        exporter.close()
+
+    assert response.startswith("HTTP/1.1 200 OK")
+    assert 'apns_request_duration_seconds_count{topic="com.example.app"} 10' in response
+    assert "apns_connections_opened_total 1" in response
+
+
+@pytest.mark.asyncio
+async def test_address_cache_skips_lookup_on_the_next_run_and_recovers_from_a_dead_address(tmp_path) -> None:
+    path = tmp_path / "addresses.json"
+    async with MockApnsServer() as server:
+        url = f"https://localhost:{server.port}"  # the certificate is checked against "localhost" via SNI
+
+        async def send(cache: AddressCache) -> bool:
+            client = ApnsClient(
+                benchmark_credentials(), server_url=url, verify=server.client_ssl_context(), address_cache=cache
+            )
+            async with client:
+                result = await client.send_push(device_token="a" * 64, payload={"aps": {"alert": "hi"}})
+            return result.success
+
+        first = AddressCache(path)
+        assert await send(first)
+        assert first.lookups == 1
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+        second = AddressCache(path)
+        assert await send(second)
+        assert second.lookups == 0
+
+        # The host moved: the stale address is dropped and looked up again.
+        path.write_text(json.dumps({f"localhost:{server.port}": {"addresses": ["127.0.0.2"], "expires": 2e9}}))
+        third = AddressCache(path)
+        assert await send(third)
+        assert third.lookups == 1
+        assert json.loads(path.read_text())[f"localhost:{server.port}"]["addresses"] != ["127.0.0.2"]
+
+
+@pytest.mark.asyncio
+async def test_striping_scales_past_one_connections_stream_limit() -> None:
+    config = MockApnsConfig(latency_seconds=0.05, max_concurrent_streams=4)
+    tokens = [f"{i:064x}" for i in range(48)]
+    elapsed = {}
+    async with MockApnsServer(config) as server:
+        url = f"https://localhost:{server.port}"
+        for stripes in (1, 4):
+            client = ApnsClient(benchmark_credentials(), server_url=url, verify=server.client_ssl_context(), stripes=stripes)
+            async with client:
+                # Connect every stripe outside the timing.
+                assert all([r.success async for _, r in client.send_many(tokens[:stripes], payload={"aps": {}})])
+                started = asyncio.get_running_loop().time()
+                results = [r async for _, r in client.send_many(tokens, payload={"aps": {}}, max_in_flight=48)]
+                elapsed[stripes] = asyncio.get_running_loop().time() - started
+            assert all(r.success for r in results)
+
+    # 48 pushes, 4 streams per connection, 50 ms each: ~0.6 s on one connection, ~0.15 s on four.
+    assert server.connections == 1 + 4
+    assert elapsed[4] < elapsed[1] / 2
+
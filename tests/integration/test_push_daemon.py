@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+import socket
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import httpx
+import pytest
+
+from apn_pushtool.client import ApnsClient, PushMessage
+from apn_pushtool.config import ApnsCredentials
+from apn_pushtool.daemon import DaemonClient, DaemonError, PushDaemon
+from apn_pushtool.results import Reason
+
+
+def _creds() -> ApnsCredentials:
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode("utf-8")
+    return ApnsCredentials(
+        team_id="TEAM",
+        key_id="KEY123",
+        bundle_id="com.example.app",
+        p8_private_key_pem=pem,
+        environment="sandbox",
+    )
+
+
+def _handler(seen: list[str]):
+    def handler(request: httpx.Request) -> httpx.Response:
+        token = request.url.path.rpartition("/")[2]
+        seen.append(token)
+        if token.startswith("0"):
+            return httpx.Response(status_code=410, json={"reason": "Unregistered", "timestamp": 1})
+        return httpx.Response(status_code=200, headers={"apns-id": "ID-" + token[:4]})
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_daemon_sends_and_enqueues(tmp_path: Path) -> None:
+    seen: list[str] = []
+    state = tmp_path / "daemon.json"
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(_handler(seen)))
+    async with client, PushDaemon(client, state_path=state, dotenv="/x/.env") as daemon:
+        assert state.stat().st_mode & 0o777 == 0o600
+        assert json.loads(state.read_text())["port"] == daemon.port
+
+        def talk() -> tuple[list, int]:
+            remote = DaemonClient.connect(state, dotenv="/x/.env", match_dotenv=True)
+            assert remote is not None
+            with remote:
+                results = remote.send(
+                    [
+                        PushMessage(device_token="a" * 64, payload={"aps": {"alert": "hi"}}),
+                        PushMessage(device_token="0" * 64, payload=b'{"aps":{"alert":"raw"}}'),
+                    ]
+                )
+                queued = remote.enqueue(
+                    PushMessage(device_token=f"{i:x}".rjust(64, "b"), payload={"aps": {}}) for i in range(5)
+                )
+            return results, queued
+
+        results, queued = await asyncio.to_thread(talk)
+        assert DaemonClient.connect(state, dotenv="/other/.env", match_dotenv=True) is None
+
+    assert [r.success for r in results] == [True, False]
+    assert results[0].apns_id == "ID-aaaa"
+    assert results[1].reason is Reason.UNREGISTERED
+    assert results[1].error == {"reason": "Unregistered", "timestamp": 1}
+    assert queued == 5
+    # Closing drains the queue before the workers stop.
+    assert len(seen) == 7
+    assert daemon.stats.sent == 6 and daemon.stats.failed == 1
+    assert not state.exists()
+
+
+@pytest.mark.asyncio
+async def test_daemon_send_long_and_shutdown(tmp_path: Path) -> None:
+    seen: list[str] = []
+    state = tmp_path / "daemon.json"
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(_handler(seen)))
+    async with client, PushDaemon(client, state_path=state) as daemon:
+
+        def talk() -> list:
+            with DaemonClient.connect(state) as remote:  # type: ignore[union-attr]
+                results = remote.send_long(
+                    device_token="c" * 64, title="T", long_text="x" * 50, max_chars=20, delay_seconds=0
+                )
+                remote.shutdown()
+            return results
+
+        drains = 0
+        close_scheduler = daemon._scheduler.close
+
+        async def counting_close() -> list:
+            nonlocal drains
+            drains += 1
+            return await close_scheduler()
+
+        daemon._scheduler.close = counting_close  # type: ignore[method-assign]
+        results = await asyncio.to_thread(talk)
+        await asyncio.wait_for(daemon.serve_forever(), timeout=5)
+
+    assert len(results) == 3
+    assert all(r.success for r in results)
+    assert DaemonClient.connect(state) is None
+    assert drains == 1  # __aexit__ waited for the close the shutdown request started
+
+
+@pytest.mark.asyncio
+async def test_daemon_client_timeouts_only_apply_to_calls_that_do_not_wait(tmp_path: Path) -> None:
+    async def slow_handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.5)
+        return httpx.Response(status_code=200)
+
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(slow_handler))
+    async with client, PushDaemon(client, state_path=tmp_path / "daemon.json") as daemon:
+
+        def talk() -> list:
+            with DaemonClient(daemon.host, daemon.port, daemon._secret, timeout_seconds=0.1) as remote:
+                return remote.send([PushMessage(device_token="a" * 64, payload={"aps": {}})])
+
+        results = await asyncio.to_thread(talk)
+
+    assert results[0].success
+
+    with socket.create_server(("127.0.0.1", 0)) as silent:  # accepts, never answers
+
+        def ping() -> None:
+            with DaemonClient("127.0.0.1", silent.getsockname()[1], "secret", timeout_seconds=0.1) as remote:
+                remote.ping()
+
+        with pytest.raises(DaemonError, match="timed out"):
+            await asyncio.to_thread(ping)
+
+
+@pytest.mark.asyncio
+async def test_daemon_counts_failed_and_cancelled_results_without_raising(tmp_path: Path) -> None:
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(_handler([])))
+    daemon = PushDaemon(client, state_path=tmp_path / "daemon.json", lanes=True)
+    loop = asyncio.get_running_loop()
+    cancelled, failed = loop.create_future(), loop.create_future()
+    cancelled.cancel()
+    failed.set_exception(RuntimeError("boom"))
+
+    daemon._count_future(cancelled)
+    daemon._count_future(failed)
+
+    assert daemon.stats.failed == 1 and daemon.stats.sent == 0
+
+
+@pytest.mark.asyncio
+async def test_daemon_rejects_wrong_secret(tmp_path: Path) -> None:
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(_handler([])))
+    async with client, PushDaemon(client, state_path=tmp_path / "daemon.json") as daemon:
+
+        def talk() -> None:
+            with DaemonClient(daemon.host, daemon.port, "wrong") as remote:
+                remote.ping()
+
+        with pytest.raises(DaemonError, match="Unauthorized"):
+            await asyncio.to_thread(talk)
+
+
+def test_connect_ignores_stale_state(tmp_path: Path) -> None:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    state = tmp_path / "daemon.json"
+    state.write_text(json.dumps({"host": "127.0.0.1", "port": port, "secret": "s"}))
+
+    assert DaemonClient.connect(state) is None
+    assert DaemonClient.connect(tmp_path / "missing.json") is None
+
+
+@pytest.mark.asyncio
+async def test_daemon_coalesces_superseded_notifications(tmp_path: Path) -> None:
+    seen: list[str] = []
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(_handler(seen)))
+    daemon = PushDaemon(client, state_path=tmp_path / "daemon.json", coalesce_seconds=0.05)
+    async with client, daemon:
+
+        def talk() -> tuple[int, list]:
+            with DaemonClient.connect(tmp_path / "daemon.json") as remote:  # type: ignore[union-attr]
+                queued = remote.enqueue(
+                    PushMessage(device_token="a" * 64, payload={"aps": {}, "score": i}, collapse_id="score")
+                    for i in range(10)
+                )
+                results = remote.send([PushMessage(device_token="b" * 64, payload={"aps": {}})])
+            return queued, results
+
+        queued, results = await asyncio.to_thread(talk)
+
+    assert queued == 10 and results[0].success
+    assert seen == ["a" * 64, "b" * 64]
+    assert daemon.stats.coalesced == 9 and daemon.stats.sent == 2
+
+
+@pytest.mark.asyncio
+async def test_daemon_lanes_let_alerts_overtake_queued_bulk(tmp_path: Path) -> None:
+    seen: list[str] = []
+    handler = _handler(seen)
+
+    async def slow_handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.005)  # so the bulk backlog is still queued when the alert arrives
+        return handler(request)
+
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(slow_handler))
+    daemon = PushDaemon(client, state_path=tmp_path / "daemon.json", max_in_flight=1, lanes=True)
+    async with client, daemon:
+
+        def talk() -> list:
+            with DaemonClient.connect(tmp_path / "daemon.json") as remote:  # type: ignore[union-attr]
+                remote.enqueue(
+                    PushMessage(device_token=f"a{i:063x}", payload={"aps": {}}, priority=5) for i in range(49)
+                )
+                return remote.send([PushMessage(device_token="f" * 64, payload={"aps": {}})])
+
+        results = await asyncio.to_thread(talk)
+
+    assert results[0].success
+    assert seen.index("f" * 64) < 25  # first in, first out it would be last
+    assert daemon.stats.sent == 50
+
+
+@pytest.mark.asyncio
+async def test_daemon_sends_scheduled_notifications_when_due(tmp_path: Path) -> None:
+    seen: list[str] = []
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(_handler(seen)))
+    async with client, PushDaemon(client, state_path=tmp_path / "daemon.json") as daemon:
+
+        def schedule() -> tuple[int, dict]:
+            with DaemonClient.connect(tmp_path / "daemon.json") as remote:  # type: ignore[union-attr]
+                count = remote.schedule(
+                    [PushMessage(device_token=c * 64, payload={"aps": {}}) for c in "abc"], time.time() + 0.1
+                )
+                return count, remote.stats()
+
+        count, stats = await asyncio.to_thread(schedule)
+        assert count == 3 and stats["scheduled"] == 3 and not seen
+        await asyncio.sleep(0.3)
+
+    assert sorted(seen) == ["a" * 64, "b" * 64, "c" * 64]
+    assert daemon.stats.scheduled == 3 and daemon.stats.sent == 3
+
+
+@pytest.mark.asyncio
+async def test_cli_hand_off_notes_the_client_side_options_it_drops(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    from apn_pushtool.cli import _daemon_client, _parse_args
+
+    monkeypatch.setenv("APNS_DAEMON_STATE", str(tmp_path / "daemon.json"))
+    client = ApnsClient(_creds(), transport=httpx.MockTransport(_handler([])))
+    async with client, PushDaemon(client, state_path=tmp_path / "daemon.json"):
+        args = _parse_args(
+            ["--dotenv", "", "send", "--title", "T", "--body", "B", "--token-registry", str(tmp_path / "x.db")]
+        )
+        remote = await asyncio.to_thread(_daemon_client, args, None)
+        assert remote is not None
+        remote.close()
+
+    assert "--token-registry" in capsys.readouterr().err
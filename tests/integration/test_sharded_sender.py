@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from apn_pushtool.auth import ProviderTokenCache
+from apn_pushtool.bench import benchmark_credentials
+from apn_pushtool.client import ApnsClient
+from apn_pushtool.message import PushMessage
+from apn_pushtool.mockserver import MockApnsConfig, MockApnsServer
+from apn_pushtool.registry import TokenRegistry
+from apn_pushtool.results import Reason
+from apn_pushtool.shard import ShardedSender, shard_of
+
+
+@pytest.mark.asyncio
+async def test_sharded_sender_merges_results_from_all_workers(tmp_path: Path) -> None:
+    tokens = [f"{i:064x}" for i in range(300)]
+    config = MockApnsConfig(error_mix={"Unregistered": 0.1}, seed=5)
+    token_cache = ProviderTokenCache()
+    with TokenRegistry(tmp_path / "dead.sqlite3") as registry:
+        scope = {"environment": "sandbox", "topic": "com.example.bench"}
+        registry.mark(tokens[0], "Unregistered", **scope)
+        async with MockApnsServer(config) as server:
+            sender = ShardedSender(
+                benchmark_credentials(),
+                workers=2,
+                max_in_flight=50,
+                batch_size=16,
+                registry=registry,
+                token_cache=token_cache,
+                server_url=server.url,
+                ca_pem=server.cert_pem.decode("ascii"),
+            )
+            async with sender:
+                messages = ((i, PushMessage(device_token=t, payload={"aps": {}})) for i, t in enumerate(tokens))
+                results = dict([item async for item in sender.send(messages)])
+                # A second run reuses the warm workers and their connections.
+                again = [item async for item in sender.send([(0, PushMessage(device_token=tokens[1], payload={}))])]
+
+        assert sorted(results) == list(range(300))
+        assert results[0].reason is Reason.KNOWN_INVALID_TOKEN
+        unregistered = [i for i, r in results.items() if r.reason is Reason.UNREGISTERED]
+        assert unregistered and all(registry.is_blocked(tokens[i], **scope) for i in unregistered)
+        assert all(results[i].device_token == tokens[i] for i in results)
+        assert len(again) == 1
+        # One connection per worker, and the token signed once by the parent.
+        assert server.connections == 2
+        assert token_cache.refresh_count == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_a_rejected_provider_token_with_a_new_one() -> None:
+    creds = benchmark_credentials()
+    token_cache = ProviderTokenCache()
+    stale = ApnsClient(creds, token_cache=token_cache).provider_token()
+    config = MockApnsConfig(rejected_provider_tokens={stale})
+    async with MockApnsServer(config) as server:
+        sender = ShardedSender(
+            creds,
+            workers=1,
+            token_cache=token_cache,
+            server_url=server.url,
+            ca_pem=server.cert_pem.decode("ascii"),
+        )
+        async with sender:
+            messages = [(i, PushMessage(device_token=f"{i:064x}", payload={"aps": {}})) for i in range(20)]
+            results = dict([item async for item in sender.send(messages)])
+
+    assert sorted(results) == list(range(20))
+    assert all(r.success for r in results.values()), [r.error for r in results.values() if not r.success]
+    # The worker reported the rejected token and the parent re-signed once.
+    assert token_cache.refresh_count == 2
+
+
+def test_shard_of_is_stable_and_spreads_tokens() -> None:
+    tokens = [f"{i:064x}" for i in range(1000)]
+    shards = [shard_of(t, 4) for t in tokens]
+
+    assert shards == [shard_of(t, 4) for t in tokens]
+    assert all(150 < shards.count(s) < 350 for s in range(4))
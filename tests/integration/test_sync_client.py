@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import httpx
+import pytest
+
+from apn_pushtool.bench import benchmark_credentials
+from apn_pushtool.message import PushMessage
+from apn_pushtool.mockserver import MockApnsServer
+from apn_pushtool.sync import SyncApnsClient
+
+
+def test_threads_share_one_loop_and_connection() -> None:
+    loop_threads: set[str] = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        loop_threads.add(threading.current_thread().name)
+        return httpx.Response(status_code=200, headers={"apns-id": request.url.path[-4:]})
+
+    with SyncApnsClient(benchmark_credentials(), transport=httpx.MockTransport(handler)) as client:
+
+        def work(i: int) -> bool:
+            return client.send_push(device_token=f"{i:064x}", payload={"aps": {}}).result(timeout=10).success
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert all(pool.map(work, range(64)))
+        many = client.send_many(["a" * 64, "b" * 64], payload={"aps": {}}).result(timeout=10)
+        message = client.send_message(PushMessage(device_token="c" * 64, payload={"aps": {}})).result(timeout=10)
+
+    assert loop_threads == {"apns-client"}
+    assert set(many) == {"a" * 64, "b" * 64} and message.apns_id == "cccc"
+    with pytest.raises(RuntimeError):
+        client.send_push(device_token="a" * 64, payload={"aps": {}})
+
+
+def test_blocking_callers_multiplex_on_http2() -> None:
+    # A real HTTP/2 server on an event loop of its own, driven from plain threads.
+    loop = asyncio.new_event_loop()
+    server_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    server_thread.start()
+    server = MockApnsServer()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result(timeout=10)
+    try:
+        with SyncApnsClient(benchmark_credentials(), server_url=server.url, verify=server.client_ssl_context()) as client:
+            futures = [client.send_push(device_token=f"{i:064x}", payload={"aps": {}}) for i in range(50)]
+            long = client.send_long_message(
+                device_token="d" * 64, title="T", long_text="x" * 60, max_chars=20, pipeline=True
+            )
+            assert all(f.result(timeout=10).success for f in futures)
+            assert len(long.result(timeout=10)) == 3
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
+        server_thread.join(timeout=5)
+
+    assert server.connections == 1
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pytest
+
+from apn_pushtool.auth import ProviderTokenCache
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _signer() -> tuple[list[str], object]:
+    issued: list[str] = []
+
+    def sign() -> str:
+        issued.append(f"token-{len(issued)}")
+        return issued[-1]
+
+    return issued, sign
+
+
+def test_token_is_reused_until_refresh_window() -> None:
+    clock = _Clock()
+    cache = ProviderTokenCache(lifetime_seconds=2400, refresh_margin_seconds=300, clock=clock)
+    issued, sign = _signer()
+
+    assert cache.get("TEAM", "KEY", sign) == "token-0"
+    clock.now += 2000
+    assert cache.get("TEAM", "KEY", sign) == "token-0"
+    clock.now += 200
+    assert cache.get("TEAM", "KEY", sign) == "token-1"
+    assert cache.refresh_count == 2
+    assert len(issued) == 2
+
+
+def test_tokens_are_keyed_by_team_and_key() -> None:
+    cache = ProviderTokenCache(clock=_Clock())
+    _, sign = _signer()
+
+    assert cache.get("TEAM", "KEY1", sign) == "token-0"
+    assert cache.get("TEAM", "KEY2", sign) == "token-1"
+    assert cache.get("TEAM", "KEY1", sign) == "token-0"
+
+
+def test_invalidate_only_drops_matching_token() -> None:
+    cache = ProviderTokenCache(clock=_Clock())
+    _, sign = _signer()
+
+    stale = cache.get("TEAM", "KEY", sign)
+    cache.invalidate("TEAM", "KEY", stale)
+    fresh = cache.get("TEAM", "KEY", sign)
+    assert fresh != stale
+
+    # A second request that failed with the old token must not discard the new one.
+    cache.invalidate("TEAM", "KEY", stale)
+    assert cache.get("TEAM", "KEY", sign) == fresh
+
+
+def test_lifetime_must_respect_apns_limits() -> None:
+    with pytest.raises(ValueError):
+        ProviderTokenCache(lifetime_seconds=60)
+    with pytest.raises(ValueError):
+        ProviderTokenCache(lifetime_seconds=2 * 3600)
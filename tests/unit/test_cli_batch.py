@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import functools
+import io
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from apn_pushtool import client as client_module
+from apn_pushtool.bench import benchmark_credentials
+from apn_pushtool.cli import _batch_message, _iter_batch_rows, _parse_args, _send_batch
+from apn_pushtool.config import ConfigError
+from apn_pushtool.tokens import TokenSet
+
+
+def test_iter_batch_rows_jsonl_reports_bad_lines() -> None:
+    stream = io.StringIO('{"token": "aa"}\n\nnot json\n[1]\n{"token": "bb"}\n')
+    rows = list(_iter_batch_rows(stream, "jsonl"))
+
+    assert rows[0] == (1, {"token": "aa"})
+    assert rows[1][0] == 3 and isinstance(rows[1][1], str)
+    assert rows[2][0] == 4 and isinstance(rows[2][1], str)
+    assert rows[3] == (5, {"token": "bb"})
+
+
+def test_iter_batch_rows_csv_drops_empty_cells() -> None:
+    stream = io.StringIO("token,title,body\naa,T,\nbb,,B\n")
+    rows = list(_iter_batch_rows(stream, "csv"))
+
+    assert rows == [(2, {"token": "aa", "title": "T"}), (3, {"token": "bb", "body": "B"})]
+
+
+def test_batch_message_uses_defaults_and_custom_data() -> None:
+    args = _parse_args(["send-batch", "--title", "Default", "--body", "Hello"])
+    row = {"token": "A" * 64, "badge": "2", "custom_data": '{"campaign": "x"}'}
+
+    message = _batch_message(row, args, topic="com.example.app")
+
+    assert message.device_token == "A" * 64
+    assert message.topic == "com.example.app"
+    assert message.payload["aps"]["alert"] == {"title": "Default", "body": "Hello"}
+    assert message.payload["aps"]["badge"] == 2
+    assert message.payload["campaign"] == "x"
+
+
+def test_batch_message_rejects_invalid_token() -> None:
+    args = _parse_args(["send-batch", "--title", "T", "--body", "B"])
+    with pytest.raises(ConfigError):
+        _batch_message({"token": "nope"}, args, topic="com.example.app")
+
+
+@pytest.mark.asyncio
+async def test_audience_results_carry_the_full_device_token(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    tokens = [f"{i:064x}" for i in range(1, 4)]
+    TokenSet(tokens).save(tmp_path / "audience.bin")  # a token set, whatever the file is called
+    creds = benchmark_credentials()
+    for name, value in (
+        ("APNS_TEAM_ID", creds.team_id),
+        ("APNS_KEY_ID", creds.key_id),
+        ("APNS_BUNDLE_ID", creds.bundle_id),
+        ("APNS_P8_PRIVATE_KEY", creds.p8_private_key_pem),
+    ):
+        monkeypatch.setenv(name, value)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith(tokens[1]):
+            return httpx.Response(410, json={"reason": "Unregistered", "timestamp": 0})
+        return httpx.Response(200)
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(client_module, "ApnsClient", functools.partial(client_module.ApnsClient, transport=transport))
+    args = _parse_args(
+        ["--dotenv", "", "send-batch", "--audience", str(tmp_path / "audience.bin"), "--title", "T", "--body", "B"]
+    )
+    out = io.StringIO()
+
+    assert await _send_batch(args, out) is False
+
+    records = {r["device_token"]: r for r in map(json.loads, out.getvalue().splitlines())}
+    assert sorted(records) == tokens
+    assert [t for t, r in records.items() if not r["success"]] == [tokens[1]]
+
+
+@pytest.mark.asyncio
+async def test_audience_requires_title_and_body(tmp_path: Path) -> None:
+    args = _parse_args(["--dotenv", "", "send-batch", "--audience", str(tmp_path / "missing.bin"), "--title", "T"])
+
+    with pytest.raises(ConfigError, match="Missing title/body"):
+        await _send_batch(args, io.StringIO())
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import ec
+import pytest
 
+from apn_pushtool.auth import load_signing_key
 from apn_pushtool.client import ApnsClient
 from apn_pushtool.config import ApnsCredentials
 
@@ -32,3 +34,18 @@ def test_create_basic_payload_includes_custom_data() -> None:
     assert payload["aps"]["alert"]["body"] == "B"
     assert payload["aps"]["badge"] == 3
     assert payload["custom_data"]["a"] == 1
+
+
+def test_private_key_is_parsed_on_first_signing_and_shared() -> None:
+    bad = ApnsCredentials(
+        team_id="TEAM", key_id="KEY", bundle_id="com.example.app", p8_private_key_pem="not a key", environment="sandbox"
+    )
+    client = ApnsClient(bad)  # constructing a client no longer touches the key
+    with pytest.raises(ValueError):
+        client.generate_jwt_token()
+
+    creds = _dummy_creds()
+    first, second = ApnsClient(creds), ApnsClient(creds)
+    assert first.generate_jwt_token()
+    assert second.generate_jwt_token()
+    assert load_signing_key.cache_info().hits >= 1
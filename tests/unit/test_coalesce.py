@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from apn_pushtool.coalesce import CoalescingQueue
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult, Reason
+
+
+def _message(token: str, score: int, collapse_id: str | None = "score") -> PushMessage:
+    return PushMessage(device_token=token, payload={"aps": {}, "score": score}, collapse_id=collapse_id)
+
+
+@pytest.mark.asyncio
+async def test_newer_message_replaces_pending_one() -> None:
+    sent: list[PushMessage] = []
+
+    async def send(message: PushMessage) -> PushResult:
+        sent.append(message)
+        return PushResult(message.device_token, status_code=200)
+
+    async with CoalescingQueue(send, window_seconds=0.05) as queue:
+        futures = [await queue.put(_message("a" * 64, score)) for score in range(5)]
+        other = await queue.put(_message("b" * 64, 0))
+        plain = [await queue.put(_message("a" * 64, score, collapse_id=None)) for score in range(2)]
+        results = await asyncio.gather(*futures, other, *plain)
+
+    assert [r.reason for r in results[:4]] == [Reason.COALESCED] * 4
+    assert all(r.success for r in results[4:])
+    # The surviving message kept the first one's slot in the queue.
+    assert [(m.device_token[0], m.payload["score"], m.collapse_id) for m in sent] == [
+        ("a", 4, "score"),
+        ("b", 0, "score"),
+        ("a", 0, None),
+        ("a", 1, None),
+    ]
+    assert (queue.stats.enqueued, queue.stats.sent, queue.stats.coalesced) == (8, 4, 4)
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_without_waiting_out_the_window() -> None:
+    async def send(message: PushMessage) -> PushResult:
+        return PushResult(message.device_token, status_code=200)
+
+    queue = CoalescingQueue(send, window_seconds=60)
+    future = await queue.put(_message("a" * 64, 1))
+    await asyncio.wait_for(queue.close(), timeout=1)
+
+    assert future.result().success
+    with pytest.raises(RuntimeError):
+        await queue.put(_message("a" * 64, 2))
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+SRC = Path(__file__).resolve().parents[2] / "src"
+
+# Modules the CLI must not load until a command actually needs them.
+HEAVY = ("asyncio", "httpx", "httpcore", "h2", "jwt", "cryptography", "sqlite3", "dotenv")
+
+# Cumulative `python -X importtime` budget for `import apn_pushtool.cli`. It is
+# ~30 ms on a laptop; importing the client eagerly put it well over 100 ms.
+IMPORT_BUDGET_US = 100_000
+
+
+def _importtime(code: str) -> dict[str, int]:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(SRC), os.environ.get("PYTHONPATH", "")])}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    cumulative: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        if total.strip().isdigit():
+            cumulative[name.strip()] = int(total)
+    return cumulative
+
+
+def test_cli_import_stays_light() -> None:
+    # Best of three, so one slow run on a busy machine does not fail the build.
+    runs = [_importtime("import apn_pushtool.cli") for _ in range(3)]
+
+    loaded = set(runs[0])
+    assert not {m for m in loaded if m.split(".")[0] in HEAVY}
+    assert min(run["apn_pushtool.cli"] for run in runs) < IMPORT_BUDGET_US
+
+
+def test_daemon_handoff_does_not_load_the_http_stack() -> None:
+    loaded = _importtime(
+        "from apn_pushtool.daemon_client import DaemonClient\n"
+        "from apn_pushtool.message import PushMessage\n"
+        "from apn_pushtool.payload import basic_payload\n"
+    )
+
+    assert not {m for m in loaded if m.split(".")[0] in HEAVY}
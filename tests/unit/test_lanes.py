@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from apn_pushtool.lanes import LaneScheduler
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult
+
+
+def _message(n: int, *, priority: int = 10, push_type: str = "alert", topic: str = "com.example.app") -> PushMessage:
+    return PushMessage(device_token=f"{n:064x}", payload={"aps": {}}, priority=priority, push_type=push_type, topic=topic)
+
+
+def _recorder(sent: list[PushMessage]):
+    async def send(message: PushMessage) -> PushResult:
+        sent.append(message)
+        await asyncio.sleep(0)
+        return PushResult(message.device_token, status_code=200)
+
+    return send
+
+
+@pytest.mark.asyncio
+async def test_lanes_share_slots_by_weight() -> None:
+    sent: list[PushMessage] = []
+    async with LaneScheduler(_recorder(sent), max_in_flight=1) as lanes:
+        bulk = [await lanes.submit(_message(i, priority=5)) for i in range(20)]
+        alerts = [await lanes.submit(_message(100 + i)) for i in range(20)]
+        assert lanes.pending() == {(5, "alert", "com.example.app"): 20, (10, "alert", "com.example.app"): 20}
+        results = await asyncio.gather(*bulk, *alerts)
+
+    assert all(r.success for r in results)
+    # Priority 10 has weight 4, priority 5 weight 1: four alerts per bulk message while both wait.
+    assert [m.priority for m in sent[:10]] == [5, 10, 10, 10, 10, 5, 10, 10, 10, 10]
+    assert [m.priority for m in sent[-10:]] == [5] * 10
+    assert lanes.sent == {(5, "alert", "com.example.app"): 20, (10, "alert", "com.example.app"): 20}
+
+
+@pytest.mark.asyncio
+async def test_urgent_push_overtakes_bulk_backlog_and_topics_share_fairly() -> None:
+    sent: list[PushMessage] = []
+    async with LaneScheduler(_recorder(sent), max_in_flight=2) as lanes:
+        backlog = [await lanes.submit(_message(i, priority=5, topic=f"com.example.app{i % 2}")) for i in range(200)]
+        await asyncio.sleep(0)  # the broadcast is already being sent
+        call = await lanes.send(_message(999, push_type="voip", topic="com.example.app.voip"))
+        await asyncio.gather(*backlog)
+
+    assert call.success
+    assert sent.index(next(m for m in sent if m.push_type == "voip")) <= 4
+    # Two bulk topics with the same weight alternate.
+    bulk = [m.topic for m in sent if m.push_type == "alert"]
+    assert bulk[:6] == ["com.example.app0", "com.example.app1"] * 3
+
+
+@pytest.mark.asyncio
+async def test_submit_waits_only_for_room_in_its_own_lane() -> None:
+    release = asyncio.Event()
+
+    async def send(message: PushMessage) -> PushResult:
+        await release.wait()
+        return PushResult(message.device_token, status_code=200)
+
+    lanes = LaneScheduler(send, max_in_flight=1, max_pending=2)
+    bulk = [await lanes.submit(_message(0, priority=5))]
+    await asyncio.sleep(0)  # taken by the only slot, which stays busy
+    bulk += [await lanes.submit(_message(i, priority=5)) for i in (1, 2)]
+    blocked = asyncio.create_task(lanes.submit(_message(3, priority=5)))
+    urgent = await asyncio.wait_for(lanes.submit(_message(4)), 1)
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    release.set()
+    await asyncio.gather(*bulk, urgent, await blocked)
+    await lanes.close()
+    assert len(lanes) == 0
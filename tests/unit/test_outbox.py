@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from pathlib import Path
+import threading
+
+import pytest
+
+from apn_pushtool.client import PushMessage
+from apn_pushtool.outbox import Outbox, run_campaign
+from apn_pushtool.results import PushResult, Reason
+
+
+def _message(i: int) -> PushMessage:
+    return PushMessage(device_token=f"{i:064x}", payload={"aps": {"alert": f"m{i}"}})
+
+
+def _ok(message: PushMessage) -> PushResult:
+    return PushResult(message.device_token, status_code=200, apns_id=message.apns_id)
+
+
+def test_replay_keeps_unacked_messages_pending(tmp_path: Path) -> None:
+    with Outbox(tmp_path) as outbox:
+        first = outbox.add(1, _message(1))
+        second = outbox.add(2, _message(2))
+        assert first is not None and second is not None and first.apns_id
+        assert outbox.add(1, _message(1)) is None
+        outbox.ack(1, _ok(first))
+        # A transport failure is not an answer; the message stays pending.
+        assert not outbox.ack(2, PushResult(second.device_token, reason=Reason.CONNECTION_ERROR))
+
+    # Simulate a crash in the middle of writing a record.
+    with open(sorted(tmp_path.glob("*.log"))[-1], "ab") as f:
+        f.write(b'{"op":"add","key":3,"mess')
+
+    with Outbox(tmp_path) as outbox:
+        assert outbox.added == 2 and outbox.done == 1
+        assert [(k, m.apns_id) for k, m in outbox.pending()] == [(2, second.apns_id)]
+
+
+def test_compaction_drops_finished_payloads(tmp_path: Path) -> None:
+    outbox = Outbox(tmp_path, segment_bytes=1)  # rotate on every commit
+    messages = {i: outbox.add(i, _message(i)) for i in range(10)}
+    outbox.commit()
+    for i in range(8):
+        outbox.ack(i, _ok(messages[i]))  # type: ignore[arg-type]
+        outbox.commit()
+    assert outbox.sealed_segments == 9
+
+    outbox.compact()
+    outbox.close()
+
+    assert len(list(tmp_path.glob("*.log"))) == 1
+    reopened = Outbox(tmp_path)
+    assert reopened.done == 8
+    assert [k for k, _ in reopened.pending()] == [8, 9]
+    assert reopened.add(3, _message(3)) is None
+    reopened.close()
+
+
+def test_abandoned_pending_iteration_does_not_block_compaction(tmp_path: Path) -> None:
+    with Outbox(tmp_path, segment_bytes=1) as outbox:
+        for i in range(3):
+            outbox.add(i, _message(i))
+            outbox.commit()
+        pending = outbox.pending()
+        assert next(pending)[0] == 0  # the consumer stops here, the generator stays alive
+
+        compactor = threading.Thread(target=outbox.compact)
+        compactor.start()
+        compactor.join(timeout=5)
+
+        assert not compactor.is_alive()
+        assert [k for k, _ in pending] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_run_campaign_resumes_where_it_stopped(tmp_path: Path) -> None:
+    sent: list[str] = []
+
+    async def send(message: PushMessage) -> PushResult:
+        assert message.apns_id  # journaled before it hits the wire
+        sent.append(message.device_token)
+        return _ok(message)
+
+    campaign = [(i, _message(i)) for i in range(20)]
+    with Outbox(tmp_path) as outbox:
+        results = run_campaign(send, outbox, campaign, max_in_flight=1, commit_every=5)
+        async for key, _ in results:
+            if key == 6:
+                break  # the process "dies" here
+        await results.aclose()
+
+    sent.clear()
+    with Outbox(tmp_path) as outbox:
+        keys = [key async for key, _ in run_campaign(send, outbox, campaign, commit_every=5)]
+        assert outbox.done == 20 and outbox.pending_count == 0
+
+    # Messages 7-9 were journaled (same commit batch) but unanswered; 10+ were new.
+    assert sorted(keys) == list(range(7, 20))
+    assert len(sent) == 13
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+import random
+
+import pytest
+
+from apn_pushtool.payload import (
+    PayloadTemplate,
+    PayloadTooLargeError,
+    Slot,
+    check_payload_size,
+    encode_payload,
+    max_payload_size,
+    split_text,
+)
+
+
+def test_encode_payload_is_compact_utf8() -> None:
+    content = encode_payload({"aps": {"alert": {"title": "你好", "body": "a b"}}})
+    assert content == '{"aps":{"alert":{"title":"你好","body":"a b"}}}'.encode("utf-8")
+
+
+def test_check_payload_size_uses_voip_limit() -> None:
+    assert max_payload_size("alert") == 4096
+    assert max_payload_size("voip") == 5120
+
+    content = b"x" * 4500
+    check_payload_size(content, push_type="voip")
+    with pytest.raises(PayloadTooLargeError) as e:
+        check_payload_size(content, push_type="alert")
+    assert e.value.size == 4500
+    assert e.value.limit == 4096
+
+
+def test_payload_template_matches_full_encode() -> None:
+    template = PayloadTemplate(
+        {
+            "aps": {"alert": {"title": "Hi", "body": Slot("body")}, "badge": Slot("badge")},
+            "user": {"name": Slot("body"), "tags": [Slot("badge"), "x"]},
+        }
+    )
+    assert template.fields == {"body", "badge"}
+
+    content = template.render(body='Ann "quoted" 你好', badge=3)
+    expected = {
+        "aps": {"alert": {"title": "Hi", "body": 'Ann "quoted" 你好'}, "badge": 3},
+        "user": {"name": 'Ann "quoted" 你好', "tags": [3, "x"]},
+    }
+    assert json.loads(content) == expected
+    assert content == encode_payload(expected)
+
+
+def test_payload_template_requires_all_fields_and_checks_size() -> None:
+    template = PayloadTemplate({"aps": {"alert": {"body": Slot("body")}}})
+    with pytest.raises(KeyError):
+        template.render()
+    with pytest.raises(PayloadTooLargeError):
+        template.render(body="x" * 5000)
+
+
+def test_split_text_respects_byte_budget_and_word_boundaries() -> None:
+    text = "hello world this is a long message " * 20
+    chunks = split_text(text, 40)
+
+    assert "".join(chunks) == text
+    assert all(len(c.encode("utf-8")) <= 40 for c in chunks)
+    assert all(c.endswith(" ") for c in chunks[:-1])
+
+
+def test_split_text_counts_json_escapes_and_keeps_graphemes() -> None:
+    family = "\U0001F468\u200d\U0001F469\u200d\U0001F467"  # 18 UTF-8 bytes, one grapheme
+    text = 'say "hi"\n' + "e\u0301" * 10 + family * 3
+    chunks = split_text(text, 20)
+
+    assert "".join(chunks) == text
+    assert all(len(encode_payload(c)) - 2 <= 20 for c in chunks)
+    for c in chunks:
+        assert not c.startswith(("\u0301", "\u200d"))
+    assert family in chunks
+
+
+def test_split_text_honours_max_chars() -> None:
+    chunks = split_text("你好世界" * 5, 4096, max_chars=6)
+    assert [len(c) for c in chunks] == [6, 6, 6, 2]
+
+
+def test_split_text_never_exceeds_budget_after_word_break() -> None:
+    assert split_text("a bbbbbbbb中", 10) == ["a ", "bbbbbbbb", "中"]
+
+    rng = random.Random(6)
+    alphabet = ["a", "b", " ", "中", "文", "é", '"', "\n", "\x01", "\U0001F600"]
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 60)))
+        budget = rng.randint(6, 30)
+        max_chars = rng.choice([None, rng.randint(1, 12)])
+        chunks = split_text(text, budget, max_chars=max_chars)
+        assert "".join(chunks) == text
+        for c in chunks:
+            assert len(encode_payload(c)) - 2 <= budget
+            assert max_chars is None or len(c) <= max_chars
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sqlite3
+
+from apn_pushtool.registry import TokenRegistry
+from apn_pushtool.results import PushResult, Reason
+
+PROD = {"environment": "production", "topic": "com.example.app"}
+
+
+def _failure(status: int, reason: str, **extra: object) -> PushResult:
+    return PushResult("00" * 32, status_code=status, reason=Reason.parse(reason), error={"reason": reason, **extra})
+
+
+def test_registry_records_dead_tokens_and_persists(tmp_path: Path) -> None:
+    path = tmp_path / "tokens.sqlite3"
+    dead = "ab" * 32
+    bad = "CD" * 32
+
+    with TokenRegistry(path, flush_every=10) as registry:
+        assert registry.record(dead, _failure(410, "Unregistered", timestamp=1700000000000), **PROD)
+        assert registry.record(bad, _failure(400, "BadDeviceToken"), **PROD)
+        assert not registry.record("ef" * 32, _failure(429, "TooManyRequests"), **PROD)
+        assert not registry.record("ef" * 32, PushResult("ef" * 32, status_code=200), **PROD)
+        assert registry.is_blocked(dead, **PROD)
+        assert registry.is_blocked(bad.lower(), **PROD)
+        assert not registry.is_blocked("ef" * 32, **PROD)
+        assert not registry.is_blocked("not-hex", **PROD)
+
+    with TokenRegistry(path) as registry:
+        assert len(registry) == 2
+        status = registry.get(dead, **PROD)
+        assert status is not None
+        assert status.reason == "Unregistered"
+        assert status.apns_timestamp == 1700000000000
+
+        exported = list(registry.export(page_size=1))
+        assert [s.device_token for s in exported] == sorted([dead, bad.lower()])
+
+        registry.remove(dead, **PROD)
+        assert not registry.is_blocked(dead, **PROD)
+
+
+def test_registry_scopes_dead_tokens_by_environment_and_topic(tmp_path: Path) -> None:
+    token = "ab" * 32
+
+    with TokenRegistry(tmp_path / "tokens.sqlite3") as registry:
+        registry.record(token, _failure(400, "BadDeviceToken"), **PROD)
+        registry.mark("cd" * 32, "Unregistered", environment="sandbox", topic="com.example.app")
+
+        assert registry.is_blocked(token, **PROD)
+        assert not registry.is_blocked(token, environment="sandbox", topic="com.example.app")
+        assert not registry.is_blocked(token, environment="production", topic="com.example.other")
+        assert registry.blocked_keys(**PROD) == {bytes.fromhex(token)}
+        assert registry.get(token, environment="sandbox", topic="com.example.app") is None
+
+        assert [(s.environment, s.device_token) for s in registry.export(page_size=1)] == [
+            ("production", token),
+            ("sandbox", "cd" * 32),
+        ]
+        assert [s.device_token for s in registry.export(environment="sandbox")] == ["cd" * 32]
+        assert list(registry.export(topic="com.example.other")) == []
+
+
+def test_registry_migrates_unscoped_file_without_blocking(tmp_path: Path) -> None:
+    path = tmp_path / "tokens.sqlite3"
+    token = "ab" * 32
+    with sqlite3.connect(path) as db:
+        db.execute(
+            "CREATE TABLE dead_tokens (token BLOB PRIMARY KEY, reason TEXT NOT NULL,"
+            " apns_timestamp INTEGER, recorded_at INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        db.execute("INSERT INTO dead_tokens VALUES (?, 'BadDeviceToken', NULL, 1)", (bytes.fromhex(token),))
+    db.close()
+
+    with TokenRegistry(path) as registry:
+        # The old rows don't say where APNs rejected them, so they are kept but block nothing.
+        assert not registry.is_blocked(token, **PROD)
+        [status] = registry.export()
+        assert (status.environment, status.topic, status.device_token) == ("", "", token)
+        registry.mark(token, "Unregistered", **PROD)
+        assert len(registry) == 2
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import json
+
+from apn_pushtool.resolver import AddressCache
+
+
+def test_entries_expire_and_bad_files_are_ignored(tmp_path) -> None:
+    path = tmp_path / "addresses.json"
+    now = [1000.0]
+    path.write_text(
+        json.dumps(
+            {
+                "api.push.apple.com:443": {"addresses": ["17.188.1.1", "17.188.1.2"], "expires": 1300.0},
+                "api.sandbox.push.apple.com:443": {"addresses": ["17.188.2.2"], "expires": 900.0},
+            }
+        )
+    )
+    cache = AddressCache(path, clock=lambda: now[0])
+
+    assert cache.get("api.push.apple.com", 443) == "17.188.1.1"
+    assert cache.get_all("api.push.apple.com", 443) == ["17.188.1.1", "17.188.1.2"]
+    assert cache.get("api.sandbox.push.apple.com", 443) is None  # expired
+    assert cache.get("api.push.apple.com", 2197) is None  # other port, other entry
+    now[0] = 1300.0
+    assert cache.get("api.push.apple.com", 443) is None
+
+    path.write_text("not json")
+    assert AddressCache(path).get("api.push.apple.com", 443) is None
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from apn_pushtool.results import PushResult, Reason, ResultCollector
+
+
+def test_push_result_renders_legacy_dict_shape() -> None:
+    ok = PushResult("a" * 64, status_code=200, apns_id="ID-1", elapsed=0.02)
+    record = ok.to_dict()
+
+    assert record["success"] is True
+    assert record["status_code"] == 200
+    assert record["headers"] == {"apns-id": "ID-1"}
+    assert record["device_token"] == "aaaaaaaa..."
+    assert record["timestamp"].endswith("+00:00")
+    assert "error" not in record
+    assert ok["success"] is True
+    assert ok.get("status_code") == 200
+
+
+def test_push_result_failure_shapes() -> None:
+    rejected = PushResult("b" * 64, status_code=410, reason=Reason.UNREGISTERED, error={"reason": "Unregistered"})
+    assert rejected["error"]["reason"] == "Unregistered"
+    assert rejected.reason is Reason.UNREGISTERED
+
+    broken = PushResult("c" * 64, reason=Reason.CONNECTION_ERROR, error="reset by peer")
+    record = broken.to_dict()
+    assert "status_code" not in record
+    assert record["error"] == "reset by peer"
+
+    assert Reason.parse("SomethingNew") is Reason.UNKNOWN
+
+
+def test_result_collector_aggregates_without_retaining_successes() -> None:
+    collector = ResultCollector(keep_failures=1)
+    for i in range(98):
+        collector.add(PushResult("a" * 64, status_code=200, elapsed=0.003))
+    collector.add(PushResult("b" * 64, status_code=429, reason=Reason.TOO_MANY_REQUESTS, elapsed=0.2))
+    collector.add(PushResult("c" * 64, status_code=410, reason=Reason.UNREGISTERED, elapsed=0.2))
+
+    summary = collector.summary()
+    assert summary["total"] == 100
+    assert summary["succeeded"] == 98
+    assert summary["by_status"] == {"200": 98, "410": 1, "429": 1}
+    assert summary["by_reason"] == {"TooManyRequests": 1, "Unregistered": 1}
+    assert summary["latency_p50_seconds"] == 0.005
+    assert summary["latency_p99_seconds"] == 0.25
+    assert len(collector.failures) == 1
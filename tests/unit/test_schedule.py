@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from apn_pushtool.message import PushMessage
+from apn_pushtool.results import PushResult, Reason
+from apn_pushtool.schedule import SendScheduler
+
+
+def _message(n: int, expiration: int | None = None) -> PushMessage:
+    return PushMessage(device_token=f"{n:064x}", payload={"aps": {}}, expiration=expiration)
+
+
+@pytest.mark.asyncio
+async def test_messages_go_out_in_due_order_and_expired_ones_are_dropped() -> None:
+    sent: list[tuple[float, str]] = []
+    results: dict[str, PushResult] = {}
+
+    async def send(message: PushMessage) -> PushResult:
+        sent.append((time.time(), message.device_token))
+        return PushResult(message.device_token, status_code=200)
+
+    now = time.time()
+    scheduler = SendScheduler(send, on_result=lambda m, r: results.__setitem__(m.device_token, r))
+    async with scheduler:
+        scheduler.schedule(_message(2), now + 0.10)
+        scheduler.schedule(_message(1), now + 0.05)
+        scheduler.schedule(_message(3, expiration=int(now)), now + 0.05)
+        scheduler.schedule(_message(4), now + 3600)
+        assert scheduler.next_due() == pytest.approx(now + 0.05)
+        await asyncio.sleep(0.2)
+        left = await scheduler.close()
+
+    assert [token for _, token in sent] == [f"{1:064x}", f"{2:064x}"]
+    assert sent[0][0] >= now + 0.05
+    assert results[f"{3:064x}"].reason is Reason.EXPIRED_BEFORE_SEND
+    assert [m.device_token for _, m in left] == [f"{4:064x}"]
+    assert (scheduler.stats.scheduled, scheduler.stats.released, scheduler.stats.expired) == (4, 3, 1)
+
+
+@pytest.mark.asyncio
+async def test_deadline_is_spread_and_released_in_paced_bursts() -> None:
+    sent: list[float] = []
+
+    async def send(message: PushMessage) -> PushResult:
+        sent.append(time.monotonic())
+        return PushResult(message.device_token, status_code=200)
+
+    offsets = iter([i / 100 for i in range(100)])
+    scheduler = SendScheduler(send, spread_seconds=0.5, rng=lambda: next(offsets))
+    scheduler.schedule_many((_message(i) for i in range(100)), 1000.0)
+    left = await scheduler.close()  # never started, so nothing was released
+    assert [due for due, _ in left] == pytest.approx([1000.0 + 0.5 * i / 100 for i in range(100)])
+
+    # 40 messages due at once, at most 200/s: bursts of 10 every 50 ms.
+    paced = SendScheduler(send, max_rate=200)
+    paced.schedule_many((_message(i) for i in range(40)), time.time())
+    async with paced:
+        while paced.stats.released < 40:
+            await asyncio.sleep(0.01)
+    bursts = [t for previous, t in zip(sent, sent[1:]) if t - previous > 0.03]
+    assert len(sent) == 40
+    assert len(bursts) == 3
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import pytest
+
+from apn_pushtool.results import PushResult, Reason
+from apn_pushtool.throttle import AimdLimiter, RetryPolicy, TokenBucket, result_reason
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_allows_burst_then_paces() -> None:
+    clock = _Clock()
+    bucket = TokenBucket(10, 2, clock=clock)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve() == pytest.approx(0.2)
+
+    clock.now += 1.0
+    assert bucket.idle
+
+
+def test_aimd_limiter_halves_on_congestion_once_per_cooldown() -> None:
+    clock = _Clock()
+    limiter = AimdLimiter(initial=40, minimum=2, maximum=100, clock=clock)
+
+    limiter.on_congestion()
+    limiter.on_congestion()
+    assert limiter.limit == 20
+
+    clock.now += 2.0
+    limiter.on_congestion()
+    assert limiter.limit == 10
+
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit > 10
+
+
+def test_retry_policy_backoff_is_capped_and_jittered() -> None:
+    policy = RetryPolicy(base_delay_seconds=1.0, max_delay_seconds=5.0)
+
+    assert policy.delay(1, rng=lambda: 1.0) == 1.0
+    assert policy.delay(3, rng=lambda: 1.0) == 4.0
+    assert policy.delay(10, rng=lambda: 1.0) == 5.0
+    assert policy.delay(10, rng=lambda: 0.5) == 2.5
+
+
+def test_result_reason() -> None:
+    token = "a" * 64
+    assert result_reason(PushResult(token, status_code=200)) is None
+    assert result_reason(PushResult(token, status_code=410, reason=Reason.UNREGISTERED)) == "Unregistered"
+    assert result_reason(PushResult(token, reason=Reason.CONNECTION_ERROR, error="reset")) == "ConnectionError"
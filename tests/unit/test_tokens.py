@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from apn_pushtool.config import is_valid_device_token, normalize_device_token
+from apn_pushtool.registry import TokenRegistry
+from apn_pushtool.tokens import (
+    TokenSet,
+    is_token_set_file,
+    normalize_tokens,
+    validate_token_file,
+    validate_tokens,
+)
+
+A = "a" * 64
+B = "0123456789abcdef" * 4
+
+
+def test_clean_export_takes_the_fast_path_and_dedupes(tmp_path: Path) -> None:
+    path = tmp_path / "tokens.txt"
+    path.write_bytes(f"{A}\r\n{B.upper()}\r\n{A}\r\n".encode())
+
+    result = validate_token_file(path)
+
+    assert list(result) == [A, B]
+    assert result.packed == bytes.fromhex(A + B)
+    assert result.duplicates == 1 and result.invalid == []
+
+
+def test_invalid_rows_are_reported_with_line_numbers() -> None:
+    rows = [A, "", "not-a-token", B[:63], "0x" + B[2:], B, "ab_" + B[3:], "é" * 64]
+
+    result = validate_tokens(rows)
+
+    assert list(result) == [A, B]
+    assert result.invalid == [(3, "not-a-token"), (4, B[:63]), (5, "0x" + B[2:]), (7, "ab_" + B[3:]), (8, "é" * 64)]
+
+
+def test_bulk_helpers_agree_with_single_token_ones() -> None:
+    rows = [f" {A[:8]}-{A[8:]} ", "ab cd", B, "x" * 64, "ab_" + B[3:]]
+
+    assert normalize_tokens(rows) == [normalize_device_token(r) for r in rows]
+    valid = {normalize_device_token(r) for r in rows if is_valid_device_token(r)}
+    assert set(validate_tokens(rows)) == valid
+
+
+def test_token_set_membership_and_iteration() -> None:
+    tokens = TokenSet([B, A.upper(), f"{B[:8]} {B[8:]}"])
+
+    assert len(tokens) == 2
+    assert list(tokens) == sorted([A, B])
+    assert A in tokens and bytes.fromhex(B) in tokens
+    assert "c" * 64 not in tokens and "nope" not in tokens
+    assert [bytes(k) for k in tokens.keys()] == [bytes.fromhex(t) for t in sorted([A, B])]
+
+
+def test_token_set_file_round_trip_minus_dead_tokens(tmp_path: Path) -> None:
+    audience = TokenSet.from_packed(validate_tokens([f"{i:064x}" for i in range(100, 0, -1)]).packed)
+    audience.save(tmp_path / "audience.tokens")
+
+    with TokenRegistry(tmp_path / "dead.sqlite3") as registry:
+        scope = {"environment": "production", "topic": "com.example.app"}
+        registry.mark(f"{7:064x}", "Unregistered", **scope)
+        registry.mark("f" * 64, "Unregistered", **scope)  # not in the audience
+        registry.mark(f"{8:064x}", "BadDeviceToken", environment="sandbox", topic="com.example.app")
+        with TokenSet.open(tmp_path / "audience.tokens") as mapped:
+            assert len(mapped) == 100 and f"{42:064x}" in mapped
+            live = mapped.difference(registry.blocked_keys(**scope))
+
+    assert len(live) == 99
+    assert f"{7:064x}" not in live
+    assert list(live) == [f"{i:064x}" for i in range(1, 101) if i != 7]
+
+
+def test_token_set_file_is_detected_by_content_not_name(tmp_path: Path) -> None:
+    TokenSet([A, B]).save(tmp_path / "audience.bin")
+    (tmp_path / "list.tokens").write_text(f"{A}\n{B[:30]}\n", encoding="ascii")  # 96 bytes of text
+    (tmp_path / "empty").write_bytes(b"")
+
+    assert is_token_set_file(tmp_path / "audience.bin")
+    assert not is_token_set_file(tmp_path / "list.tokens")
+    assert not is_token_set_file(tmp_path / "empty")